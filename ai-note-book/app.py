@@ -1,24 +1,46 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
 from dotenv import load_dotenv
 import os
 import asyncio
 import time
 import json
 import base64
+import hashlib
 from datetime import datetime
 
 # 导入数据库实例
 from models import db
 # 导入Note模型
 from models.Note import Note
+from models.NoteChunk import NoteChunk
 
 # 如果使用单独的数据库配置文件
-from config.db_config import get_db_uri
+from config.db_config import get_db_uri, SLOW_QUERY_MS, SQL_LOG_ALL
 
 from config.APIconfig import APIConfig
 from utils.openai_handler import AIHandler
+from utils.provider_router import create_providers
 from utils.prompts import get_prompts
 from utils.mindmap_generator import MindmapGenerator
+from utils.async_runner import runner
+from utils.job_queue import JobQueue
+from utils.query_log import init_query_log
+from utils.migrations import run_migrations
+from utils.pagination import (
+    parse_fields, field_columns, encode_cursor, decode_cursor, list_etag,
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+)
+from utils.blob_store import blob_store, is_blob_hash
+from utils.render_cache import RenderCache
+from utils.render_pool import RenderPool, RenderTimeoutError
+from utils.svg_renderer import SvgMindmapRenderer
+from utils.outline_parser import parse_outline
+from utils.search_index import SearchIndex, highlight, plain_text, sync_note_indexes
+from utils.embedding_index import EmbeddingIndex, create_embedder
+from utils.kg_parser import parse_knowledge_graph
+from utils.triple_store import TripleStore
 
 # 创建Flask应用
 app = Flask(__name__)
@@ -31,10 +53,70 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # 初始化应用
 db.init_app(app)
 
+# 记录每个请求的SQL语句和耗时
+init_query_log(app, slow_ms=SLOW_QUERY_MS, log_all=SQL_LOG_ALL)
+
+# 笔记全文检索索引（单独的SQLite文件）
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_DB', 'data/search_index.db')
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+
+# 笔记向量索引：用于相关笔记推荐和语义检索，在后台线程中用本地模型计算向量
+# EMBEDDING_MODEL为sentence-transformers模型名（如BAAI/bge-small-zh-v1.5），未配置时使用哈希向量
+EMBEDDING_INDEX_PATH = os.getenv('EMBEDDING_INDEX_DB', 'data/embeddings.db')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL')
+EMBEDDING_DTYPE = os.getenv('EMBEDDING_DTYPE', 'float32')  # float32或int8
+embedding_index = EmbeddingIndex(EMBEDDING_INDEX_PATH, create_embedder(EMBEDDING_MODEL), dtype=EMBEDDING_DTYPE)
+
+# 知识图谱三元组存储（单独的SQLite文件），同一用户不同笔记中的同名实体自动合并
+TRIPLE_STORE_PATH = os.getenv('TRIPLE_STORE_DB', 'data/knowledge_graph.db')
+triple_store = TripleStore(TRIPLE_STORE_PATH)
+
+# 笔记提交后自动同步到各个索引（删除笔记时一并删除其知识图谱）
+sync_note_indexes(db.session, Note, [search_index, embedding_index, triple_store])
+
 # 用于保存生成的思维导图图像
 UPLOAD_FOLDER = 'static/mindmaps'
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# 渲染缓存：相同大纲和样式的思维导图直接复用已渲染的图片，目录总大小超过上限时按最近使用时间淘汰
+RENDER_CACHE_MAX_BYTES = int(os.getenv('RENDER_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+# 最近使用过的缓存图片在该时长内不会被淘汰，保证返回给客户端的图片地址能够加载，单位：（second）
+RENDER_CACHE_MIN_IDLE = int(os.getenv('RENDER_CACHE_MIN_IDLE', 300))
+render_cache = RenderCache(UPLOAD_FOLDER, max_bytes=RENDER_CACHE_MAX_BYTES, min_idle=RENDER_CACHE_MIN_IDLE)
+
+# 渲染进程池：每个工作进程只初始化一次Qt，渲染指定次数后替换进程；进程数为0时在当前进程中渲染
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', 2))
+RENDER_TIMEOUT = float(os.getenv('RENDER_TIMEOUT', 60))
+RENDER_MAX_TASKS = int(os.getenv('RENDER_MAX_TASKS', 50))
+render_pool = RenderPool(workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT, max_tasks_per_child=RENDER_MAX_TASKS)
+
+# 渲染器：ete3（Qt渲染PNG，在渲染进程池中执行）或svg（纯Python布局，输出SVG，可选转换为PNG）
+RENDERERS = {'ete3': ('png',), 'svg': ('svg', 'png')}
+DEFAULT_RENDERER = os.getenv('MINDMAP_RENDERER', 'ete3')
+svg_renderer = SvgMindmapRenderer()
+
+# /generate-mindmap支持的输出格式：image渲染图片，json只返回大纲的JSON树，由前端布局
+OUTPUT_FORMATS = ('image', 'json')
+
+# 批量生成：单次请求最多的条目数，以及同时处理的条目数（模型调用另受AIHandler限流控制）
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', 500))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', 8))
+
+# 孤立图片（没有被任何笔记引用）的保留时间，单位：（second）
+ORPHAN_IMAGE_MIN_AGE = int(os.getenv('ORPHAN_IMAGE_MIN_AGE', 24 * 3600))
+
+# /generate-mindmap支持的图片返回方式
+IMAGE_MODES = ('base64', 'url')
+
+# 文件存储中的内容按哈希寻址、不会变化，可以长期缓存
+BLOB_MAX_AGE = 365 * 24 * 3600
+
+# 后台任务队列配置，数据库路径为":memory:"时使用进程内队列
+JOB_DB_PATH = os.getenv('MINDMAP_JOB_DB', 'data/mindmap_jobs.db')
+JOB_WORKERS = int(os.getenv('MINDMAP_JOB_WORKERS', 2))
+if JOB_DB_PATH != ':memory:':
+    os.makedirs(os.path.dirname(JOB_DB_PATH) or '.', exist_ok=True)
+
 # 初始化AI配置
 load_dotenv(verbose=True)
 config = APIConfig()
@@ -44,19 +126,95 @@ deepseek_config = APIConfig.get_config(provider="deepseek")
 default_api_base = os.getenv("DEEPSEEK_API_KEY_API_BASE", deepseek_config["api_base"])
 mindmap_generator = MindmapGenerator(default_output_folder="static/mindmaps")
 
+# 大模型后端，按逗号分隔（如deepseek,openai,local），每次请求发给最快的可用后端，失败时切换
+LLM_PROVIDERS = [name.strip() for name in os.getenv('LLM_PROVIDERS', 'deepseek').split(',') if name.strip()]
+
 # 创建全局处理器实例
 ai_handler = AIHandler(
     api_key=default_api_key,
     api_base=default_api_base,
-    provider="deepseek"
+    provider="deepseek",
+    providers=create_providers(LLM_PROVIDERS)
 )
 mindmap_generator = MindmapGenerator()
 prompts = get_prompts()
 
 
-# 异步运行函数
+# 异步运行函数：提交到常驻事件循环，复用AIHandler的连接池
 def run_async(coro):
-    return asyncio.run(coro)
+    return runner.run(coro)
+
+
+def list_notes_response(user_id: int, not_found_error: str = None):
+    """
+    查询用户笔记列表，支持游标分页、字段投影和条件请求
+
+    查询参数:
+        limit: 每页条数，不传时返回全部笔记
+        cursor: 上一页返回的next_cursor
+        fields: 逗号分隔的字段列表，未选中的大字段（content、image）不会从数据库加载
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        limit = request.args.get('limit', type=int)
+        cursor = request.args.get('cursor')
+        if cursor and not limit:
+            limit = DEFAULT_PAGE_SIZE
+        if limit is not None:
+            limit = max(1, min(limit, MAX_PAGE_SIZE))
+        position = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # 先只查(id, update_time, version)，列表未变化时不必加载content等大字段
+    query = db.session.query(Note.id, Note.update_time, Note.version).filter(Note.user_id == user_id)
+    if position:
+        update_time, note_id = position
+        query = query.filter(or_(
+            Note.update_time < update_time,
+            and_(Note.update_time == update_time, Note.id < note_id)
+        ))
+    query = query.order_by(Note.update_time.desc(), Note.id.desc())
+    if limit is not None:
+        query = query.limit(limit + 1)  # 多取一条判断是否还有下一页
+
+    rows = query.all()
+    has_more = limit is not None and len(rows) > limit
+    rows = rows[:limit] if limit is not None else rows
+
+    if not rows and not_found_error and not position:
+        return jsonify({'error': not_found_error}), 404
+
+    next_cursor = encode_cursor(rows[-1].update_time, rows[-1].id) if has_more else None
+
+    # 列表未变化时返回304，客户端不必重新下载
+    etag = list_etag(
+        [(row.id, row.update_time, row.version) for row in rows],
+        user_id, ','.join(fields or []), limit, cursor
+    )
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    # 按主键加载这一页的完整数据，保持上面查询的顺序
+    notes = []
+    if rows:
+        note_query = Note.query.filter(Note.id.in_([row.id for row in rows]))
+        if fields:
+            note_query = note_query.options(load_only(*[getattr(Note, column) for column in field_columns(fields)]))
+        by_id = {note.id: note for note in note_query}
+        notes = [by_id[row.id] for row in rows if row.id in by_id]
+
+    response = jsonify({
+        'success': True,
+        'notes': [note.to_dict(fields) for note in notes],
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    })
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 # 笔记相关路由
@@ -68,11 +226,7 @@ def get_notes():
         if not user_id:
             return jsonify({'error': 'Missing user_id parameter'}), 400
 
-        notes = Note.query.filter_by(user_id=user_id).order_by(Note.update_time.desc()).all()
-        return jsonify({
-            'success': True,
-            'notes': [note.to_dict() for note in notes]
-        })
+        return list_notes_response(user_id)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -92,27 +246,343 @@ def get_note(note_id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/users/<int:user_id>', methods=['GET'])
-def get_notes_by_user(user_id):
-    """获取用户的所有笔记"""
+@app.route('/api/notes/search', methods=['GET'])
+def search_notes():
+    """
+    全文检索用户的笔记（标题和内容），按BM25得分排序
+
+    查询参数:
+        user_id: 用户ID
+        q: 查询文本
+        page: 页码，从1开始
+        page_size: 每页条数
+        match: all（默认，包含全部查询词）或any（包含任意查询词）
+    """
+    try:
+        user_id = request.args.get('user_id', type=int)
+        query_text = (request.args.get('q') or '').strip()
+        if not user_id:
+            return jsonify({'error': 'Missing user_id parameter'}), 400
+        if not query_text:
+            return jsonify({'error': 'Missing q parameter'}), 400
+        page = max(1, request.args.get('page', 1, type=int))
+        page_size = max(1, min(request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        match = request.args.get('match', 'all')
+        if match not in ('all', 'any'):
+            return jsonify({'error': 'Invalid match, expected one of: all, any'}), 400
+
+        total, hits = search_index.search(
+            user_id, query_text,
+            offset=(page - 1) * page_size, limit=page_size,
+            match_all=(match == 'all')
+        )
+
+        # 只加载当前页的笔记，按得分顺序返回
+        notes = {}
+        if hits:
+            columns = (Note.id, Note.user_id, Note.title, Note.content, Note.update_time)
+            query = Note.query.options(load_only(*columns)).filter(Note.id.in_([note_id for note_id, _ in hits]))
+            notes = {note.id: note for note in query}
+
+        results = []
+        for note_id, score in hits:
+            note = notes.get(note_id)
+            if note is None or note.user_id != user_id:
+                continue  # 索引尚未同步删除
+            results.append({
+                'id': note.id,
+                'title': note.title,
+                'title_highlight': highlight(note.title, query_text),
+                'snippet': highlight(plain_text(note.content), query_text, width=120),
+                'score': round(score, 4),
+                'update_time': note.update_time.strftime('%Y-%m-%d %H:%M:%S') if note.update_time else None
+            })
+
+        return jsonify({
+            'success': True,
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'has_more': page * page_size < total,
+            'results': results
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def _load_note_summaries(note_ids, user_id):
+    """按ID加载笔记的标题和更新时间，返回{笔记ID: 笔记}，忽略不属于该用户的笔记"""
+    if not note_ids:
+        return {}
+    columns = (Note.id, Note.user_id, Note.title, Note.update_time)
+    query = Note.query.options(load_only(*columns)).filter(Note.id.in_(note_ids))
+    return {note.id: note for note in query if note.user_id == user_id}
+
+
+def _similar_notes_response(hits, user_id):
+    notes = _load_note_summaries([note_id for note_id, _ in hits], user_id)
+    return [
+        {
+            'id': note_id,
+            'title': notes[note_id].title,
+            'score': round(score, 4),
+            'update_time': notes[note_id].update_time.strftime('%Y-%m-%d %H:%M:%S') if notes[note_id].update_time else None
+        }
+        for note_id, score in hits if note_id in notes
+    ]
+
+
+@app.route('/api/notes/<int:note_id>/related', methods=['GET'])
+def get_related_notes(note_id):
+    """
+    相关笔记：按向量相似度返回同一用户的其他笔记，不调用大模型
+
+    查询参数:
+        k: 返回数量，默认10
+    """
     try:
-        # 查询该用户的所有笔记
-        notes = Note.query.filter_by(user_id=user_id).all()
+        note = Note.query.options(load_only(Note.id, Note.user_id)).get(note_id)
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+        k = max(1, min(request.args.get('k', 10, type=int), MAX_PAGE_SIZE))
+
+        hits = embedding_index.related(note.user_id, note.id, k)
+        if hits is None:
+            # 新笔记的向量还在后台计算
+            return jsonify({'success': True, 'indexed': False, 'results': []})
+        return jsonify({
+            'success': True,
+            'indexed': True,
+            'results': _similar_notes_response(hits, note.user_id)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        if not notes:
-            return jsonify({'error': 'No notes found for this user'}), 404
 
-        # 将所有笔记转换为字典格式
-        notes_list = [note.to_dict() for note in notes]
+@app.route('/api/notes/semantic-search', methods=['GET'])
+def semantic_search_notes():
+    """
+    语义检索：按向量相似度查找与查询文本意思相近的笔记
 
+    查询参数:
+        user_id: 用户ID（必填）
+        q: 查询文本（必填）
+        k: 返回数量，默认10
+    """
+    try:
+        user_id = request.args.get('user_id', type=int)
+        query_text = (request.args.get('q') or '').strip()
+        if not user_id:
+            return jsonify({'error': 'Missing user_id parameter'}), 400
+        if not query_text:
+            return jsonify({'error': 'Missing q parameter'}), 400
+        k = max(1, min(request.args.get('k', 10, type=int), MAX_PAGE_SIZE))
+
+        hits = embedding_index.search(user_id, query_text, k)
         return jsonify({
             'success': True,
-            'notes': notes_list
+            'model': embedding_index.embedder.name,
+            'results': _similar_notes_response(hits, user_id)
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def rebuild_search_index(batch_size: int = 1000) -> int:
+    """从数据库重建全文检索索引和向量索引，返回索引的笔记数"""
+    search_index.clear()
+    count = 0
+    embedded = 0
+    note_ids = set()
+    with app.app_context():
+        query = db.session.query(Note.id, Note.user_id, Note.title, Note.content).yield_per(batch_size)
+        batch = []
+        for row in query:
+            batch.append(tuple(row))
+            note_ids.add(row[0])
+            if len(batch) >= batch_size:
+                count += search_index.index_many(batch)
+                embedded += embedding_index.index_many(batch)
+                batch = []
+        if batch:
+            count += search_index.index_many(batch)
+            embedded += embedding_index.index_many(batch)
+    embedding_index.prune(note_ids)
+    print(f"检索索引重建完成，共{count}篇笔记，重新计算向量{embedded}篇")
+    return count
+
+
+@app.route('/api/notes/<int:note_id>/outline', methods=['GET'])
+def get_note_outline(note_id):
+    """获取笔记内容的大纲JSON树，由前端布局，无需服务端重新渲染图片"""
+    try:
+        note = Note.query.options(load_only(Note.id, Note.content)).get(note_id)
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'note_id': note.id,
+            'outline': parse_outline(note.content or '').to_compact()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def _content_hash(content: str) -> str:
+    return hashlib.sha256((content or '').encode('utf-8')).hexdigest()
+
+
+def _load_note_for_graph(note_id: int):
+    with app.app_context():
+        note = Note.query.options(load_only(Note.id, Note.user_id, Note.content)).get(note_id)
+        if not note:
+            return None
+        return note.user_id, note.content
+
+
+async def extract_note_graph_async(note_id: int, data: dict):
+    """
+    提取笔记的知识图谱并写入三元组存储
+
+    参数:
+        data: 请求数据，包含text时直接解析该文本（已有的提取结果），不调用大模型
+
+    返回:
+        (响应数据, HTTP状态码)
+    """
+    start_time = time.time()
+    loaded = await asyncio.to_thread(_load_note_for_graph, note_id)
+    if loaded is None:
+        return {'error': 'Note not found'}, 404
+    user_id, content = loaded
+
+    if data.get('text'):
+        graph = parse_knowledge_graph(data['text'])
+    else:
+        graph = await ai_handler.extract_knowledge_graph(plain_text(content))
+    if not graph.entities:
+        return {'success': False, 'error': 'No entities found in the extraction result'}, 422
+
+    counts = await asyncio.to_thread(triple_store.replace_note, note_id, user_id, graph, _content_hash(content))
+    return {
+        'success': True,
+        'note_id': note_id,
+        'graph': graph.to_dict(),
+        'entities': counts['entities'],
+        'triples': counts['triples'],
+        'processing_time': time.time() - start_time
+    }, 200
+
+
+@app.route('/api/notes/<int:note_id>/knowledge-graph', methods=['POST'])
+def extract_note_graph(note_id):
+    """提取笔记的知识图谱（覆盖该笔记原有的图谱）"""
+    try:
+        response_data, status = run_async(extract_note_graph_async(note_id, request.get_json(silent=True) or {}))
+        return jsonify(response_data), status
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/notes/<int:note_id>/knowledge-graph', methods=['GET'])
+def get_note_graph(note_id):
+    """读取笔记的知识图谱，笔记内容在提取后被修改时stale为true"""
+    try:
+        note = Note.query.options(load_only(Note.id, Note.content)).get(note_id)
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+        info = triple_store.note_info(note_id)
+        if info is None:
+            return jsonify({'error': 'Knowledge graph not extracted yet'}), 404
+
+        return jsonify({
+            'success': True,
+            'note_id': note_id,
+            'stale': info['source_hash'] != _content_hash(note.content),
+            'graph': triple_store.note_graph(note_id).to_dict()
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/knowledge-graph/triples', methods=['GET'])
+def query_triples():
+    """
+    查询用户的知识图谱三元组，不调用大模型
+
+    查询参数:
+        user_id: 用户ID（必填）
+        subject: 主体实体名称
+        predicate: 关系或属性名
+        object: 客体实体名称或属性值
+        note_id: 只查询某篇笔记
+        page, page_size: 分页
+    """
+    try:
+        user_id = request.args.get('user_id', type=int)
+        if not user_id:
+            return jsonify({'error': 'Missing user_id parameter'}), 400
+        page = max(1, request.args.get('page', 1, type=int))
+        page_size = max(1, min(request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+
+        triples = triple_store.query(
+            user_id,
+            subject=request.args.get('subject') or None,
+            predicate=request.args.get('predicate') or None,
+            obj=request.args.get('object') or None,
+            note_id=request.args.get('note_id', type=int),
+            offset=(page - 1) * page_size,
+            limit=page_size
+        )
+        return jsonify({'success': True, 'page': page, 'page_size': page_size, 'results': triples})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/knowledge-graph/entities', methods=['GET'])
+def list_graph_entities():
+    """
+    列出用户的实体（不同笔记中的同名实体已合并），或查询单个实体的详情
+
+    查询参数:
+        user_id: 用户ID（必填）
+        name: 实体名称，指定时返回该实体的属性、所在笔记和相邻实体
+        depth: 相邻实体的跳数，默认1，最大3
+        prefix: 按名称前缀筛选实体列表
+    """
+    try:
+        user_id = request.args.get('user_id', type=int)
+        if not user_id:
+            return jsonify({'error': 'Missing user_id parameter'}), 400
+
+        name = request.args.get('name')
+        if name:
+            depth = max(1, min(request.args.get('depth', 1, type=int), 3))
+            entity = triple_store.entity(user_id, name, depth=depth)
+            if entity is None:
+                return jsonify({'error': 'Entity not found'}), 404
+            return jsonify({'success': True, 'entity': entity})
+
+        page = max(1, request.args.get('page', 1, type=int))
+        page_size = max(1, min(request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+        entities = triple_store.entities(
+            user_id, request.args.get('prefix', ''), offset=(page - 1) * page_size, limit=page_size
+        )
+        return jsonify({'success': True, 'page': page, 'page_size': page_size, 'results': entities})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/users/<int:user_id>', methods=['GET'])
+def get_notes_by_user(user_id):
+    """获取用户的所有笔记"""
+    try:
+        # 查询该用户的笔记，参数与/api/notes相同
+        return list_notes_response(user_id, not_found_error='No notes found for this user')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/notes', methods=['POST'])
 def create_note():
     """创建新笔记"""
@@ -125,12 +595,18 @@ def create_note():
             if field not in data:
                 return jsonify({'error': f'Missing {field} parameter'}), 400
 
+        # 图片保存到文件存储，数据库中只保存哈希
+        try:
+            image = blob_store.import_image(data.get('image'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
         # 创建笔记实例
         note = Note(
             user_id=data['user_id'],
             title=data['title'],
             content=data['content'],
-            image=data.get('image', '')
+            image=image
         )
 
         # 保存到数据库
@@ -163,7 +639,10 @@ def update_note(note_id):
         if 'content' in data:
             note.content = data['content']
         if 'image' in data:
-            note.image = data['image']
+            try:
+                note.image = blob_store.import_image(data['image'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
 
         # 保存更新
         db.session.commit()
@@ -198,80 +677,275 @@ def delete_note(note_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
-@app.route('/generate-mindmap', methods=['POST'])
-def generate_mindmap():
-    """接收文本并生成思维导图，并选择性保存为笔记"""
+def _renderer_settings(renderer: str, image_format: str):
+    """
+    返回渲染函数和渲染参数
+
+    返回:
+        (渲染函数, 样式, dpi, 格式)，渲染函数接收大纲文本，返回图片内容
+    """
+    image_format = image_format or RENDERERS[renderer][0]
+    if renderer == 'svg':
+        return (
+            lambda text: svg_renderer.render_bytes(text, image_format),
+            svg_renderer.style, svg_renderer.dpi, image_format
+        )
+    return render_pool.render, mindmap_generator.style, mindmap_generator.dpi, mindmap_generator.image_format
+
+
+def _render_mindmap(result: str, renderer: str = DEFAULT_RENDERER, image_format: str = None) -> str:
+    """渲染思维导图图片，返回图片路径；相同的大纲直接返回已渲染的图片"""
+    render_bytes, style, dpi, image_format = _renderer_settings(renderer, image_format)
+
+    def render(output_path):
+        image_bytes = render_bytes(result)
+        with open(output_path, 'wb') as file:
+            file.write(image_bytes)
+        return output_path
+
+    # 渲染缓存键：(大纲哈希, 样式, dpi, 格式)
+    key = RenderCache.key(result, style, dpi, image_format)
+    return render_cache.get_or_render(key, image_format, render)
+
+
+def _render_mindmap_blob(result: str, renderer: str = DEFAULT_RENDERER, image_format: str = None):
+    """
+    在内存中渲染思维导图并保存到文件存储，相同的大纲直接返回已保存的图片
+
+    返回:
+        (图片哈希, 图片内容)，命中缓存时图片内容为None
+    """
+    render_bytes, style, dpi, image_format = _renderer_settings(renderer, image_format)
+    key = RenderCache.key(result, style, dpi, image_format)
+    image_hash = render_cache.get_blob(key)
+    if image_hash and blob_store.exists(image_hash):
+        return image_hash, None
+
+    # 文件渲染模式已经渲染过相同的大纲
+    cached_path = render_cache.get(key, image_format)
+    if cached_path:
+        image_hash = blob_store.put_file(cached_path)
+        render_cache.remember_blob(key, image_hash)
+        return image_hash, None
+
+    image_bytes = render_bytes(result)
+    image_hash = blob_store.put(image_bytes)
+    render_cache.remember_blob(key, image_hash)
+    return image_hash, image_bytes
+
+
+def cleanup_orphan_images(min_age: float = ORPHAN_IMAGE_MIN_AGE) -> dict:
+    """
+    清理孤立图片：文件存储中没有被任何笔记引用的图片，以及输出目录中不属于渲染缓存、也没有被引用的旧图片
+
+    返回:
+        各类清理数量
+    """
+    referenced = set()
+    with app.app_context():
+        query = db.session.query(Note.image).filter(Note.image.isnot(None)).yield_per(1000)
+        for (image,) in query:
+            referenced.add(image)
+
+    removed = {
+        'blobs': blob_store.cleanup(referenced, min_age=min_age),
+        # 旧版本笔记中保存的是图片路径
+        'mindmaps': render_cache.cleanup_orphans(
+            [image for image in referenced if not is_blob_hash(image)],
+            min_age=min_age
+        ),
+        'evicted': render_cache.enforce_limit()
+    }
+    return removed
+
+
+def _save_mindmap_note(user_id, title: str, content: str, image: str) -> int:
+    """将思维导图保存为笔记，返回笔记ID（可在任意线程中调用）"""
+    with app.app_context():
+        note = Note(
+            user_id=user_id,
+            title=title,
+            content=content,  # 处理后的文本作为内容
+            image=image  # 保存图片哈希
+        )
+        try:
+            db.session.add(note)
+            db.session.commit()
+            return note.id
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+def _render_options(data: dict):
+    """
+    解析输出格式、渲染器及图片格式参数（svg渲染器默认输出SVG）
+
+    返回:
+        (输出格式, 渲染器, 图片格式, 错误信息)，参数有效时错误信息为None
+    """
+    output_format = data.get('output_format', 'image')
+    if output_format not in OUTPUT_FORMATS:
+        return None, None, None, f"Invalid output_format, expected one of: {', '.join(OUTPUT_FORMATS)}"
+    renderer = data.get('renderer', DEFAULT_RENDERER)
+    if renderer not in RENDERERS:
+        return None, None, None, f"Invalid renderer, expected one of: {', '.join(RENDERERS)}"
+    image_format = data.get('image_format', RENDERERS[renderer][0])
+    if image_format not in RENDERERS[renderer]:
+        return None, None, None, \
+            f"Invalid image_format for {renderer}, expected one of: {', '.join(RENDERERS[renderer])}"
+    return output_format, renderer, image_format, None
+
+
+async def _outline_response(data: dict, result: str, start_time: float):
+    """只返回大纲的JSON树，不在服务端渲染图片"""
+    outline = parse_outline(result).to_compact()
+
+    note_id = None
+    user_id = data.get('user_id')
+    if data.get('save_as_note', False) and user_id:
+        title = data.get('title', f"思维导图笔记 {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        note_id = await asyncio.to_thread(_save_mindmap_note, user_id, title, result, None)
+
+    response_data = {
+        'success': True,
+        'processed_text': result,
+        'outline': outline,
+        'processing_time': time.time() - start_time
+    }
+    if note_id:
+        response_data['note_id'] = note_id
+        response_data['message'] = 'Note saved successfully'
+    return response_data, 200
+
+
+async def generate_mindmap_async(data: dict):
+    """
+    思维导图生成流程，同步路由和ASGI路由共用
+
+    返回:
+        (响应数据, HTTP状态码)
+    """
     start_time = time.time()
 
+    if not data or 'text' not in data:
+        return {'error': 'Missing text parameter'}, 400
+
+    text = data['text']
+    user_id = data.get('user_id')
+    save_as_note = data.get('save_as_note', False)
+    # 图片返回方式：base64内联在响应中（默认，兼容旧客户端），或url只返回图片地址
+    image_mode = data.get('image_mode', 'base64')
+    if image_mode not in IMAGE_MODES:
+        return {'error': f"Invalid image_mode, expected one of: {', '.join(IMAGE_MODES)}"}, 400
+    output_format, renderer, image_format, error = _render_options(data)
+    if error:
+        return {'error': error}, 400
+    # 直接在内存中渲染，不写临时文件
+    in_memory = data.get('in_memory', False)
+
+    # 处理文本并生成思维导图
+    result = await ai_handler.process_text(
+        text,
+        prompts["prompt"],
+        semantic=data.get('semantic_cache'),
+        merge_prompt_template=prompts["merge_prompt"]  # 长文本自动分块处理
+    )
+
+    if output_format == 'json':
+        return await _outline_response(data, result, start_time)
+
+    # 调用MindmapGenerator生成图片，渲染是CPU密集型操作，放到线程中执行避免阻塞事件循环
+    # 图片保存到文件存储（相同的图片只保存一份）
+    image_bytes = None
     try:
-        data = request.get_json()
-        if not data or 'text' not in data:
-            return jsonify({'error': 'Missing text parameter'}), 400
-
-        text = data['text']
-        user_id = data.get('user_id')
-        save_as_note = data.get('save_as_note', False)
-
-        # 处理文本并生成思维导图
-        result = run_async(ai_handler.process_text(text, prompts["prompt"]))
-
-        # 生成思维导图，确保函数返回路径
-        timestamp = int(time.time())
-        filename = f"mindmap_{user_id if user_id else 'anonymous'}_{timestamp}.png"
-        output_path = os.path.join(UPLOAD_FOLDER, filename)
-
-        # 调用MindmapGenerator生成图片
-        try:
-            # 假设generate方法会把图片保存到output_path
-            mindmap_path = mindmap_generator.generate(result, output_path)
-            if not mindmap_path:
-                mindmap_path = output_path  # 如果返回None，使用我们指定的路径
-        except Exception as e:
-            return jsonify({'success': False, 'error': f"Failed to generate mindmap: {str(e)}"}), 500
+        if in_memory:
+            image_hash, image_bytes = await asyncio.to_thread(_render_mindmap_blob, result, renderer, image_format)
+            mindmap_path = blob_store.path(image_hash)
+        else:
+            mindmap_path = await asyncio.to_thread(_render_mindmap, result, renderer, image_format)
+    except RenderTimeoutError as e:
+        return {'success': False, 'error': f"Failed to generate mindmap: {str(e)}"}, 504
+    except Exception as e:
+        return {'success': False, 'error': f"Failed to generate mindmap: {str(e)}"}, 500
 
+    if not in_memory:
         # 检查文件是否存在
         if not os.path.exists(mindmap_path):
-            return jsonify({
+            return {
                 'success': False,
                 'error': f"Mindmap file not found at {mindmap_path}"
-            }), 500
-
-        # 将图像转换为base64
-        with open(mindmap_path, "rb") as img_file:
-            img_data = base64.b64encode(img_file.read()).decode('utf-8')
-
-        # 如果请求要求保存为笔记且提供了用户ID
-        note_id = None
-        if save_as_note and user_id:
-            title = data.get('title', f"思维导图笔记 {datetime.now().strftime('%Y-%m-%d %H:%M')}")
-
-            # 创建新笔记
-            note = Note(
-                user_id=user_id,
-                title=title,
-                content=result,  # 处理后的文本作为内容
-                image=mindmap_path  # 保存图片路径
-            )
+            }, 500
+        image_hash = await asyncio.to_thread(blob_store.put_file, mindmap_path)
+
+    # 只有base64模式才把图片读入内存并编码
+    img_data = None
+    if image_mode == 'base64':
+        def encode_image():
+            if image_bytes is not None:
+                return base64.b64encode(image_bytes).decode('utf-8')
+            with open(mindmap_path, "rb") as img_file:
+                return base64.b64encode(img_file.read()).decode('utf-8')
+
+        img_data = await asyncio.to_thread(encode_image)
+
+    # 如果请求要求保存为笔记且提供了用户ID
+    note_id = None
+    if save_as_note and user_id:
+        title = data.get('title', f"思维导图笔记 {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+        note_id = await asyncio.to_thread(_save_mindmap_note, user_id, title, result, image_hash)
+
+    end_time = time.time()
+
+    response_data = {
+        'success': True,
+        'processed_text': result,
+        'mindmap_path': mindmap_path,
+        'image_hash': image_hash,
+        'image_url': f'/blobs/{image_hash}',
+        'image_format': image_format,
+        'processing_time': end_time - start_time
+    }
+    if img_data is not None:
+        response_data['mindmap_image'] = img_data
+
+    if note_id:
+        response_data['note_id'] = note_id
+        response_data['message'] = 'Note saved successfully'
+    else:
+        # 没有保存为笔记的图片不被引用，超过该时长后会被孤立图片清理删除，单位：（second）
+        response_data['image_expires_in'] = ORPHAN_IMAGE_MIN_AGE
 
-            db.session.add(note)
-            db.session.commit()
-            note_id = note.id
+    return response_data, 200
 
-        end_time = time.time()
 
-        response_data = {
-            'success': True,
-            'processed_text': result,
-            'mindmap_image': img_data,
-            'mindmap_path': mindmap_path,
-            'processing_time': end_time - start_time
-        }
+@app.route('/blobs/<blob_hash>', methods=['GET'])
+def get_blob(blob_hash):
+    """按哈希读取图片，内容不可变，支持Range请求和长期缓存"""
+    if not is_blob_hash(blob_hash) or not blob_store.exists(blob_hash):
+        return jsonify({'error': 'Blob not found'}), 404
+
+    response = send_file(
+        os.path.abspath(blob_store.path(blob_hash)),
+        mimetype=blob_store.mimetype(blob_hash),
+        conditional=True,  # 支持If-None-Match和Range请求
+        etag=blob_hash,
+        max_age=BLOB_MAX_AGE
+    )
+    response.headers['Cache-Control'] = f'public, max-age={BLOB_MAX_AGE}, immutable'
+    # 直接打开文件时禁止执行其中的脚本（SVG），并禁止浏览器猜测类型
+    response.headers['Content-Security-Policy'] = 'sandbox'
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
 
-        if note_id:
-            response_data['note_id'] = note_id
-            response_data['message'] = 'Note saved successfully'
 
-        return jsonify(response_data)
+@app.route('/generate-mindmap', methods=['POST'])
+def generate_mindmap():
+    """接收文本并生成思维导图，并选择性保存为笔记"""
+    try:
+        data = request.get_json()
+        response_data, status = run_async(generate_mindmap_async(data))
+        return jsonify(response_data), status
 
     except Exception as e:
         import traceback
@@ -282,6 +956,391 @@ def generate_mindmap():
         }), 500
 
 
+def _load_note_chunks(note_id: int):
+    """读取笔记内容及上次生成时的分块结果，笔记不存在返回None"""
+    with app.app_context():
+        note = Note.query.get(note_id)
+        if not note:
+            return None
+        previous = {chunk.content_hash: chunk.summary for chunk in note.chunks}
+        return note.user_id, note.content, previous
+
+
+def _save_note_chunks(note_id: int, chunk_results, image: str) -> None:
+    """保存笔记的分块结果并更新思维导图图片"""
+    with app.app_context():
+        try:
+            note = Note.query.get(note_id)
+            note.chunks = [
+                NoteChunk(position=position, content_hash=content_hash, summary=summary)
+                for position, (content_hash, summary) in enumerate(chunk_results)
+            ]
+            note.image = image
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+async def regenerate_note_mindmap_async(note_id: int):
+    """
+    根据笔记内容增量重新生成思维导图：只对内容变化的分块调用API
+
+    返回:
+        (响应数据, HTTP状态码)
+    """
+    start_time = time.time()
+
+    loaded = await asyncio.to_thread(_load_note_chunks, note_id)
+    if loaded is None:
+        return {'error': 'Note not found'}, 404
+    user_id, content, previous = loaded
+
+    result, chunk_results, reused = await ai_handler.process_text_incremental(
+        content,
+        prompts["prompt"],
+        prompts["merge_prompt"],
+        previous=previous
+    )
+
+    try:
+        mindmap_path = await asyncio.to_thread(_render_mindmap, result)
+    except RenderTimeoutError as e:
+        return {'success': False, 'error': f"Failed to generate mindmap: {str(e)}"}, 504
+    except Exception as e:
+        return {'success': False, 'error': f"Failed to generate mindmap: {str(e)}"}, 500
+
+    image_hash = await asyncio.to_thread(blob_store.put_file, mindmap_path)
+    await asyncio.to_thread(_save_note_chunks, note_id, chunk_results, image_hash)
+
+    return {
+        'success': True,
+        'note_id': note_id,
+        'processed_text': result,
+        'mindmap_path': mindmap_path,
+        'image_hash': image_hash,
+        'image_url': f'/blobs/{image_hash}',
+        'chunks': len(chunk_results),
+        'reused_chunks': reused,
+        'processing_time': time.time() - start_time
+    }, 200
+
+
+@app.route('/api/notes/<int:note_id>/mindmap', methods=['POST'])
+def regenerate_note_mindmap(note_id):
+    """根据笔记内容增量重新生成思维导图"""
+    try:
+        response_data, status = run_async(regenerate_note_mindmap_async(note_id))
+        return jsonify(response_data), status
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def format_sse(event: str, data: dict) -> str:
+    """格式化一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_mindmap_outline(data: dict):
+    """流式生成思维导图大纲，以SSE消息的形式逐段产出"""
+    if not data or 'text' not in data:
+        yield format_sse('error', {'error': 'Missing text parameter'})
+        return
+
+    start_time = time.time()
+    parts = []
+    try:
+        if ai_handler.is_long_text(data['text']):
+            # 长文本需要分块提取后合并，无法逐段输出，合并完成后一次性下发
+            result = await ai_handler.process_text(
+                data['text'],
+                prompts["prompt"],
+                merge_prompt_template=prompts["merge_prompt"]
+            )
+            parts.append(result)
+            yield format_sse('delta', {'text': result})
+        else:
+            async for delta in ai_handler.process_text_stream(data['text'], prompts["prompt"]):
+                parts.append(delta)
+                yield format_sse('delta', {'text': delta})
+    except Exception as e:
+        yield format_sse('error', {'error': str(e)})
+        return
+
+    yield format_sse('done', {
+        'processed_text': "".join(parts),
+        'processing_time': time.time() - start_time
+    })
+
+
+# SSE响应头，关闭代理缓冲以便逐段下发
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+
+@app.route('/generate-mindmap/stream', methods=['POST'])
+def generate_mindmap_stream():
+    """以Server-Sent Events流式返回思维导图的Markdown大纲"""
+    data = request.get_json(silent=True)
+    return Response(
+        runner.iterate(stream_mindmap_outline(data)),
+        mimetype='text/event-stream',
+        headers=SSE_HEADERS
+    )
+
+
+def _run_mindmap_job(payload: dict) -> dict:
+    """后台任务处理函数：生成思维导图，失败时抛出异常"""
+    response_data, status = run_async(generate_mindmap_async(payload))
+    if status != 200:
+        raise Exception(response_data.get('error', f'HTTP {status}'))
+    return response_data
+
+
+# 思维导图后台任务队列
+mindmap_jobs = JobQueue(_run_mindmap_job, db_path=JOB_DB_PATH, workers=JOB_WORKERS)
+
+
+@app.route('/api/mindmap-jobs', methods=['POST'])
+def submit_mindmap_job():
+    """提交思维导图生成任务，立即返回任务ID"""
+    try:
+        data = request.get_json()
+        if not data or 'text' not in data:
+            return jsonify({'error': 'Missing text parameter'}), 400
+
+        mindmap_jobs.start()
+        job_id = mindmap_jobs.submit(data)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': JobQueue.PENDING,
+            'status_url': f'/api/mindmap-jobs/{job_id}'
+        }), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/mindmap-jobs/<job_id>', methods=['GET'])
+def get_mindmap_job(job_id):
+    """查询思维导图任务状态，完成后返回结果"""
+    try:
+        job = mindmap_jobs.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'job': job
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def parse_batch_request(data: dict):
+    """
+    解析批量生成请求
+
+    请求参数:
+        texts: 文本列表，元素为字符串或{"text": ..., "title": ...}
+        note_ids: 已有笔记ID列表，生成的思维导图图片写回对应笔记
+        其余参数（user_id、save_as_note、output_format、renderer、image_format、semantic_cache）与/generate-mindmap相同
+
+    返回:
+        (条目列表, 错误信息)，参数有效时错误信息为None
+    """
+    if not data:
+        return None, 'Missing texts or note_ids parameter'
+    texts = data.get('texts') or []
+    note_ids = data.get('note_ids') or []
+    if not isinstance(texts, list) or not isinstance(note_ids, list):
+        return None, 'texts and note_ids must be lists'
+    if not texts and not note_ids:
+        return None, 'Missing texts or note_ids parameter'
+    if len(texts) + len(note_ids) > BATCH_MAX_ITEMS:
+        return None, f'Too many items, at most {BATCH_MAX_ITEMS} per batch'
+    _, _, _, error = _render_options(data)
+    if error:
+        return None, error
+
+    items = []
+    for text in texts:
+        if isinstance(text, dict):
+            items.append({'index': len(items), 'text': text.get('text'), 'title': text.get('title')})
+        else:
+            items.append({'index': len(items), 'text': text, 'title': None})
+    for note_id in note_ids:
+        if not isinstance(note_id, int):
+            return None, f'Invalid note id: {note_id}'
+        items.append({'index': len(items), 'note_id': note_id})
+    return items, None
+
+
+def _load_batch_notes(items: list) -> None:
+    """一次查询读取条目引用的笔记内容，笔记不存在的条目记录错误"""
+    note_ids = [item['note_id'] for item in items if 'note_id' in item]
+    if not note_ids:
+        return
+    with app.app_context():
+        notes = Note.query.options(load_only(Note.id, Note.title, Note.content)) \
+            .filter(Note.id.in_(note_ids)).all()
+        contents = {note.id: (note.title, note.content) for note in notes}
+    for item in items:
+        if 'note_id' not in item:
+            continue
+        if item['note_id'] not in contents:
+            item['error'] = 'Note not found'
+        else:
+            item['title'], item['text'] = contents[item['note_id']]
+
+
+def _save_batch_notes(user_id, new_notes: list, updated_images: list) -> list:
+    """
+    在一个事务中批量插入新笔记并更新已有笔记的图片
+
+    参数:
+        new_notes: (条目序号, 标题, 内容, 图片哈希)列表
+        updated_images: (笔记ID, 图片哈希)列表
+
+    返回:
+        [(条目序号, 新笔记ID)]
+    """
+    with app.app_context():
+        try:
+            notes = [
+                Note(user_id=user_id, title=title, content=content, image=image)
+                for _, title, content, image in new_notes
+            ]
+            db.session.add_all(notes)
+            if updated_images:
+                db.session.bulk_update_mappings(Note, [
+                    {'id': note_id, 'image': image}
+                    for note_id, image in updated_images
+                ])
+            db.session.commit()
+            return [(index, note.id) for (index, _, _, _), note in zip(new_notes, notes)]
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+async def _process_batch_item(item: dict, data: dict, output_format: str, renderer: str, image_format: str) -> dict:
+    """处理批量请求中的一个条目，返回该条目的结果行，失败时返回错误信息而不抛出异常"""
+    line = {'type': 'item', 'index': item['index']}
+    if 'note_id' in item:
+        line['note_id'] = item['note_id']
+    if item.get('error'):
+        line.update({'success': False, 'error': item['error']})
+        return line
+    if not item.get('text'):
+        line.update({'success': False, 'error': 'Missing text'})
+        return line
+
+    try:
+        result = await ai_handler.process_text(
+            item['text'],
+            prompts["prompt"],
+            semantic=data.get('semantic_cache'),
+            merge_prompt_template=prompts["merge_prompt"]
+        )
+        line.update({'success': True, 'processed_text': result})
+        if output_format == 'json':
+            line['outline'] = parse_outline(result).to_compact()
+        else:
+            image_hash, _ = await asyncio.to_thread(_render_mindmap_blob, result, renderer, image_format)
+            line.update({'image_hash': image_hash, 'image_url': f'/blobs/{image_hash}',
+                         'image_expires_in': ORPHAN_IMAGE_MIN_AGE})
+    except Exception as e:
+        line.update({'success': False, 'error': str(e)})
+    return line
+
+
+async def batch_mindmap_stream(data: dict, items: list):
+    """
+    批量生成思维导图，每个条目完成后立即产出一行NDJSON（完成顺序，按index对应请求中的位置），
+    全部完成后在一个事务中保存笔记，最后产出汇总行
+    """
+    start_time = time.time()
+    output_format, renderer, image_format, _ = _render_options(data)
+    user_id = data.get('user_id')
+    save_as_note = data.get('save_as_note', False) and user_id
+
+    await asyncio.to_thread(_load_batch_notes, items)
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def run(item):
+        async with semaphore:
+            return await _process_batch_item(item, data, output_format, renderer, image_format)
+
+    new_notes, updated_images = [], []
+    succeeded = failed = 0
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    try:
+        for future in asyncio.as_completed(tasks):
+            line = await future
+            if line['success']:
+                succeeded += 1
+                item = items[line['index']]
+                if 'note_id' in item:
+                    if line.get('image_hash'):
+                        updated_images.append((item['note_id'], line['image_hash']))
+                elif save_as_note:
+                    title = item.get('title') or \
+                        f"思维导图笔记 {datetime.now().strftime('%Y-%m-%d %H:%M')} #{item['index'] + 1}"
+                    new_notes.append((item['index'], title, line['processed_text'], line.get('image_hash')))
+            else:
+                failed += 1
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        # 客户端断开连接时取消未完成的条目
+        for task in tasks:
+            task.cancel()
+
+    summary = {'type': 'summary', 'total': len(items), 'succeeded': succeeded, 'failed': failed}
+    if new_notes or updated_images:
+        new_notes.sort(key=lambda note: note[0])  # 按请求中的顺序插入
+        try:
+            saved = await asyncio.to_thread(_save_batch_notes, user_id, new_notes, updated_images)
+            summary['saved_notes'] = [{'index': index, 'note_id': note_id} for index, note_id in saved]
+            summary['updated_notes'] = [note_id for note_id, _ in updated_images]
+        except Exception as e:
+            summary['save_error'] = str(e)
+    summary['processing_time'] = time.time() - start_time
+    yield json.dumps(summary, ensure_ascii=False) + "\n"
+
+
+@app.route('/generate-mindmap/batch', methods=['POST'])
+def generate_mindmap_batch():
+    """批量生成思维导图，以NDJSON逐行返回每个条目的结果，最后一行为汇总"""
+    data = request.get_json(silent=True)
+    items, error = parse_batch_request(data)
+    if error:
+        return jsonify({'error': error}), 400
+    return Response(
+        runner.iterate(batch_mindmap_stream(data, items)),
+        mimetype='application/x-ndjson',
+        headers=SSE_HEADERS
+    )
+
+
+@app.route('/api/ai/stats', methods=['GET'])
+def get_ai_stats():
+    """获取AI调用的缓存命中与请求合并统计"""
+    return jsonify({
+        'success': True,
+        'stats': ai_handler.get_stats(),
+        'render_cache': render_cache.get_stats(),
+        'render_pool': render_pool.get_stats(),
+        'embedding_index': embedding_index.get_stats(),
+        'knowledge_graph': triple_store.stats()
+    })
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
@@ -293,10 +1352,24 @@ def health_check():
         return jsonify({'status': 'error', 'database': 'disconnected', 'error': str(e)}), 500
 
 
-if __name__ == "__main__":
+def main():
+    """命令行入口（通过run.py调用）"""
     import sys
 
-    if len(sys.argv) > 1 and sys.argv[1] == "--cli":
+    if len(sys.argv) > 1 and sys.argv[1] == "--migrate":
+        # 数据库迁移模式 - 创建新表并为已有表补充索引
+        with app.app_context():
+            run_migrations()
+
+    elif len(sys.argv) > 1 and sys.argv[1] == "--reindex":
+        # 重建全文检索索引和向量索引（首次启用检索、索引文件丢失或更换向量模型时执行）
+        rebuild_search_index()
+
+    elif len(sys.argv) > 1 and sys.argv[1] == "--cleanup-images":
+        # 清理孤立图片，可配置为定时任务
+        print(f"孤立图片清理完成:{cleanup_orphan_images()}")
+
+    elif len(sys.argv) > 1 and sys.argv[1] == "--cli":
         # 命令行模式 - 为了兼容原有功能
         with app.app_context():
             db.create_all()  # 确保表已创建
@@ -313,7 +1386,7 @@ if __name__ == "__main__":
                     print(f"结果总结：{result}")
 
                     print(f"开始生成思维导图")
-                    mindmap_generator.generate(result)
+                    render_cache.record_generated(mindmap_generator.generate(result))
 
             start_time = time.time()
             notebook = Notebook()
@@ -322,4 +1395,16 @@ if __name__ == "__main__":
             print(f"方法调用耗时为：{end_time-start_time}s")
 
     else:
-        app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+        if DEFAULT_RENDERER == 'ete3':
+            render_pool.start()
+        mindmap_jobs.start()
+        app.run(host='0.0.0.0', port=5000, debug=True)
+
+
+if __name__ == "__main__":
+    # 直接运行app.py时本模块是主模块，spawn启动的渲染进程会以__mp_main__的名字重新执行本模块的全部初始化，
+    # 转交给只在__main__分支中导入app的run.py执行
+    import sys
+
+    os.execv(sys.executable, [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run.py')]
+             + sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+ASGI入口：常驻单一事件循环，所有请求共享同一个AIHandler客户端
+
+启动方式:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+/generate-mindmap 等耗时的大模型路由直接在事件循环中以协程方式处理，
+其余路由通过WsgiToAsgi转交给原有的Flask应用（在线程池中执行）。
+"""
+import asyncio
+import json
+import traceback
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    app, ai_handler, generate_mindmap_async, mindmap_jobs, render_pool, stream_mindmap_outline, SSE_HEADERS,
+    DEFAULT_RENDERER, parse_batch_request, batch_mindmap_stream
+)
+from utils.async_runner import runner
+
+flask_application = WsgiToAsgi(app)
+
+
+async def read_json_body(receive):
+    """读取请求体并解析为JSON，解析失败返回None"""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+async def send_json(send, data: dict, status: int = 200, headers=None):
+    """发送JSON响应"""
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    response_headers = [
+        (b"content-type", b"application/json; charset=utf-8"),
+        (b"content-length", str(len(body)).encode()),
+    ]
+    for key, value in (headers or {}).items():
+        response_headers.append((key.lower().encode(), str(value).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": response_headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def generate_mindmap(scope, receive, send):
+    """原生异步的思维导图生成路由"""
+    try:
+        data = await read_json_body(receive)
+        response_data, status = await generate_mindmap_async(data)
+        await send_json(send, response_data, status)
+    except Exception as e:
+        traceback.print_exc()
+        await send_json(send, {'success': False, 'error': str(e)}, 500)
+
+
+async def send_stream(send, events, content_type: bytes):
+    """逐段发送异步生成器产出的文本"""
+    headers = [(b"content-type", content_type)]
+    headers += [(key.lower().encode(), value.encode()) for key, value in SSE_HEADERS.items()]
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+    try:
+        async for event in events:
+            await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+    finally:
+        await events.aclose()
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def generate_mindmap_stream(scope, receive, send):
+    """原生异步的SSE流式大纲路由"""
+    data = await read_json_body(receive)
+    await send_stream(send, stream_mindmap_outline(data), b"text/event-stream; charset=utf-8")
+
+
+async def generate_mindmap_batch(scope, receive, send):
+    """原生异步的批量生成路由，以NDJSON逐行返回结果"""
+    data = await read_json_body(receive)
+    items, error = parse_batch_request(data)
+    if error:
+        await send_json(send, {'error': error}, 400)
+        return
+    await send_stream(send, batch_mindmap_stream(data, items), b"application/x-ndjson")
+
+
+# 原生异步路由表: (方法, 路径) -> 处理函数
+NATIVE_ROUTES = {
+    ("POST", "/generate-mindmap"): generate_mindmap,
+    ("POST", "/generate-mindmap/stream"): generate_mindmap_stream,
+    ("POST", "/generate-mindmap/batch"): generate_mindmap_batch,
+}
+
+
+async def lifespan(scope, receive, send):
+    """处理ASGI生命周期事件，绑定/释放常驻事件循环"""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                runner.bind(asyncio.get_running_loop())
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            if DEFAULT_RENDERER == 'ete3':
+                render_pool.start()
+            mindmap_jobs.start()
+            print("ASGI服务启动，已绑定事件循环")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await asyncio.to_thread(mindmap_jobs.stop, 5)
+            await asyncio.to_thread(render_pool.shutdown)
+            await ai_handler.close()
+            runner.unbind()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI应用入口"""
+    if scope["type"] == "lifespan":
+        await lifespan(scope, receive, send)
+        return
+
+    if scope["type"] == "http":
+        handler = NATIVE_ROUTES.get((scope["method"], scope["path"].rstrip("/") or "/"))
+        if handler is not None:
+            await handler(scope, receive, send)
+            return
+
+    await flask_application(scope, receive, send)
@@ -0,0 +1,70 @@
+"""
+大纲解析器微基准测试
+
+用法（在ai-note-book目录下执行）:
+    python benchmarks/outline_parser_bench.py [行数]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.outline_parser import parse_outline  # noqa: E402
+
+
+def make_mixed(lines: int) -> str:
+    """标题 + 多级列表（- * + 和编号列表混用），接近模型输出的大纲"""
+    out = ["# 根节点"]
+    i = 0
+    while len(out) < lines:
+        out.append(f"## 子概念{i}")
+        out.append(f"### 详细解释{i}")
+        out.append(f"- 要点{i}")
+        out.append(f"  * 细节{i}")
+        out.append(f"    + 补充{i}")
+        out.append(f"1. 步骤{i}")
+        out.append(f"2) 步骤{i}")
+        out.append("")
+        i += 1
+    return "\n".join(out[:lines])
+
+
+def make_flat(lines: int) -> str:
+    """根节点下的单层列表"""
+    return "\n".join(["# 根节点"] + [f"- 条目{i}" for i in range(lines - 1)])
+
+
+def make_deep(lines: int, depth: int = 500) -> str:
+    """反复加深再回到顶层的嵌套列表，单个分支深度为depth"""
+    out = ["# 根节点"]
+    while len(out) < lines:
+        for d in range(depth):
+            out.append(" " * (d * 2) + f"- 第{d}层")
+    return "\n".join(out[:lines])
+
+
+def bench(name: str, text: str, repeat: int = 5):
+    best = float("inf")
+    outline = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outline = parse_outline(text)
+        best = min(best, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    outline.to_nested()
+    nested = time.perf_counter() - start
+
+    lines = text.count("\n") + 1
+    print(
+        f"{name:<8} 行数:{lines:>8} 节点:{len(outline):>8} 最大深度:{max(outline.depths):>5} "
+        f"解析:{best * 1000:>8.1f}ms ({lines / best / 1e6:.2f}M行/s) 转嵌套列表:{nested * 1000:>7.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    bench("mixed", make_mixed(count))
+    bench("flat", make_flat(count))
+    bench("deep", make_deep(count))
@@ -0,0 +1,137 @@
+"""
+全文检索索引基准测试：批量写入合成的中文笔记，统计写入速度、索引大小和查询延迟
+
+用法（在ai-note-book目录下执行）:
+    python benchmarks/search_index_bench.py [--notes 1000000] [--users 1000] [--queries 1000]
+
+--users 1 表示所有笔记属于同一个用户，是单次查询扫描倒排列表最长的情况
+
+查询词从随机抽样的笔记内容中截取（2~4个字，包含CJK二元组），在该笔记所属用户的范围内检索，
+每个all查询至少命中抽样的那篇笔记，统计的是有结果时的打分和排序耗时
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.search_index import SearchIndex  # noqa: E402
+
+# 常用汉字，用于生成词表
+COMMON_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所"
+    "民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那"
+    "社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通"
+)
+
+
+def make_vocabulary(size: int, rng: random.Random):
+    return ["".join(rng.choice(COMMON_CHARS) for _ in range(rng.randint(2, 4))) for _ in range(size)]
+
+
+def make_notes(count: int, users: int, vocabulary, rng: random.Random, words_per_note: int):
+    for doc_id in range(1, count + 1):
+        title = "".join(rng.choice(vocabulary) for _ in range(3))
+        content = "，".join(
+            "".join(rng.choice(vocabulary) for _ in range(5))
+            for _ in range(words_per_note // 5)
+        ) + "。"
+        yield doc_id, rng.randint(1, users), title, content
+
+
+def make_query(content: str, rng: random.Random) -> str:
+    """从笔记内容中截取1~3个2~4字的片段作为查询词，片段不跨标点，分词后的二元组都出现在该笔记中"""
+    phrases = [phrase for phrase in content.rstrip("。").split("，") if len(phrase) >= 2]
+    words = []
+    for _ in range(rng.randint(1, 3)):
+        phrase = rng.choice(phrases)
+        length = min(len(phrase), rng.randint(2, 4))
+        start = rng.randint(0, len(phrase) - length)
+        words.append(phrase[start:start + length])
+    return " ".join(words)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--words", type=int, default=20, help="每篇笔记内容的词数")
+    parser.add_argument("--batch", type=int, default=10000)
+    parser.add_argument("--db", default=None, help="索引文件路径，默认使用临时文件")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(5000, rng)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "search_index_bench.db")
+    index = SearchIndex(db_path)
+
+    start = time.perf_counter()
+    batch = []
+    indexed = 0
+    samples = {}  # 蓄水池抽样的笔记 {doc_id: (用户ID, 内容)}，用于生成查询
+    for doc in make_notes(args.notes, args.users, vocabulary, rng, args.words):
+        doc_id, user_id, _, content = doc
+        if len(samples) < args.queries:
+            samples[doc_id] = (user_id, content)
+        elif rng.randint(1, doc_id) <= args.queries:
+            del samples[rng.choice(list(samples))]
+            samples[doc_id] = (user_id, content)
+        batch.append(doc)
+        if len(batch) >= args.batch:
+            indexed += index.index_many(batch)
+            batch = []
+            elapsed = time.perf_counter() - start
+            print(f"\r已写入{indexed}篇，{indexed / elapsed:.0f}篇/s", end="", flush=True)
+    if batch:
+        indexed += index.index_many(batch)
+    elapsed = time.perf_counter() - start
+    size = sum(os.path.getsize(db_path + suffix) for suffix in ("", "-wal") if os.path.exists(db_path + suffix))
+    print(f"\r写入{indexed}篇，耗时{elapsed:.1f}s（{indexed / elapsed:.0f}篇/s），索引大小{size / 1024 / 1024:.1f}MB")
+
+    # 增量更新：单篇笔记修改后重新索引
+    updates = [next(make_notes(1, args.users, vocabulary, rng, args.words)) for _ in range(200)]
+    start = time.perf_counter()
+    updated = []
+    for _, user_id, title, content in updates:
+        doc_id = rng.randint(1, args.notes)
+        index.index(doc_id, user_id, title, content)
+        updated.append((doc_id, user_id, content))
+    print(f"单篇更新平均{(time.perf_counter() - start) / len(updates) * 1000:.2f}ms")
+    for doc_id, user_id, content in updated:
+        if doc_id in samples:
+            samples[doc_id] = (user_id, content)  # 抽样的笔记被更新过，按更新后的内容生成查询
+
+    sampled = list(samples.values())
+    for match_all in (True, False):
+        latencies = []
+        hits = 0
+        answered = 0
+        for _ in range(args.queries):
+            user_id, content = rng.choice(sampled)
+            query = make_query(content, rng)
+            start = time.perf_counter()
+            total, _ = index.search(user_id, query, limit=20, match_all=match_all)
+            latencies.append((time.perf_counter() - start) * 1000)
+            hits += total
+            answered += total > 0
+            if match_all and total == 0:
+                raise AssertionError(f"查询没有命中来源笔记:{query}")
+        print(
+            f"查询({'all' if match_all else 'any'}) {args.queries}次: "
+            f"p50 {percentile(latencies, 0.5):.2f}ms  p95 {percentile(latencies, 0.95):.2f}ms  "
+            f"p99 {percentile(latencies, 0.99):.2f}ms  平均命中{hits / args.queries:.1f}篇  "
+            f"有结果{answered / args.queries:.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
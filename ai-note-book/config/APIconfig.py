@@ -1,15 +1,61 @@
+import os
+
+
 class APIConfig:
     # 并发设置
     MAX_CONCURRENT = 5  # 最大并发数
     MAX_RETRIES = 3  # 最大重试次数
     RETRY_DELAY = 0.5  # 重试间隔时间，单位：（second）
+    MAX_RETRY_DELAY = 30.0  # 指数退避的最大等待时间，单位：（second）
+
+    # 限流设置，0表示不限制
+    REQUESTS_PER_MINUTE = 300  # 每分钟最大请求数
+    TOKENS_PER_MINUTE = 1000000  # 每分钟最大token数（提示词+生成）
+
+    # 缓存设置
+    CACHE_DB_NAME = 'llm_cache.db'  # 缓存数据库文件名（位于cache目录下）
+    CACHE_TTL_DAYS = 7  # 缓存过期天数
+    CACHE_MAX_BYTES = 256 * 1024 * 1024  # 缓存内容总大小上限
+    CACHE_MEMORY_ITEMS = 256  # 内存LRU层缓存条目数
 
-    # TODO openai设置
+    # 相似文本缓存设置
+    SEMANTIC_CACHE_ENABLED = False  # 是否默认使用相似文本缓存（请求中可通过semantic_cache参数单独开启）
+    SEMANTIC_CACHE_DB_NAME = 'semantic_cache.db'  # 相似文本缓存数据库文件名（位于cache目录下）
+    SEMANTIC_CACHE_THRESHOLD = 0.9  # 相似度阈值
+    SEMANTIC_CACHE_MAX_ENTRIES = 10000  # 最多保存的条目数
+
+    # openai设置，也适用于其他兼容OpenAI接口的服务（通过OPENAI_API_BASE指定地址）
+    OPENAI_MODEL = 'gpt-4o-mini'  # 定义openai模型名称
+    OPENAI_TEMPERATURE = 1.0  # 定义温度参数
+    OPENAI_MAX_TOKENS = 4096  # 定义最大token
+    OPENAI_CONTEXT_TOKENS = 128000  # 定义上下文长度
+
+    # 本地服务设置，用于测试（test/stub_llm_server.py）或本地部署的兼容OpenAI接口的模型
+    LOCAL_MODEL = 'stub'  # 定义本地模型名称
+    LOCAL_TEMPERATURE = 1.0  # 定义温度参数
+    LOCAL_MAX_TOKENS = 4096  # 定义最大token
+    LOCAL_CONTEXT_TOKENS = 32768  # 定义上下文长度
 
     # deepseek设置,deepseek使用openai包
     DEEPSEEK_MODEL = 'deepseek-chat'  # 定义deepseek模型名称
     DEEPSEEK_TEMPERATURE = 1.0  # 定义温度参数
     DEEPSEEK_MAX_TOKENS = 4096  # 定义最大token
+    DEEPSEEK_CONTEXT_TOKENS = 65536  # 定义上下文长度
+
+    # 分块设置
+    CHUNK_MAX_TOKENS = 6000  # 单个文本块的token上限，超过该长度的文本会分块处理
+    CHUNK_OVERLAP_TOKENS = 200  # 相邻文本块之间重叠的token数
+
+    # 合并设置
+    MERGE_FAN_IN = 3  # 树形合并时每批合并的总结数量
+
+    # 多后端路由设置
+    PROVIDER_TIMEOUT = 120.0  # 单次请求超时时间，超时后切换到下一个后端，单位：（second）
+    PROVIDER_EWMA_ALPHA = 0.3  # 延迟和错误率的指数加权平均系数，越大越偏向最近的请求
+    PROVIDER_ERROR_THRESHOLD = 0.5  # 错误率超过该值且连续失败时暂停使用该后端
+    PROVIDER_COOLDOWN = 30.0  # 暂停使用的时间，之后重新尝试，单位：（second）
+    PROVIDER_ERROR_HALF_LIFE = 60.0  # 错误率随时间衰减的半衰期，没有新请求的后端错误率也会逐渐恢复，单位：（second）
+    FAILOVER_RETRIES = 0  # 有多个后端时，单个后端的重试次数（失败后直接切换到下一个后端）
 
     def get_config( provider: str) -> dict:
         """获取API配置"""
@@ -18,6 +64,30 @@ class APIConfig:
                 "model": APIConfig.DEEPSEEK_MODEL,
                 "temperature": APIConfig.DEEPSEEK_TEMPERATURE,
                 "max_tokens": APIConfig.DEEPSEEK_MAX_TOKENS,
-                "api_base": "https://api.deepseek.com/v1"
+                "context_tokens": APIConfig.DEEPSEEK_CONTEXT_TOKENS,
+                "api_base": "https://api.deepseek.com/v1",
+                "api_key_env": "DEEPSEEK_API_KEY",
+                "api_base_env": "DEEPSEEK_API_KEY_API_BASE"
+            }
+        elif provider == 'openai':
+            return {
+                "model": os.getenv("OPENAI_MODEL", APIConfig.OPENAI_MODEL),
+                "temperature": APIConfig.OPENAI_TEMPERATURE,
+                "max_tokens": APIConfig.OPENAI_MAX_TOKENS,
+                "context_tokens": APIConfig.OPENAI_CONTEXT_TOKENS,
+                "api_base": "https://api.openai.com/v1",
+                "api_key_env": "OPENAI_API_KEY",
+                "api_base_env": "OPENAI_API_BASE"
+            }
+        elif provider == 'local':
+            return {
+                "model": os.getenv("LOCAL_LLM_MODEL", APIConfig.LOCAL_MODEL),
+                "temperature": APIConfig.LOCAL_TEMPERATURE,
+                "max_tokens": APIConfig.LOCAL_MAX_TOKENS,
+                "context_tokens": APIConfig.LOCAL_CONTEXT_TOKENS,
+                "api_base": "http://127.0.0.1:8001/v1",
+                "api_key_env": "LOCAL_LLM_API_KEY",
+                "api_base_env": "LOCAL_LLM_API_BASE",
+                "api_key_optional": True  # 本地服务不校验密钥
             }
-        # TODO elif provider == "openai":
+        raise ValueError(f"不支持的provider:{provider}")
@@ -8,6 +8,10 @@ DB_CONFIG = {
     'database': os.environ.get('DB_NAME', 'ai_notebook')
 }
 
+# SQL日志配置
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))  # 慢查询阈值，单位：（millisecond）
+SQL_LOG_ALL = os.environ.get('SQL_LOG_ALL', '0') == '1'  # 是否输出每个请求的全部SQL语句
+
 def get_db_uri():
     """获取数据库URI"""
     return f"mysql+pymysql://{DB_CONFIG['username']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}/{DB_CONFIG['database']}"
\ No newline at end of file
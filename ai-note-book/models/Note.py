@@ -1,31 +1,69 @@
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
 from . import db
+from utils.blob_store import is_blob_hash
 
 
 class Note(db.Model):
     """笔记模型类"""
     __tablename__ = 'notes'
+    __table_args__ = (
+        # 列表查询按user_id过滤并按update_time倒序排序
+        db.Index('ix_notes_user_update', 'user_id', 'update_time'),
+    )
+
+    # to_dict默认返回的字段
+    FIELDS = ('id', 'user_id', 'title', 'content', 'image', 'image_url', 'create_time', 'update_time')
+    # 非数据库列的字段 -> 所依赖的列
+    DERIVED_FIELDS = {'image_url': 'image'}
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, nullable=False)
     title = db.Column(db.String(255), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    image = db.Column(db.Text)  # 存储图像路径或Base64编码
+    image = db.Column(db.String(64))  # 图片在文件存储中的SHA-256哈希
     create_time = db.Column(db.DateTime, default=datetime.utcnow)
     update_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 每次修改加1；update_time只精确到秒，同一秒内的两次修改靠version区分
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
+    # 分块哈希与提取结果，删除笔记时一并删除
+    chunks = db.relationship(
+        'NoteChunk',
+        backref='note',
+        cascade='all, delete-orphan',
+        order_by='NoteChunk.position',
+        passive_deletes=True
+    )
+
+    @property
+    def image_url(self):
+        """图片访问地址"""
+        return f"/blobs/{self.image}" if is_blob_hash(self.image) else None
 
-    def to_dict(self):
-        """将模型实例转换为字典"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'title': self.title,
-            'content': self.content,
-            'image': self.image,
-            'create_time': self.create_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'update_time': self.update_time.strftime('%Y-%m-%d %H:%M:%S')
-        }
+    def to_dict(self, fields=None):
+        """
+        将模型实例转换为字典
+
+        参数:
+            fields: 需要返回的字段列表，为None时返回全部字段（只访问列出的字段，不会触发延迟加载列的查询）
+        """
+        data = {}
+        for field in fields or self.FIELDS:
+            value = getattr(self, field)
+            if isinstance(value, datetime):
+                value = value.strftime('%Y-%m-%d %H:%M:%S')
+            data[field] = value
+        return data
 
     def __repr__(self):
         """返回模型的字符串表示"""
-        return f'<Note {self.id}: {self.title}>'
\ No newline at end of file
+        return f'<Note {self.id}: {self.title}>'
+
+
+@event.listens_for(Note, 'before_update')
+def _bump_note_version(mapper, connection, target):
+    """修改笔记时把version加1（在数据库中计算，并发修改也不会得到相同的版本号）"""
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = Note.version + 1
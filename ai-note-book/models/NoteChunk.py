@@ -0,0 +1,26 @@
+from datetime import datetime
+from . import db
+
+
+class NoteChunk(db.Model):
+    """笔记分块模型类，保存每个分块的内容哈希和提取结果，用于增量生成思维导图"""
+    __tablename__ = 'note_chunks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('notes.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)  # 分块在笔记中的顺序
+    content_hash = db.Column(db.String(64), nullable=False)  # 分块内容的SHA-256
+    summary = db.Column(db.Text, nullable=False)  # 分块的提取结果
+    create_time = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """将模型实例转换为字典"""
+        return {
+            'position': self.position,
+            'content_hash': self.content_hash,
+            'create_time': self.create_time.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def __repr__(self):
+        """返回模型的字符串表示"""
+        return f'<NoteChunk {self.note_id}#{self.position}: {self.content_hash[:8]}>'
@@ -0,0 +1,19 @@
+"""
+命令行入口
+
+用法:
+    python run.py                   启动开发服务器
+    python run.py --migrate         数据库迁移
+    python run.py --reindex         重建全文检索索引和向量索引
+    python run.py --cleanup-images  清理孤立图片
+    python run.py --cli             命令行模式
+
+渲染进程池用spawn启动工作进程，工作进程会以__mp_main__的名字重新执行主模块。
+这里只在__main__分支中导入app，工作进程只导入utils中的渲染函数，
+不会重复执行app中的初始化（数据库、索引、任务队列、大模型客户端等）
+"""
+
+if __name__ == "__main__":
+    from app import main
+
+    main()
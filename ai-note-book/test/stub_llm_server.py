@@ -0,0 +1,124 @@
+"""
+本地大模型桩服务：实现兼容OpenAI的/v1/chat/completions接口（含流式输出），用于在不调用真实API的情况下
+测试多后端路由、切换和缓存
+
+用法:
+    python test/stub_llm_server.py --port 8001 --latency 0.2 --fail-rate 0.3
+    LLM_PROVIDERS=local,deepseek LOCAL_LLM_API_BASE=http://127.0.0.1:8001/v1 python run.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MINDMAP_REPLY = """# 测试文档
+## 第一部分
+- 要点一
+- 要点二
+## 第二部分
+- 要点三
+"""
+
+KNOWLEDGE_GRAPH_REPLY = """实体列表:
+E1: 百度 (公司)
+E2: 李彦宏 (人物)
+
+关系列表:
+(E1, 创始人, E2)
+
+属性列表:
+(E2, 出生日期, 1968年11月17日)
+"""
+
+
+def build_reply(prompt: str) -> str:
+    """按提示词类型返回固定格式的结果，末尾附上提示词摘要，便于区分不同请求"""
+    reply = KNOWLEDGE_GRAPH_REPLY if "Knowledge Graph" in prompt else MINDMAP_REPLY
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    return f"{reply}- 请求{digest}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    fail_rate = 0.0
+
+    def _send_json(self, status: int, data: dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+
+        time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self._send_json(503, {"error": {"message": "stub server failure", "type": "server_error"}})
+            return
+
+        prompt = "\n".join(message.get("content", "") for message in payload.get("messages", []))
+        reply = build_reply(prompt)
+        created = int(time.time())
+        model = payload.get("model", "stub")
+
+        if not payload.get("stream"):
+            self._send_json(200, {
+                "id": f"chatcmpl-{created}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(reply),
+                          "total_tokens": len(prompt) + len(reply)}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        for line in reply.splitlines(keepends=True):
+            chunk = {
+                "id": f"chatcmpl-{created}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": line}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, format, *args):
+        print(f"[stub] {self.address_string()} {format % args}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="兼容OpenAI接口的本地桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的延迟，单位：（second）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回503的比例，0~1")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency
+    StubHandler.fail_rate = args.fail_rate
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"桩服务启动:http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from typing import Optional
+
+
+class AsyncRunner:
+    """
+    常驻事件循环执行器，让同步路由与ASGI路由共用同一个事件循环和AsyncOpenAI连接池
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """获取事件循环，未绑定时在后台线程中启动一个"""
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._start_background_loop()
+            return self._loop
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """绑定外部事件循环（ASGI服务器启动时调用）"""
+        with self._lock:
+            if self._thread is not None:
+                raise RuntimeError("后台事件循环已经启动，无法再绑定外部事件循环")
+            self._loop = loop
+
+    def unbind(self) -> None:
+        """解除外部事件循环绑定（ASGI服务器关闭时调用）"""
+        with self._lock:
+            if self._thread is None:
+                self._loop = None
+
+    def _start_background_loop(self) -> None:
+        """在守护线程中启动常驻事件循环"""
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, name="async-runner", daemon=True)
+        thread.start()
+        self._loop = loop
+        self._thread = thread
+        print("启动常驻事件循环")
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """在常驻事件循环中执行协程并同步等待结果"""
+        loop = self.loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            coro.close()
+            raise RuntimeError("不能在事件循环线程内同步等待协程，请直接await")
+
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return future.result(timeout)
+
+    def submit(self, coro):
+        """提交协程但不等待，返回concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def iterate(self, agen):
+        """以同步迭代器的方式消费异步生成器，每一项都在常驻事件循环中产生"""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            try:
+                self.run(agen.aclose())
+            except Exception:
+                pass
+
+
+# 全局执行器实例
+runner = AsyncRunner()
@@ -0,0 +1,178 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Optional
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+DATA_URL_PATTERN = re.compile(r'^data:([\w/+.-]+)?;base64,', re.IGNORECASE)
+
+# 文件头 -> MIME类型
+MAGIC_NUMBERS = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'<svg', 'image/svg+xml'),
+    (b'<?xml', 'image/svg+xml'),
+]
+
+# 允许用户上传的图片类型；SVG可以包含脚本，只允许服务端生成
+UPLOAD_MIMETYPES = {'image/png', 'image/jpeg', 'image/gif', 'image/webp'}
+
+
+def is_blob_hash(value) -> bool:
+    """判断字符串是否为SHA-256哈希"""
+    return isinstance(value, str) and bool(SHA256_PATTERN.match(value))
+
+
+def sniff_mimetype(head: bytes) -> str:
+    """根据文件头判断MIME类型"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for magic, mimetype in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return mimetype
+    return 'application/octet-stream'
+
+
+class BlobStore:
+    """
+    按内容寻址的文件存储：文件以内容的SHA-256命名，相同内容只保存一份
+    """
+
+    def __init__(self, root: str = 'static/blobs'):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, blob_hash: str) -> str:
+        """哈希对应的文件路径（按前两级哈希分目录，避免单个目录文件过多）"""
+        if not is_blob_hash(blob_hash):
+            raise ValueError(f"无效的文件哈希:{blob_hash}")
+        return os.path.join(self.root, blob_hash[:2], blob_hash[2:4], blob_hash)
+
+    def exists(self, blob_hash: str) -> bool:
+        return is_blob_hash(blob_hash) and os.path.exists(self.path(blob_hash))
+
+    def _write(self, blob_hash: str, write) -> None:
+        """先写临时文件再原子替换，并发写入相同内容也不会产生半个文件"""
+        path = self.path(blob_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                write(file)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put(self, data: bytes) -> str:
+        """保存文件内容，返回SHA-256哈希；内容已存在时直接返回"""
+        blob_hash = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(self.path(blob_hash)):
+            self._write(blob_hash, lambda file: file.write(data))
+        return blob_hash
+
+    def put_file(self, file_path: str, chunk_size: int = 1024 * 1024) -> str:
+        """保存本地文件，返回SHA-256哈希（分块读取，不把整个文件读入内存）"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(chunk_size), b''):
+                digest.update(chunk)
+        blob_hash = digest.hexdigest()
+        if not os.path.exists(self.path(blob_hash)):
+            def copy(target):
+                with open(file_path, 'rb') as source:
+                    shutil.copyfileobj(source, target, chunk_size)
+            self._write(blob_hash, copy)
+        return blob_hash
+
+    def put_base64(self, value: str) -> str:
+        """保存Base64编码（可带data:URL前缀）的内容，返回SHA-256哈希，解码失败时抛出ValueError"""
+        value = DATA_URL_PATTERN.sub('', value.strip(), count=1)
+        try:
+            data = base64.b64decode(value, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("图片不是有效的Base64编码")
+        if not data:
+            raise ValueError("图片内容为空")
+        if sniff_mimetype(data[:16]) not in UPLOAD_MIMETYPES:
+            raise ValueError("只支持上传PNG、JPEG、GIF、WebP图片")
+        return self.put(data)
+
+    def mimetype(self, blob_hash: str) -> str:
+        """读取文件头判断MIME类型"""
+        with open(self.path(blob_hash), 'rb') as file:
+            return sniff_mimetype(file.read(16))
+
+    def iter_hashes(self):
+        """遍历存储中的全部文件哈希"""
+        for _, _, files in os.walk(self.root):
+            for name in files:
+                if is_blob_hash(name):
+                    yield name
+
+    def cleanup(self, referenced, min_age: float = 24 * 3600) -> int:
+        """
+        删除没有被引用的文件，返回删除数量
+
+        参数:
+            referenced: 仍被引用的文件哈希集合
+            min_age: 只删除修改时间早于该时长的文件（刚生成、尚未保存为笔记的图片不会被删除），单位：（second）
+        """
+        deadline = time.time() - min_age
+        removed = 0
+        for blob_hash in list(self.iter_hashes()):
+            if blob_hash in referenced:
+                continue
+            path = self.path(blob_hash)
+            try:
+                if os.path.getmtime(path) < deadline:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        print(f"清理未引用的文件{removed}个")
+        return removed
+
+    def import_image(self, value: Optional[str], allowed_root: str = 'static') -> Optional[str]:
+        """
+        把笔记图片字段的各种旧格式统一转换为文件哈希
+
+        支持: 已有的哈希、allowed_root目录下的本地图片文件路径、Base64编码（可带data:URL前缀）
+        空值返回None，无法识别或不是PNG、JPEG、GIF、WebP图片时抛出ValueError
+        """
+        if not value:
+            return None
+        value = value.strip()
+        if is_blob_hash(value):
+            if not self.exists(value):
+                raise ValueError(f"图片不存在:{value}")
+            return value
+
+        if DATA_URL_PATTERN.match(value):
+            return self.put_base64(value)
+
+        if len(value) < 4096:
+            # 本地文件路径，只允许引用allowed_root目录下的文件
+            real_root = os.path.realpath(allowed_root)
+            real_path = os.path.realpath(value)
+            if os.path.commonpath([real_root, real_path]) == real_root and os.path.isfile(real_path):
+                # 与上传接口相同，只接受白名单内的图片类型
+                with open(real_path, 'rb') as file:
+                    if sniff_mimetype(file.read(16)) not in UPLOAD_MIMETYPES:
+                        raise ValueError(f"不支持的图片类型:{value}")
+                return self.put_file(real_path)
+
+        # 其余按纯Base64编码处理
+        return self.put_base64(value)
+
+
+# 全局文件存储实例
+blob_store = BlobStore(os.getenv('BLOB_FOLDER', 'static/blobs'))
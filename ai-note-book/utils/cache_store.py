@@ -0,0 +1,259 @@
+import asyncio
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class CacheBackend(ABC):
+    """
+    缓存后端接口，子类实现同步的get_sync/set_sync/delete_sync，异步接口默认在线程池中执行，不阻塞事件循环
+    """
+
+    @abstractmethod
+    def get_sync(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set_sync(self, key: str, value: str) -> None:
+        ...
+
+    @abstractmethod
+    def delete_sync(self, key: str) -> None:
+        ...
+
+    def stats(self) -> dict:
+        return {}
+
+    async def get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self.set_sync, key, value)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.delete_sync, key)
+
+
+class MemoryCacheStore(CacheBackend):
+    """
+    纯内存LRU缓存，带过期时间，用于测试或不需要持久化的场景
+    """
+
+    def __init__(self, ttl: float, max_items: int = 1024):
+        self.ttl = ttl
+        self.max_items = max_items
+        self._items: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_sync(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, created_at = item
+            if time.time() - created_at > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set_sync(self, key: str, value: str, created_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._items[key] = (value, created_at or time.time())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def delete_sync(self, key: str) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    async def get(self, key: str) -> Optional[str]:
+        # 纯内存操作很快，直接执行，无需切换线程
+        return self.get_sync(key)
+
+    async def set(self, key: str, value: str) -> None:
+        self.set_sync(key, value)
+
+    async def delete(self, key: str) -> None:
+        self.delete_sync(key)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class SQLiteCacheStore(CacheBackend):
+    """
+    两级缓存：内存LRU + 单文件SQLite存储
+
+    - 过期时间：读取时检查，并定期批量清理过期记录
+    - 容量上限：超过max_bytes时按最近访问时间淘汰
+    """
+
+    def __init__(
+            self,
+            db_path: str,
+            ttl: float,
+            max_bytes: int = 256 * 1024 * 1024,
+            memory_items: int = 256,
+            sweep_interval: float = 600
+    ):
+        """
+        参数:
+            db_path: SQLite数据库文件路径
+            ttl: 缓存过期时间，单位：（second）
+            max_bytes: 缓存内容总大小上限，单位：（byte）
+            memory_items: 内存LRU层缓存的条目数
+            sweep_interval: 清理过期记录和执行容量淘汰的间隔，单位：（second）
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.memory = MemoryCacheStore(ttl=ttl, max_items=memory_items)
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_created ON cache (created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed ON cache (accessed_at)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def get_sync(self, key: str) -> Optional[str]:
+        value = self.memory.get_sync(key)
+        if value is not None:
+            self._stats["memory_hits"] += 1
+            return value
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            value, created_at = row
+            with self._conn:
+                if now - created_at > self.ttl:
+                    self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._stats["expired"] += 1
+                    self._stats["misses"] += 1
+                    return None
+                # 内存层命中不会更新磁盘上的访问时间，淘汰顺序是近似LRU
+                self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+
+        self._stats["disk_hits"] += 1
+        self.memory.set_sync(key, value, created_at=created_at)
+        return value
+
+    def set_sync(self, key: str, value: str, created_at: Optional[float] = None) -> None:
+        now = time.time()
+        created_at = created_at or now
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), created_at, now)
+            )
+        self.memory.set_sync(key, value, created_at=created_at)
+
+        if now - self._last_sweep > self.sweep_interval:
+            self.sweep()
+
+    def delete_sync(self, key: str) -> None:
+        self.memory.delete_sync(key)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def sweep(self) -> int:
+        """清理过期记录，并在超过容量上限时按最近访问时间淘汰，返回删除的条数"""
+        self._last_sweep = time.time()
+        removed = 0
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM cache WHERE created_at < ?", (self._last_sweep - self.ttl,))
+            removed += cursor.rowcount
+            self._stats["expired"] += cursor.rowcount
+
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                # 淘汰到容量上限的90%，避免每次写入都触发淘汰
+                target = total - int(self.max_bytes * 0.9)
+                freed = 0
+                victims = []
+                for key, size in self._conn.execute("SELECT key, size FROM cache ORDER BY accessed_at"):
+                    if freed >= target:
+                        break
+                    victims.append((key,))
+                    freed += size
+                self._conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+                removed += len(victims)
+                self._stats["evictions"] += len(victims)
+                for (key,) in victims:
+                    self.memory.delete_sync(key)
+
+        if removed:
+            print(f"缓存清理完成，删除{removed}条记录")
+        return removed
+
+    def migrate_json_dir(self, cache_dir: str) -> int:
+        """一次性导入旧版每个提示词一个JSON文件的缓存，返回导入条数"""
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done or not os.path.isdir(cache_dir):
+            return 0
+
+        now = time.time()
+        rows = []
+        for path in glob.glob(os.path.join(cache_dir, "*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as file:
+                    cache_data = json.load(file)
+                timestamp = float(cache_data["timestamp"])
+                if now - timestamp > self.ttl:
+                    continue
+                key = os.path.splitext(os.path.basename(path))[0]
+                value = cache_data["result"]
+                rows.append((key, value, len(value.encode("utf-8")), timestamp, now))
+            except Exception as e:
+                print(f"导入缓存文件失败:{path}:{str(e)}")
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO cache (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', ?)", (str(now),))
+        print(f"已导入{len(rows)}条旧版JSON缓存")
+        return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        stats = dict(self._stats)
+        stats.update({"entries": count, "bytes": total, "memory_entries": len(self.memory)})
+        return stats
@@ -0,0 +1,141 @@
+import hashlib
+import re
+from typing import Iterator, List
+
+from utils.tokens import count_tokens
+
+# Markdown标题行
+HEADING_PATTERN = re.compile(r'^#{1,6}\s+\S')
+# 空行（段落分隔）
+BLANK_LINE_PATTERN = re.compile(r'\n[ \t]*\n+')
+# 一个句子：到中英文句末标点（英文句号后须为空白或结尾）或换行为止，包含其后的空白，拼接后与原文一致
+SENTENCE_PATTERN = re.compile(r'.*?(?:[。！？；!?;]|\.(?=\s|$)|\n|$)\s*', re.S)
+
+
+def split_blocks(text: str) -> Iterator[str]:
+    """按Markdown标题和空行把文本切分为段落块，标题单独成块以便作为分块边界"""
+    for paragraph in BLANK_LINE_PATTERN.split(text):
+        block = []
+        for line in paragraph.split('\n'):
+            if HEADING_PATTERN.match(line) and block:
+                yield '\n'.join(block).strip()
+                block = []
+            block.append(line)
+        if block:
+            joined = '\n'.join(block).strip()
+            if joined:
+                yield joined
+
+
+def _split_oversized(block: str, max_tokens: int) -> Iterator[str]:
+    """超过上限的段落按句子切分，单个句子仍超过上限时按字符硬切分"""
+    sentences = [s for s in SENTENCE_PATTERN.findall(block) if s.strip()]
+    current, current_tokens = [], 0
+    for sentence in sentences:
+        tokens = count_tokens(sentence)
+        if tokens > max_tokens:
+            if current:
+                yield ''.join(current).strip()
+                current, current_tokens = [], 0
+            # 按比例估算每段的字符数
+            step = max(1, len(sentence) * max_tokens // tokens)
+            for i in range(0, len(sentence), step):
+                yield sentence[i:i + step]
+            continue
+        if current and current_tokens + tokens > max_tokens:
+            yield ''.join(current).strip()
+            current, current_tokens = [], 0
+        current.append(sentence)
+        current_tokens += tokens
+    if current:
+        yield ''.join(current).strip()
+
+
+def iter_chunks(text: str, max_tokens: int, overlap_tokens: int = 0) -> Iterator[str]:
+    """
+    把长文本切分为不超过max_tokens的文本块（生成器）
+
+    优先在Markdown标题和段落边界处切分，段落过长时再按句子切分；
+    相邻文本块之间保留overlap_tokens以内的重叠段落，保证上下文连续
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("重叠token数必须小于文本块token上限")
+
+    current: List[str] = []
+    current_tokens: List[int] = []
+    fresh = False  # 当前块中是否有未输出过的内容
+
+    for block in split_blocks(text):
+        tokens = count_tokens(block)
+        pieces = [(block, tokens)] if tokens <= max_tokens else [
+            (piece, count_tokens(piece)) for piece in _split_oversized(block, max_tokens)
+        ]
+        for piece, piece_tokens in pieces:
+            if current and sum(current_tokens) + piece_tokens > max_tokens:
+                if fresh:
+                    yield '\n\n'.join(current)
+                # 保留末尾若干段作为下一块的重叠部分
+                keep, kept = 0, 0
+                for t in reversed(current_tokens):
+                    if kept + t > overlap_tokens or kept + t + piece_tokens > max_tokens:
+                        break
+                    kept += t
+                    keep += 1
+                current = current[len(current) - keep:] if keep else []
+                current_tokens = current_tokens[len(current_tokens) - keep:] if keep else []
+            current.append(piece)
+            current_tokens.append(piece_tokens)
+            fresh = True
+
+    if current and fresh:
+        yield '\n\n'.join(current)
+
+
+def pack_chunks(chunks: List[str], max_tokens: int) -> List[str]:
+    """把已有的小文本块按顺序合并为不超过max_tokens的大块，超过上限的块会被切分"""
+    packed = []
+    for chunk in chunks:
+        packed.extend(iter_chunks(chunk, max_tokens))
+    merged, current, current_tokens = [], [], 0
+    for chunk in packed:
+        tokens = count_tokens(chunk)
+        if current and current_tokens + tokens > max_tokens:
+            merged.append('\n\n'.join(current))
+            current, current_tokens = [], 0
+        current.append(chunk)
+        current_tokens += tokens
+    if current:
+        merged.append('\n\n'.join(current))
+    return merged
+
+
+def iter_stable_chunks(text: str, max_tokens: int, min_tokens: int = None, divisor: int = 4) -> Iterator[str]:
+    """
+    内容定义分块（生成器）：分块边界由段落内容的哈希值决定，而不是由累计长度决定
+
+    在某一段中插入或删除内容只会改变附近的分块，后面的分块边界会重新对齐，
+    适合按分块哈希做增量处理。分块之间不重叠。
+
+    参数:
+        min_tokens: 分块的最小token数，达到后遇到哈希值能被divisor整除的段落即结束当前分块
+        divisor: 控制平均分块大小，越大分块越长
+    """
+    min_tokens = min_tokens or max_tokens // 4
+    current, current_tokens = [], 0
+    for block in split_blocks(text):
+        tokens = count_tokens(block)
+        pieces = [(block, tokens)] if tokens <= max_tokens else [
+            (piece, count_tokens(piece)) for piece in _split_oversized(block, max_tokens)
+        ]
+        for piece, piece_tokens in pieces:
+            if current and current_tokens + piece_tokens > max_tokens:
+                yield '\n\n'.join(current)
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+            anchor = int(hashlib.md5(piece.encode('utf-8')).hexdigest()[:8], 16) % divisor == 0
+            if current_tokens >= min_tokens and anchor:
+                yield '\n\n'.join(current)
+                current, current_tokens = [], 0
+    if current:
+        yield '\n\n'.join(current)
@@ -0,0 +1,370 @@
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # 未安装sentence-transformers时使用哈希向量
+    SentenceTransformer = None
+
+from utils.search_index import plain_text, tokenize
+
+
+@lru_cache(maxsize=200000)
+def _term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class HashingEmbedder:
+    """
+    特征哈希向量：把分词结果（CJK二元组、英文单词）哈希到固定维度，不需要模型文件
+
+    只反映字面上的重合程度，安装sentence-transformers并配置模型后可获得真正的语义向量
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term, tf in Counter(tokenize(text)).items():
+                value = _term_hash(term)
+                sign = 1.0 if value >> 63 else -1.0
+                vectors[row, value % self.dim] += sign * (1.0 + math.log(tf))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class SentenceTransformerEmbedder:
+    """本地CPU运行的sentence-transformers模型，首次使用时才加载"""
+
+    def __init__(self, model_name: str):
+        self.name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                print(f"加载向量模型:{self.name}")
+                self._model = SentenceTransformer(self.name, device="cpu")
+            return self._model
+
+    @property
+    def dim(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32)
+
+
+def create_embedder(model_name: Optional[str] = None):
+    """创建向量模型，未配置模型或未安装sentence-transformers时使用哈希向量"""
+    if model_name and SentenceTransformer is not None:
+        return SentenceTransformerEmbedder(model_name)
+    if model_name:
+        print(f"未安装sentence-transformers，无法使用模型{model_name}，改用哈希向量")
+    return HashingEmbedder()
+
+
+def quantize(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+    """对称量化为int8，返回(量化向量, 缩放系数)"""
+    scale = float(np.abs(vector).max()) / 127 or 1.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+
+class UserVectors:
+    """
+    单个用户的向量矩阵，每篇笔记占一行，容量按倍数扩展
+
+    删除时用最后一行填补空位，矩阵始终是连续的，检索时一次矩阵乘法算出全部相似度
+    """
+
+    def __init__(self, dim: int, dtype):
+        self.dtype = np.dtype(dtype)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=self.dtype)
+        self.scales = np.empty(0, dtype=np.float32)
+        self.rows = {}
+        self.size = 0
+
+    def _reserve(self, count: int):
+        if count <= len(self.ids):
+            return
+        capacity = max(count, len(self.ids) * 2, 16)
+        ids = np.empty(capacity, dtype=np.int64)
+        vectors = np.empty((capacity, self.vectors.shape[1]), dtype=self.dtype)
+        scales = np.empty(capacity, dtype=np.float32)
+        ids[:self.size] = self.ids[:self.size]
+        vectors[:self.size] = self.vectors[:self.size]
+        scales[:self.size] = self.scales[:self.size]
+        self.ids, self.vectors, self.scales = ids, vectors, scales
+
+    def set(self, note_id: int, vector: np.ndarray, scale: float = 1.0):
+        row = self.rows.get(note_id)
+        if row is None:
+            self._reserve(self.size + 1)
+            row = self.size
+            self.size += 1
+            self.rows[note_id] = row
+            self.ids[row] = note_id
+        self.vectors[row] = vector
+        self.scales[row] = scale
+
+    def remove(self, note_id: int):
+        row = self.rows.pop(note_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            self.ids[row] = self.ids[last]
+            self.vectors[row] = self.vectors[last]
+            self.scales[row] = self.scales[last]
+            self.rows[int(self.ids[row])] = row
+        self.size = last
+
+    def vector(self, note_id: int) -> Optional[np.ndarray]:
+        row = self.rows.get(note_id)
+        if row is None:
+            return None
+        return self.vectors[row].astype(np.float32) * self.scales[row]
+
+    def top_k(self, query: np.ndarray, k: int, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """返回与查询向量余弦相似度最高的k篇笔记"""
+        if self.size == 0 or k <= 0:
+            return []
+        scores = self.vectors[:self.size] @ query
+        if self.dtype == np.int8:
+            scores = scores * self.scales[:self.size]
+        scores = scores.astype(np.float32)
+        if exclude is not None and exclude in self.rows:
+            scores[self.rows[exclude]] = -np.inf
+
+        k = min(k, self.size)
+        if k < self.size:
+            # 部分排序取前k个，再只对这k个排序
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(self.size)
+        top = top[np.argsort(-scores[top])]
+        # 相似度不大于0的笔记没有相关性，不返回
+        return [(int(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+class EmbeddingIndex:
+    """
+    笔记向量索引：向量持久化在SQLite中，检索时按用户加载为NumPy矩阵（LRU缓存）
+
+    笔记新增、修改后在后台线程中计算向量，不阻塞请求；内容未变化的笔记不会重复计算
+    """
+
+    def __init__(self, db_path: str, embedder, dtype: str = "float32", cache_users: int = 256,
+                 background: bool = True):
+        """
+        参数:
+            db_path: SQLite数据库路径
+            embedder: 向量模型，需要有name属性和embed(texts)方法
+            dtype: 内存中向量的存储类型，float32或int8（int8占用1/4内存，相似度有少量误差）
+            cache_users: 内存中缓存的用户矩阵数量
+            background: 是否在后台线程中计算向量
+        """
+        if dtype not in ("float32", "int8"):
+            raise ValueError("dtype必须是float32或int8")
+        self.embedder = embedder
+        self.dtype = dtype
+        self.cache_users = cache_users
+        self._lock = threading.RLock()
+        self._users: "OrderedDict[int, UserVectors]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding") if background else None
+        self.stats = {"embedded": 0, "skipped": 0, "queries": 0}
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    note_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    model TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL
+                )
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_user ON embeddings (user_id)")
+
+    @staticmethod
+    def note_text(title: str, content: str) -> str:
+        return f"{title or ''}\n{plain_text(content)}"
+
+    def _content_hash(self, text: str) -> str:
+        return hashlib.sha256(f"{self.embedder.name}|{text}".encode("utf-8")).hexdigest()
+
+    def _cache_vector(self, note_id: int, user_id: int, vector: np.ndarray):
+        """更新已加载的用户矩阵（调用方持有锁）"""
+        for cached_user, matrix in self._users.items():
+            if cached_user != user_id and note_id in matrix.rows:
+                matrix.remove(note_id)  # 笔记换了用户
+        matrix = self._users.get(user_id)
+        if matrix is not None:
+            if self.dtype == "int8":
+                matrix.set(note_id, *quantize(vector))
+            else:
+                matrix.set(note_id, vector)
+
+    def index_many(self, docs: Iterable[Tuple[int, int, str, str]], batch_size: int = 64) -> int:
+        """同步计算并写入向量，docs为(笔记ID, 用户ID, 标题, 内容)，返回实际计算的数量"""
+        docs = list(docs)
+        embedded = 0
+        for start in range(0, len(docs), batch_size):
+            batch = []
+            for note_id, user_id, title, content in docs[start:start + batch_size]:
+                text = self.note_text(title, content)
+                content_hash = self._content_hash(text)
+                with self._lock:
+                    row = self._conn.execute(
+                        "SELECT user_id, content_hash FROM embeddings WHERE note_id = ?", (note_id,)
+                    ).fetchone()
+                if row == (user_id, content_hash):
+                    self.stats["skipped"] += 1
+                    continue
+                batch.append((note_id, user_id, text, content_hash))
+            if not batch:
+                continue
+
+            vectors = self.embedder.embed([text for _, _, text, _ in batch])
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (note_id, user_id, model, content_hash, vector) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (note_id, user_id, self.embedder.name, content_hash, vector.astype(np.float32).tobytes())
+                        for (note_id, user_id, _, content_hash), vector in zip(batch, vectors)
+                    ]
+                )
+                for (note_id, user_id, _, _), vector in zip(batch, vectors):
+                    self._cache_vector(note_id, user_id, vector)
+            embedded += len(batch)
+            self.stats["embedded"] += len(batch)
+        return embedded
+
+    def index(self, note_id: int, user_id: int, title: str, content: str) -> None:
+        """新增或更新一篇笔记的向量（后台计算）"""
+        if self._executor is None:
+            self.index_many([(note_id, user_id, title, content)])
+            return
+        future = self._executor.submit(self.index_many, [(note_id, user_id, title, content)])
+        future.add_done_callback(self._report_error)
+
+    def remove(self, note_id: int) -> None:
+        """删除一篇笔记的向量（在后台队列中执行，保证与之前提交的计算任务的先后顺序）"""
+        if self._executor is None:
+            self._remove_now(note_id)
+            return
+        self._executor.submit(self._remove_now, note_id).add_done_callback(self._report_error)
+
+    def _remove_now(self, note_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings WHERE note_id = ?", (note_id,))
+            for matrix in self._users.values():
+                matrix.remove(note_id)
+
+    @staticmethod
+    def _report_error(future):
+        error = future.exception()
+        if error is not None:
+            print(f"计算笔记向量失败:{str(error)}")
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """等待后台任务全部完成"""
+        if self._executor is not None:
+            self._executor.submit(lambda: None).result(timeout)
+
+    def prune(self, note_ids: Iterable[int]) -> int:
+        """删除不在note_ids中的笔记向量（重建索引时清理已删除的笔记），返回删除数量"""
+        keep = set(note_ids)
+        with self._lock:
+            stale = [note_id for (note_id,) in self._conn.execute("SELECT note_id FROM embeddings")
+                     if note_id not in keep]
+        for note_id in stale:
+            self._remove_now(note_id)
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+            self._users.clear()
+
+    def _user_vectors(self, user_id: int) -> UserVectors:
+        """读取用户的向量矩阵（调用方持有锁）"""
+        matrix = self._users.get(user_id)
+        if matrix is not None:
+            self._users.move_to_end(user_id)
+            return matrix
+
+        rows = self._conn.execute(
+            "SELECT note_id, vector FROM embeddings WHERE user_id = ? AND model = ?",
+            (user_id, self.embedder.name)
+        ).fetchall()
+        dtype = np.int8 if self.dtype == "int8" else np.float32
+        if not rows:
+            # 没有向量时不知道维度，不缓存空矩阵，否则之后写入的向量维度不匹配
+            return UserVectors(0, dtype)
+        dim = len(rows[0][1]) // 4
+        matrix = UserVectors(dim, dtype)
+        vectors = np.frombuffer(b"".join(vector for _, vector in rows), dtype=np.float32).reshape(len(rows), dim)
+        for (note_id, _), vector in zip(rows, vectors):
+            if self.dtype == "int8":
+                matrix.set(note_id, *quantize(vector))
+            else:
+                matrix.set(note_id, vector)
+
+        self._users[user_id] = matrix
+        while len(self._users) > self.cache_users:
+            self._users.popitem(last=False)
+        return matrix
+
+    def related(self, user_id: int, note_id: int, k: int = 10) -> Optional[List[Tuple[int, float]]]:
+        """与指定笔记最相似的k篇笔记，笔记尚未计算向量时返回None"""
+        with self._lock:
+            self.stats["queries"] += 1
+            matrix = self._user_vectors(user_id)
+            vector = matrix.vector(note_id)
+            if vector is None:
+                return None
+            return matrix.top_k(vector, k, exclude=note_id)
+
+    def search(self, user_id: int, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """语义检索：与查询文本最相似的k篇笔记"""
+        vector = self.embedder.embed([query])[0]
+        with self._lock:
+            self.stats["queries"] += 1
+            return self._user_vectors(user_id).top_k(vector, k)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        stats = dict(self.stats)
+        stats.update({
+            "model": self.embedder.name,
+            "dtype": self.dtype,
+            "vectors": count,
+            "cached_users": len(self._users)
+        })
+        return stats
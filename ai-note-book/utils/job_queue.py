@@ -0,0 +1,237 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from typing import Callable, Optional
+
+
+class JobQueue:
+    """
+    本地后台任务队列，使用SQLite持久化任务状态，不依赖外部消息中间件
+
+    db_path为":memory:"时为纯进程内队列（便于测试），否则为文件队列，多个进程可以共用同一个文件
+
+    领取任务时记录领取者并定期续租（更新heartbeat_at），领取者进程退出后租约过期，
+    任务由仍在运行的队列重新放回待执行状态；正常运行中的其他进程领取的任务不受影响
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, handler: Callable[[dict], dict], db_path: str = ":memory:", workers: int = 2,
+                 job_ttl: float = 24 * 3600, lease_timeout: float = 60.0):
+        """
+        参数:
+            handler: 任务处理函数，接收任务参数字典，返回结果字典，抛出异常则任务失败
+            db_path: SQLite数据库路径
+            workers: 工作线程数
+            job_ttl: 已完成任务的保留时间，单位：（second）
+            lease_timeout: 租约有效期，超过该时间没有续租的运行中任务视为领取者已退出，单位：（second）
+        """
+        self.handler = handler
+        self.workers = workers
+        self.job_ttl = job_ttl
+        self.lease_timeout = lease_timeout
+        # 领取者标识，同一进程内的多个队列实例也互不相同
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads = []
+
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_db()
+
+    def _init_db(self):
+        """建表（不修改已有任务，过期租约在start时回收）"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT,
+                    heartbeat_at REAL
+                )
+                """
+            )
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)")
+
+    def requeue_expired(self) -> int:
+        """把租约过期的运行中任务重新放回队列，返回数量"""
+        deadline = time.time() - self.lease_timeout
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL "
+                "WHERE status = ? AND COALESCE(heartbeat_at, started_at, 0) < ?",
+                (self.PENDING, self.RUNNING, deadline)
+            )
+        if cursor.rowcount:
+            print(f"任务队列回收过期任务:{cursor.rowcount}")
+        return cursor.rowcount
+
+    def _renew_leases(self):
+        """为本队列正在执行的任务续租"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE status = ? AND owner = ?",
+                (time.time(), self.RUNNING, self.owner)
+            )
+
+    def start(self):
+        """启动工作线程"""
+        if self._threads:
+            return
+        self._stopped.clear()
+        self.requeue_expired()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        print(f"任务队列启动，工作线程数:{self.workers}")
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止工作线程（正在执行的任务会执行完）"""
+        self._stopped.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, payload: dict) -> str:
+        """提交任务，立即返回任务ID"""
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, self.PENDING, json.dumps(payload, ensure_ascii=False), time.time())
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """查询任务状态，任务不存在返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            position = None
+            if row["status"] == self.PENDING:
+                position = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?",
+                    (self.PENDING, row["created_at"])
+                ).fetchone()[0]
+
+        job = {
+            "job_id": row["id"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "started_at": row["started_at"],
+            "finished_at": row["finished_at"],
+        }
+        if position is not None:
+            job["queue_position"] = position
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+        if row["error"] is not None:
+            job["error"] = row["error"]
+        return job
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """领取一个待执行任务并记录租约，多个进程共用同一个数据库文件时也只会被领取一次"""
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = ? ORDER BY created_at LIMIT 8",
+                (self.PENDING,)
+            ).fetchall()
+            for row in rows:
+                now = time.time()
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = ?, started_at = ?, owner = ?, heartbeat_at = ? "
+                    "WHERE id = ? AND status = ?",
+                    (self.RUNNING, now, self.owner, now, row["id"], self.PENDING)
+                )
+                if cursor.rowcount == 1:
+                    return row
+        return None
+
+    def _finish(self, job_id: str, result: Optional[dict] = None, error: Optional[str] = None):
+        """记录任务结果，租约已过期并被其他队列重新领取的任务不覆盖"""
+        status = self.FAILED if error is not None else self.DONE
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (
+                    status,
+                    json.dumps(result, ensure_ascii=False) if result is not None else None,
+                    error,
+                    time.time(),
+                    job_id,
+                    self.RUNNING,
+                    self.owner
+                )
+            )
+
+    def purge_expired(self) -> int:
+        """清理超过保留时间的已完成任务，返回清理数量"""
+        deadline = time.time() - self.job_ttl
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (self.DONE, self.FAILED, deadline)
+            )
+        return cursor.rowcount
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        last_purge = 0.0
+        while not self._stopped.is_set():
+            job = self._claim_next()
+            if job is None:
+                if time.time() - last_purge > 600:
+                    self.purge_expired()
+                    self.requeue_expired()
+                    last_purge = time.time()
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+
+            try:
+                result = self.handler(json.loads(job["payload"]))
+                self._finish(job["id"], result=result)
+            except Exception as e:
+                traceback.print_exc()
+                self._finish(job["id"], error=str(e))
+
+    def _heartbeat_loop(self):
+        """续租线程，间隔为租约有效期的1/3"""
+        interval = max(self.lease_timeout / 3, 0.1)
+        while not self._stopped.wait(interval):
+            try:
+                self._renew_leases()
+            except Exception:
+                traceback.print_exc()
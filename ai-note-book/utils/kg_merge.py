@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Tuple
+
+from utils.kg_parser import KnowledgeGraph, normalize_name, parse_knowledge_graph
+
+# 表示"另一个名称"的属性，属性值与其他实体同名时两个实体合并
+ALIAS_KEYS = {"别名", "简称", "全称", "又称", "英文名", "英文名称", "原名", "alias", "also known as", "abbreviation"}
+
+
+class UnionFind:
+    """并查集，按插入顺序保留每个集合中最早加入的元素作为代表"""
+
+    def __init__(self):
+        self.parent: Dict[Hashable, Hashable] = {}
+        self.order: Dict[Hashable, int] = {}
+
+    def add(self, item: Hashable) -> None:
+        if item not in self.parent:
+            self.parent[item] = item
+            self.order[item] = len(self.order)
+
+    def find(self, item: Hashable) -> Hashable:
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]  # 路径减半
+            item = parent[item]
+        return item
+
+    def union(self, a: Hashable, b: Hashable) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.order[root_b] < self.order[root_a]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+
+
+class GraphConflicts:
+    """
+    本地合并无法决定的冲突
+
+    - types: {合并后实体ID: [候选类型...]}，同一实体在不同来源中类型不同
+    - attributes: {(合并后实体ID, 属性): [候选值...]}，同一属性在不同来源中取值不同
+    """
+
+    def __init__(self):
+        self.types: Dict[str, List[str]] = {}
+        self.attributes: Dict[Tuple[str, str], List[str]] = {}
+
+    def __bool__(self):
+        return bool(self.types or self.attributes)
+
+    def __len__(self):
+        return len(self.types) + len(self.attributes)
+
+    def to_text(self, graph: KnowledgeGraph) -> str:
+        """列出冲突的全部候选，格式与提取结果相同"""
+        lines = ["实体列表:"]
+        entity_ids = list(self.types)
+        entity_ids.extend(entity_id for entity_id, _ in self.attributes if entity_id not in entity_ids)
+        for entity_id in dict.fromkeys(entity_ids):
+            name, entity_type = graph.entities[entity_id]
+            for candidate in self.types.get(entity_id, [entity_type]):
+                lines.append(f"{entity_id}: {name} ({candidate})" if candidate else f"{entity_id}: {name}")
+        lines.extend(["", "属性列表:"])
+        for (entity_id, key), values in self.attributes.items():
+            lines.extend(f"({entity_id}, {key}, {value})" for value in values)
+        return "\n".join(lines)
+
+
+def merge_graphs(graphs: List[KnowledgeGraph]) -> Tuple[KnowledgeGraph, GraphConflicts]:
+    """
+    确定性合并多个来源的知识图谱
+
+    - 名称归一化后相同的实体，以及通过别名类属性指向对方的实体，用并查集合并为一个
+    - 合并后按首次出现的顺序重新编号E1、E2...，关系和属性去重
+    - 同一实体有多个类型时取第一个，同一属性有多个取值时全部保留，两者都记录为冲突
+
+    返回:
+        (合并后的图谱, 冲突)
+    """
+    sets = UnionFind()
+    by_name = {}
+    for index, graph in enumerate(graphs):
+        for entity_id, (name, _) in graph.entities.items():
+            key = (index, entity_id)
+            sets.add(key)
+            norm = normalize_name(name)
+            if norm in by_name:
+                sets.union(by_name[norm], key)
+            else:
+                by_name[norm] = key
+
+    # 别名指向的实体可能出现在任意来源中，名称全部登记后再合并
+    for index, graph in enumerate(graphs):
+        for subject, key, value in graph.attributes:
+            other = by_name.get(normalize_name(value))
+            if other is not None and key.strip().lower() in ALIAS_KEYS:
+                sets.union((index, subject), other)
+
+    merged = KnowledgeGraph()
+    conflicts = GraphConflicts()
+    new_ids = {}
+    types: Dict[str, List[str]] = OrderedDict()
+    for index, graph in enumerate(graphs):
+        for entity_id, (name, entity_type) in graph.entities.items():
+            root = sets.find((index, entity_id))
+            if root not in new_ids:
+                new_ids[root] = merged.add_entity(graphs[root[0]].entities[root[1]][0])
+            new_id = new_ids[root]
+            merged.add_alias(name, new_id)
+            if entity_type and entity_type not in types.setdefault(new_id, []):
+                types[new_id].append(entity_type)
+
+    for new_id, candidates in types.items():
+        if candidates:
+            merged.set_type(new_id, candidates[0])
+        if len(candidates) > 1:
+            conflicts.types[new_id] = candidates
+
+    values: Dict[Tuple[str, str], List[str]] = OrderedDict()
+    for index, graph in enumerate(graphs):
+        def resolve(entity_id):
+            return new_ids[sets.find((index, entity_id))]
+
+        for subject, predicate, obj in graph.relations:
+            merged.add_relation(resolve(subject), predicate, resolve(obj))
+        for subject, key, value in graph.attributes:
+            subject = resolve(subject)
+            if key.strip().lower() in ALIAS_KEYS and merged.find(value) == subject:
+                continue  # 已合并的别名不再作为属性重复出现
+            candidates = values.setdefault((subject, key), [])
+            if value not in candidates:
+                candidates.append(value)
+            merged.add_attribute(subject, key, value)
+
+    for (subject, key), candidates in values.items():
+        if len(candidates) > 1:
+            conflicts.attributes[(subject, key)] = candidates
+    return merged, conflicts
+
+
+def apply_resolution(graph: KnowledgeGraph, conflicts: GraphConflicts, resolution: str) -> int:
+    """
+    用大模型给出的冲突解决结果更新合并后的图谱，结果中没有给出的冲突保持原样
+
+    参数:
+        resolution: 只包含冲突实体和属性的提取结果文本
+
+    返回:
+        解决的冲突数
+    """
+    resolved = parse_knowledge_graph(resolution)
+    count = 0
+    for entity_id, (name, entity_type) in resolved.entities.items():
+        target = entity_id if entity_id in conflicts.types else graph.find(name)
+        if target in conflicts.types and entity_type:
+            graph.set_type(target, entity_type)
+            count += 1
+
+    chosen: Dict[Tuple[str, str], List[str]] = OrderedDict()
+    for subject, key, value in resolved.attributes:
+        target = subject if (subject, key) in conflicts.attributes else graph.find(resolved.entities[subject][0])
+        if (target, key) in conflicts.attributes:
+            chosen.setdefault((target, key), []).append(value)
+    for (subject, key), kept in chosen.items():
+        graph.replace_attributes(subject, key, kept)
+    return count + len(chosen)
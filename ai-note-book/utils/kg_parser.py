@@ -0,0 +1,198 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# 实体行：E1: 名称 (类型)，兼容列表标记、加粗和全角冒号、括号
+ENTITY_PATTERN = re.compile(
+    r'^[-*+\s]*\**(?P<id>[Ee]\d+)\**\s*[:：]\s*(?P<name>.+?)\s*'
+    r'(?:[(（](?P<type>[^()（）]*)[)）])?[\s*]*$'
+)
+# 三元组：(E1, 关系, E2) 或 (E1, 属性, 值)，兼容全角括号和逗号
+TRIPLE_PATTERN = re.compile(r'[(（](?P<body>[^()（）\n]+)[)）]')
+TRIPLE_SEPARATOR = re.compile(r'\s*[,，]\s*')
+ENTITY_ID_PATTERN = re.compile(r'^[Ee]\d+$')
+
+# 列表标题，按关键词识别当前所在的部分
+SECTIONS = (
+    ("entities", ("实体", "entit")),
+    ("relations", ("关系", "relation")),
+    ("attributes", ("属性", "attribute")),
+)
+SECTION_MAX_LENGTH = 40
+
+# 比较实体名称时忽略的字符：空白、引号、书名号、间隔号
+NAME_IGNORED_CHARS = re.compile(r'[\s"\'`“”‘’《》「」『』·・]+')
+
+
+def normalize_name(name: str) -> str:
+    """实体名称归一化：全角转半角、转小写并去掉空白和引号，用于判断两个名称是否指同一实体"""
+    return NAME_IGNORED_CHARS.sub('', unicodedata.normalize("NFKC", name or "").lower())
+
+
+def _clean(value: str) -> str:
+    return value.strip().strip('*`"“”').strip()
+
+
+class KnowledgeGraph:
+    """
+    知识图谱：实体、关系和属性
+
+    - entities: {实体ID: (名称, 类型)}，实体ID为E1、E2等
+    - relations: [(主体ID, 关系, 客体ID)]
+    - attributes: [(实体ID, 属性, 值)]
+    """
+
+    def __init__(self):
+        self.entities: Dict[str, Tuple[str, str]] = {}
+        self.relations: List[Tuple[str, str, str]] = []
+        self.attributes: List[Tuple[str, str, str]] = []
+        self._by_name: Dict[str, str] = {}
+        self._aliases: Dict[str, str] = {}  # 重复实体的ID -> 保留的实体ID
+        self._triples = set()
+
+    def __len__(self):
+        return len(self.entities)
+
+    def find(self, name_or_id: str) -> Optional[str]:
+        """按实体ID或名称查找实体ID"""
+        if ENTITY_ID_PATTERN.match(name_or_id):
+            entity_id = name_or_id.upper()
+            return self._aliases.get(entity_id, entity_id if entity_id in self.entities else None)
+        return self._by_name.get(normalize_name(name_or_id))
+
+    def add_entity(self, name: str, entity_type: str = "", entity_id: str = None) -> str:
+        """
+        添加实体，名称归一化后相同的实体视为同一个，返回实体ID
+
+        参数:
+            entity_id: 指定实体ID，为None时自动编号
+        """
+        existing = self._by_name.get(normalize_name(name))
+        if existing is not None:
+            if entity_id and entity_id.upper() != existing:
+                # 同名实体使用了不同的ID，把该ID作为别名
+                self._aliases.setdefault(entity_id.upper(), existing)
+            if entity_type and not self.entities[existing][1]:
+                self.entities[existing] = (self.entities[existing][0], entity_type)
+            return existing
+
+        entity_id = entity_id.upper() if entity_id else None
+        if not entity_id or entity_id in self.entities or entity_id in self._aliases:
+            entity_id = f"E{len(self.entities) + 1}"
+            while entity_id in self.entities or entity_id in self._aliases:
+                entity_id = f"E{int(entity_id[1:]) + 1}"
+        self.entities[entity_id] = (name, entity_type)
+        self._by_name[normalize_name(name)] = entity_id
+        return entity_id
+
+    def add_alias(self, name: str, entity_id: str) -> None:
+        """登记实体的另一个名称，之后按该名称查找时返回entity_id"""
+        self._by_name.setdefault(normalize_name(name), entity_id)
+
+    def set_type(self, entity_id: str, entity_type: str) -> None:
+        self.entities[entity_id] = (self.entities[entity_id][0], entity_type)
+
+    def add_relation(self, subject: str, predicate: str, obj: str) -> None:
+        triple = ("r", subject, predicate, obj)
+        if triple not in self._triples:
+            self._triples.add(triple)
+            self.relations.append((subject, predicate, obj))
+
+    def add_attribute(self, subject: str, key: str, value: str) -> None:
+        triple = ("a", subject, key, value)
+        if triple not in self._triples:
+            self._triples.add(triple)
+            self.attributes.append((subject, key, value))
+
+    def replace_attributes(self, subject: str, key: str, values: List[str]) -> None:
+        """把实体某个属性的全部取值替换为values"""
+        for s, k, value in self.attributes:
+            if s == subject and k == key:
+                self._triples.discard(("a", s, k, value))
+        self.attributes = [(s, k, value) for s, k, value in self.attributes if s != subject or k != key]
+        for value in values:
+            self.add_attribute(subject, key, value)
+
+    def to_text(self) -> str:
+        """转换为提示词约定的文本格式"""
+        lines = ["实体列表:"]
+        lines.extend(f"{entity_id}: {name} ({entity_type})" if entity_type else f"{entity_id}: {name}"
+                     for entity_id, (name, entity_type) in self.entities.items())
+        lines.extend(["", "关系列表:"])
+        lines.extend(f"({s}, {p}, {o})" for s, p, o in self.relations)
+        lines.extend(["", "属性列表:"])
+        lines.extend(f"({s}, {p}, {o})" for s, p, o in self.attributes)
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "entities": [
+                {"id": entity_id, "name": name, "type": entity_type}
+                for entity_id, (name, entity_type) in self.entities.items()
+            ],
+            "relations": [{"subject": s, "predicate": p, "object": o} for s, p, o in self.relations],
+            "attributes": [{"subject": s, "key": p, "value": o} for s, p, o in self.attributes],
+        }
+
+
+def _section_of(line: str) -> Optional[str]:
+    """识别列表标题行（如"关系列表:"、"## Relationship List"），不是标题返回None"""
+    stripped = line.strip().lstrip('#').strip().strip('*').strip()
+    if not stripped or len(stripped) > SECTION_MAX_LENGTH or stripped[0] in '(（' or ENTITY_PATTERN.match(line):
+        return None
+    lowered = stripped.lower()
+    for section, keywords in SECTIONS:
+        if any(keyword in lowered for keyword in keywords):
+            return section
+    return None
+
+
+def parse_knowledge_graph(text: str) -> KnowledgeGraph:
+    """
+    解析知识图谱提取结果（KNOWLEDGE_GRAPH_EXTRACTION_PROMPT和MERGE_PROMPT的输出格式）
+
+    - 实体行"E1: 名称 (类型)"
+    - 关系和属性都是三元组"(E1, 关系, E2)"，按所在列表区分；没有列表标题时，
+      客体是已知实体的ID或名称视为关系，否则视为属性
+    - 三元组中引用了未列出的实体名称时自动补充该实体，无法识别的行忽略
+    """
+    graph = KnowledgeGraph()
+    section = None
+    triples = []
+
+    for line in (text or "").splitlines():
+        heading = _section_of(line)
+        if heading:
+            section = heading
+            continue
+
+        match = ENTITY_PATTERN.match(line)
+        if match:
+            name = _clean(match.group('name'))
+            if name:
+                graph.add_entity(name, _clean(match.group('type') or ""), match.group('id'))
+            continue
+
+        # 三元组在实体全部读完后再解析，允许引用后面才列出的实体
+        for triple in TRIPLE_PATTERN.finditer(line):
+            parts = TRIPLE_SEPARATOR.split(triple.group('body').strip(), maxsplit=2)
+            if len(parts) == 3 and all(_clean(part) for part in parts):
+                triples.append((section, *(_clean(part) for part in parts)))
+
+    for section, subject, predicate, obj in triples:
+        subject_id = graph.find(subject)
+        if subject_id is None:
+            if ENTITY_ID_PATTERN.match(subject):
+                continue  # 引用了不存在的实体ID
+            subject_id = graph.add_entity(subject)
+
+        object_id = graph.find(obj)
+        if section == "relations" or (section != "attributes" and object_id is not None):
+            if object_id is None:
+                if ENTITY_ID_PATTERN.match(obj):
+                    continue
+                object_id = graph.add_entity(obj)
+            graph.add_relation(subject_id, predicate, object_id)
+        else:
+            graph.add_attribute(subject_id, predicate, obj)
+    return graph
@@ -0,0 +1,100 @@
+from sqlalchemy import inspect, text
+
+from models import db
+from utils.blob_store import blob_store, is_blob_hash
+
+
+def _add_notes_user_update_index(connection):
+    """为notes表添加(user_id, update_time)联合索引，按用户查询并按更新时间排序时不再需要filesort"""
+    indexes = {index['name'] for index in inspect(connection).get_indexes('notes')}
+    if 'ix_notes_user_update' in indexes:
+        return
+    if connection.dialect.name == 'mysql':
+        # 在线建索引，不阻塞读写
+        connection.execute(text(
+            "ALTER TABLE notes ADD INDEX ix_notes_user_update (user_id, update_time), ALGORITHM=INPLACE, LOCK=NONE"
+        ))
+    else:
+        connection.execute(text("CREATE INDEX ix_notes_user_update ON notes (user_id, update_time)"))
+
+
+def _move_note_images_to_blob_store(connection):
+    """把notes.image中的文件路径和Base64图片转存到文件存储，数据库中只保留SHA-256哈希"""
+    last_id = 0
+    converted = cleared = 0
+    while True:
+        rows = connection.execute(
+            text("SELECT id, image FROM notes WHERE id > :last_id AND image IS NOT NULL AND image <> '' "
+                 "ORDER BY id LIMIT 100"),
+            {'last_id': last_id}
+        ).fetchall()
+        if not rows:
+            break
+        for note_id, image in rows:
+            last_id = note_id
+            if is_blob_hash(image):
+                continue
+            try:
+                image_hash = blob_store.import_image(image)
+                converted += 1
+            except (ValueError, OSError) as e:
+                # 图片文件已经不存在或内容无法解析，清空该字段
+                print(f"笔记{note_id}的图片无法转换，已清空:{str(e)}")
+                image_hash = None
+                cleared += 1
+            connection.execute(
+                text("UPDATE notes SET image = :image WHERE id = :id"),
+                {'image': image_hash, 'id': note_id}
+            )
+    print(f"图片转换完成：转换{converted}条，清空{cleared}条")
+
+
+def _shrink_notes_image_column(connection):
+    """notes.image只保存哈希后，把TEXT列改为VARCHAR(64)"""
+    if connection.dialect.name == 'mysql':
+        connection.execute(text("ALTER TABLE notes MODIFY image VARCHAR(64) NULL"))
+
+
+def _add_notes_version_column(connection):
+    """为notes表添加version列，列表ETag用它区分同一秒内的多次修改"""
+    columns = {column['name'] for column in inspect(connection).get_columns('notes')}
+    if 'version' in columns:
+        return
+    connection.execute(text("ALTER TABLE notes ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+
+# 迁移列表: (版本号, 说明, 迁移函数)，按版本号顺序执行，只能追加
+MIGRATIONS = [
+    ('001', 'add notes(user_id, update_time) index', _add_notes_user_update_index),
+    ('002', 'move note images to blob store', _move_note_images_to_blob_store),
+    ('003', 'shrink notes.image to VARCHAR(64)', _shrink_notes_image_column),
+    ('004', 'add notes.version column', _add_notes_version_column),
+]
+
+
+def run_migrations():
+    """
+    执行尚未执行过的迁移（需要在应用上下文中调用）
+
+    新增的表由db.create_all()创建，已有表的结构变更在MIGRATIONS中追加
+    """
+    db.create_all()
+    with db.engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version VARCHAR(32) PRIMARY KEY, description VARCHAR(255), applied_time DATETIME)"
+        ))
+        applied = {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"执行迁移 {version}: {description}")
+        with db.engine.begin() as connection:
+            migrate(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_time) "
+                     "VALUES (:version, :description, CURRENT_TIMESTAMP)"),
+                {'version': version, 'description': description}
+            )
+    print("数据库迁移完成")
@@ -1,9 +1,10 @@
-from ete3 import Tree, TreeStyle, NodeStyle, TextFace
-import re
+# ete3会加载PyQt5，导入耗时且占用大量内存，只在实际渲染时才导入
 import tempfile
 import os
 import time
 
+from utils.outline_parser import parse_outline
+
 
 class MindmapGenerator:
     def __init__(self, default_output_folder="static/mindmaps"):
@@ -16,85 +17,44 @@ class MindmapGenerator:
         self.text = None
         self.default_output_folder = default_output_folder
 
+        # 渲染参数，作为渲染缓存键的一部分，修改样式时需要同时修改style以免复用旧图片
+        self.style = "ete3-default-v1"
+        self.dpi = 300
+        self.image_format = "png"
+
         # 确保输出文件夹存在
         os.makedirs(self.default_output_folder, exist_ok=True)
 
-    def parse_text_to_tree(self, text):
-        """将文本解析为树形结构的newick格式字符串"""
-        lines = text.strip().split('\n')
-
-        # 提取标题作为根节点
-        root_name = lines[0].lstrip('#').strip() if lines else "思维导图"
-
-        # 构建节点层级结构
-        nodes = {0: [root_name, []]}  # 格式: {level: [node_name, [children]]}
-        current_level = 0
-
-        for line in lines[1:]:
-            if not line.strip():
-                continue
-
-            # 检测缩进或标题级别
-            level = 0
-            hash_match = re.match(r'^(#+)\s+(.+)$', line)
-            dash_match = re.match(r'^(\s*)-\s+(.+)$', line)  # 匹配破折号形式的列表项
-
-            if hash_match:
-                level = len(hash_match.group(1))
-                content = hash_match.group(2).strip()
-            elif dash_match:
-                # 破折号形式的列表项视为比当前层级深一级
-                indentation = dash_match.group(1)
-                base_level = indentation.count('\t') + indentation.count('    ')
-                level = base_level + current_level + 1  # 比上一级多一级
-                content = dash_match.group(2).strip()
-            else:
-                indent_match = re.match(r'^(\s*)(.+)$', line)
-                if indent_match:
-                    indentation = indent_match.group(1)
-                    level = indentation.count('\t') + indentation.count('    ')
-                    content = indent_match.group(2).strip()
-                else:
-                    content = line.strip()
-                    level = current_level + 1
-
-            # 限制层级增加（非破折号项）
-            if not dash_match and level > current_level + 1:
-                level = current_level + 1
-
-            # 构建节点
-            node = [content, []]
+    @staticmethod
+    def parse_outline(text):
+        """将文本解析为大纲树，节点格式为[节点名称, [子节点...]]"""
+        return parse_outline(text).to_nested()
 
-            # 查找父节点
-            parent_level = level - 1
-            while parent_level >= 0 and parent_level not in nodes:
-                parent_level -= 1
-
-            if parent_level >= 0:
-                nodes[parent_level][1].append(node)
-
-            nodes[level] = node
-            current_level = level
-
-            # 清除更深层级的节点
-            for k in list(nodes.keys()):
-                if k > level:
-                    del nodes[k]
+    def parse_text_to_tree(self, text):
+        """将文本解析为ETE Tree对象（按节点数组顺序逐个挂到父节点下，不使用递归）"""
+        from ete3 import Tree
 
-        # 转换为ETE Tree结构
-        return self.build_tree_from_nodes(nodes[0])
+        outline = parse_outline(text)
+        trees = [Tree(name=outline.label(0))]
+        for i in range(1, len(outline)):
+            trees.append(trees[outline.parents[i]].add_child(name=outline.label(i)))
+        return trees[0]
 
     def build_tree_from_nodes(self, node):
-        """从节点结构构建ETE Tree对象"""
-        t = Tree(name=node[0])
-        for child in node[1]:
-            t.add_child(self.build_tree_from_nodes(child))
-        return t
+        """从嵌套列表结构构建ETE Tree对象"""
+        from ete3 import Tree
 
-    def generate_mind_map_png(self, text, output_file="mind_map.png"):
-        """生成思维导图PNG图片"""
-        # 解析文本为树结构
-        tree = self.parse_text_to_tree(text)
+        root = Tree(name=node[0])
+        stack = [(root, node)]
+        while stack:
+            tree, current = stack.pop()
+            for child in current[1]:
+                stack.append((tree.add_child(name=child[0]), child))
+        return root
+
+    def build_tree_style(self):
+        """构建思维导图的树样式"""
+        from ete3 import TreeStyle, NodeStyle, TextFace
 
         # 自定义树样式
         ts = TreeStyle()
@@ -129,12 +89,27 @@ class MindmapGenerator:
             node.add_face(face, column=0, position="branch-right")
 
         ts.layout_fn = layout
+        return ts
+
+    def generate_mind_map_png(self, text, output_file="mind_map.png"):
+        """生成思维导图PNG图片"""
+        # 解析文本为树结构
+        tree = self.parse_text_to_tree(text)
 
         # 导出为PNG图片
-        tree.render(output_file, tree_style=ts, dpi=300)
+        tree.render(output_file, tree_style=self.build_tree_style(), dpi=self.dpi)
         print(f"思维导图已保存为: {output_file}")
         return output_file
 
+    def render_bytes(self, text):
+        """在内存中渲染思维导图PNG，不写文件，返回图片内容"""
+        tree = self.parse_text_to_tree(text)
+        image = tree.render("%%return", tree_style=self.build_tree_style(), dpi=self.dpi)
+        # ete3返回(图片数据, 图片映射)
+        if isinstance(image, tuple):
+            image = image[0]
+        return bytes(image)
+
     def generate(self, sample_text: str = "", output_path=None):
         """
         生成思维导图
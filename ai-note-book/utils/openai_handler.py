@@ -3,12 +3,17 @@ import hashlib
 import json
 import os
 from os.path import dirname
-from typing import Optional, List
-from utils.prompts import get_prompts
+from typing import Optional, List, AsyncIterator, Dict, Iterable, Union, Tuple
+from utils.prompts import get_prompts, MERGE_PROMPT, KG_CONFLICT_PROMPT
 from config.APIconfig import APIConfig
-from openai import AsyncOpenAI
-import time
-from datetime import datetime, timedelta
+from utils.provider_router import Provider, ProviderRouter
+from utils.tokens import estimate_tokens, count_tokens
+from utils.chunker import iter_chunks, iter_stable_chunks, pack_chunks
+from utils.cache_store import CacheBackend, SQLiteCacheStore
+from utils.semantic_cache import SemanticCache
+from utils.kg_parser import KnowledgeGraph, parse_knowledge_graph
+from utils.kg_merge import merge_graphs, apply_resolution
+from datetime import timedelta
 
 
 class AIHandler:
@@ -16,27 +21,56 @@ class AIHandler:
     AI API 处理器，用于生成缓存文件，向数据中心发送post请求
     """
 
-    def __init__(self, api_key: str, api_base: str, provider: str = "deepseek"):
-        if not api_key:
-            raise ValueError("API密钥不能为空")
+    def __init__(self, api_key: str = None, api_base: str = None, provider: str = "deepseek",
+                 cache: CacheBackend = None, providers: List[Provider] = None):
+        """
+        参数:
+            api_key, api_base, provider: 只使用一个后端时的配置
+            providers: 多个后端（见utils.provider_router.create_providers），指定后忽略前三个参数，
+                       每次请求发给最快的可用后端，失败时切换
+        """
+        if not providers:
+            if not api_key:
+                raise ValueError("API密钥不能为空")
+            providers = [Provider(provider, api_key, api_base)]
 
-        self.provider = provider  # 定义访问模型
-        self.config = APIConfig.get_config(provider=provider)  # 获取相关配置
-        # self.client = AsyncOpenAI(api_key=api_key, api_base=api_base or self.config["api_base"])
-        self.client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=api_base or self.config["api_base"]
-        )
+        # 准入控制：所有API调用都经过所选后端的并发限制、限流和重试
+        self.router = ProviderRouter(providers)
+        # 缓存键中的后端标识只取主后端名称：增减或调整备用后端不影响缓存，键的格式与只有一个后端时相同，已有缓存继续有效
+        self.provider = self.router.primary.name
+        self.config = self.router.primary.config  # 合并批次等按主后端的配置计算
 
         self.cache_dir = os.path.join(dirname(os.path.dirname(__file__)), "cache")
-        self.cache_expiry = timedelta(days=7)  # 缓存七天过期
-        self._init_cache()
+        self.cache_expiry = timedelta(days=APIConfig.CACHE_TTL_DAYS)  # 缓存过期时间
+        self.cache = cache if cache is not None else self._init_cache()
+
+        # 相似文本缓存（可选），按整段输入文本的MinHash签名匹配
+        self.semantic_cache = SemanticCache(
+            db_path=os.path.join(self.cache_dir, APIConfig.SEMANTIC_CACHE_DB_NAME),
+            threshold=APIConfig.SEMANTIC_CACHE_THRESHOLD,
+            max_entries=APIConfig.SEMANTIC_CACHE_MAX_ENTRIES,
+            ttl=self.cache_expiry.total_seconds()
+        )
 
-        print(f"初始化AI处理器:{provider}")
+        # 进行中的请求，相同缓存键的并发调用共享同一个task（single-flight），并记录每个task的等待者数量
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.stats = {
+            "cache_hits": 0,  # 命中缓存次数
+            "cache_misses": 0,  # 未命中缓存次数
+            "api_calls": 0,  # 实际发起的API调用次数
+            "coalesced": 0,  # 被合并到进行中请求的调用次数（即节省的API调用次数）
+            "local_merges": 0,  # 本地完成的知识图谱合并次数（没有冲突，未调用API）
+            "conflict_merges": 0,  # 本地合并后只把冲突交给API解决的次数
+        }
 
-    def _init_cache(self):
+        self.progress_callback = None  # 分块处理进度回调，参数为0~1的完成比例
+
+        print(f"初始化AI处理器:{','.join(item.name for item in providers)}")
+
+    def _init_cache(self) -> CacheBackend:
         """
-        初始化缓存目录，在本地建立缓存文件
+        初始化缓存目录，在本地建立缓存数据库，并导入旧版的JSON文件缓存
         """
         try:
             if not os.path.exists(self.cache_dir):
@@ -46,65 +80,101 @@ class AIHandler:
         except Exception as e:
             print(f"缓存目录创建失败:{str(e)}")
 
-    def _get_cache_path(self, prompt_hash: str) -> str:
-        """获取缓存文件路径"""
-        return os.path.join(self.cache_dir, f"{prompt_hash}.json")
-
-    def _read_cache(self, prompt_hash: str) -> Optional[str]:
-        """读取缓存文件"""
+        store = SQLiteCacheStore(
+            db_path=os.path.join(self.cache_dir, APIConfig.CACHE_DB_NAME),
+            ttl=self.cache_expiry.total_seconds(),
+            max_bytes=APIConfig.CACHE_MAX_BYTES,
+            memory_items=APIConfig.CACHE_MEMORY_ITEMS
+        )
         try:
-            cache_path = self._get_cache_path(prompt_hash)
-            if not os.path.exists(cache_path):
-                return None
-
-            with open(cache_path, "r", encoding="utf-8") as file:
-                cache_data = json.load(file)
+            store.migrate_json_dir(self.cache_dir)
+        except Exception as e:
+            print(f"导入旧版缓存失败:{str(e)}")
+        return store
 
-            cache_time = datetime.fromtimestamp(cache_data["timestamp"])
-            if datetime.now() - cache_time > self.cache_expiry:
-                os.remove(cache_path)  # 删除过期缓存
-                return None
-            return cache_data["result"]
+    async def _read_cache(self, prompt_hash: str) -> Optional[str]:
+        """读取缓存"""
+        try:
+            return await self.cache.get(prompt_hash)
 
         except Exception as e:
             print(f"读取缓存失败:{str(e)}")
             return None
 
-    def _save_cache(self, prompt_hash: str, result: str) -> None:
+    async def _save_cache(self, prompt_hash: str, result: str) -> None:
         """写入缓存"""
         try:
-            cache_path = self._get_cache_path(prompt_hash)
-            cache_data = {
-                'timestamp': time.time(),
-                'result': result
-            }
-
-            with open(cache_path, "w", encoding="utf-8") as file:
-                json.dump(cache_data, file, ensure_ascii=False, indent=2)  # 不使用ascii编码，缩进为2
+            await self.cache.set(prompt_hash, result)
 
         except Exception as e:
             print(f"写入缓存失败:{e}")
 
-    async def process_text(self, text: str, prompt_template: str) -> str:
-        """处理单个文本块"""
+    def _semantic_scope(self, prompt_template: str) -> str:
+        """相似文本缓存的作用域：不同提示词模板和模型之间的结果互不复用"""
+        return hashlib.md5(f"{prompt_template}|{self.provider}".encode()).hexdigest()
+
+    async def process_text(
+            self,
+            text: str,
+            prompt_template: str,
+            semantic: bool = None,
+            merge_prompt_template: str = None
+    ) -> str:
+        """
+        处理单个文本块
+
+        参数:
+            semantic: 是否使用相似文本缓存，为None时使用APIConfig.SEMANTIC_CACHE_ENABLED
+            merge_prompt_template: 合并提示词，提供时超过APIConfig.CHUNK_MAX_TOKENS的长文本会自动分块处理后合并
+        """
         try:
             if not text or not prompt_template:
                 raise ValueError("文本或者提示词不能为空")
             print(f"处理文本块，长度为:{len(text)}")
 
-            prompt = prompt_template.format(text=text) # 格式化提示词
+            use_semantic = APIConfig.SEMANTIC_CACHE_ENABLED if semantic is None else semantic
+            if use_semantic:
+                scope = self._semantic_scope(prompt_template)
+                result = await asyncio.to_thread(self.semantic_cache.lookup, scope, text)
+                if result is not None:
+                    return result
+
+            if merge_prompt_template and self.is_long_text(text):
+                print("文本超过分块上限，分块处理")
+                chunks = iter_chunks(text, APIConfig.CHUNK_MAX_TOKENS, APIConfig.CHUNK_OVERLAP_TOKENS)
+                result = await self._map_reduce(chunks, prompt_template, merge_prompt_template)
+            else:
+                prompt = prompt_template.format(text=text) # 格式化提示词
 
-            result = await self.get_completion_with_cache(prompt)
+                result = await self.get_completion_with_cache(prompt)
 
             if not result:
                 raise Exception("API返回结果为空")
 
+            if use_semantic:
+                await asyncio.to_thread(self.semantic_cache.add, scope, text, result)
+
             print(f"处理完成:结果长度={len(result)}")
             return result
 
         except Exception as e:
             raise Exception(f"处理文本失败:{str(e)}")
 
+    @staticmethod
+    def is_long_text(text: str) -> bool:
+        """文本是否超过单次请求的分块上限"""
+        return count_tokens(text) > APIConfig.CHUNK_MAX_TOKENS
+
+    async def process_text_stream(self, text: str, prompt_template: str) -> AsyncIterator[str]:
+        """流式处理单个文本块，逐段返回生成的文本"""
+        if not text or not prompt_template:
+            raise ValueError("文本或者提示词不能为空")
+        print(f"流式处理文本块，长度为:{len(text)}")
+
+        prompt = prompt_template.format(text=text)  # 格式化提示词
+        async for delta in self.get_completion_stream_with_cache(prompt):
+            yield delta
+
     def _calculate_hash(self, prompt: str, **kwargs) -> str:
         """计算提示词和参数的哈希值"""
         # 将所有参数组合成一个字符串
@@ -120,47 +190,147 @@ class AIHandler:
     ) -> str:
         try:
             cache_key = self._calculate_hash(prompt, max_tokens=max_tokens, temperature=temperature)
-            cache_result = self._read_cache(cache_key)
+            cache_result = await self._read_cache(cache_key)
             if cache_result is not None:
                 print("使用缓存结果")
+                self.stats["cache_hits"] += 1
                 return cache_result
 
-            # 未检测到历史记录，调用API向大模型发送请求
-            result = await self.get_completion(
-                prompt=prompt,
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-
-            self._save_cache(cache_key, result)
-
-            return result
+            # 相同的请求正在进行中，等待其结果而不是重复调用API
+            task = self._inflight.get(cache_key)
+            if task is not None:
+                print("合并到进行中的相同请求")
+                self.stats["coalesced"] += 1
+            else:
+                # 未检测到历史记录，在独立的task中调用API，发起者被取消时不影响其他等待者
+                self.stats["cache_misses"] += 1
+                self.stats["api_calls"] += 1
+                task = asyncio.ensure_future(self._fetch_and_cache(cache_key, prompt, max_tokens, temperature))
+                self._inflight[cache_key] = task
+                task.add_done_callback(lambda done, key=cache_key: self._inflight_done(key, done))
+            return await self._await_inflight(task)
 
         except Exception as e:
             print(f"API调用失败:{str(e)}")
             raise
 
-    async def get_completion(self, prompt: str, max_tokens: int = None, temperature: float = None) -> str:
-        """API响应"""
+    async def _fetch_and_cache(self, cache_key: str, prompt: str, max_tokens: int, temperature: float) -> str:
+        """共享的API调用，写缓存完成后才结束，写缓存期间新到的相同请求仍能合并到该task"""
+        result = await self.get_completion(
+            prompt=prompt,
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        await self._save_cache(cache_key, result)
+        return result
+
+    def _inflight_done(self, cache_key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        if not task.cancelled():
+            task.exception()  # 标记异常已被读取，避免没有等待者时输出警告
+
+    async def _await_inflight(self, task: asyncio.Task) -> str:
+        """
+        等待进行中的请求，每个调用方（包括发起者）都通过shield等待，单个调用方被取消不影响其他调用方；
+        最后一个调用方离开时请求仍未完成，才取消请求
+        """
+        self._waiters[task] = self._waiters.get(task, 0) + 1
         try:
-            print(f"调用API：provider={self.provider}")  # 添加日记
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    task.cancel()
+
+    async def close(self) -> None:
+        """关闭全部后端的HTTP客户端，单个后端关闭失败不影响其他后端"""
+        for provider in self.router.providers:
+            try:
+                await provider.client.close()
+            except Exception as e:
+                print(f"关闭后端{provider.name}的客户端失败:{str(e)}")
+
+    def get_stats(self) -> dict:
+        """获取缓存与请求合并统计"""
+        stats = dict(self.stats)
+        stats["inflight"] = len(self._inflight)
+        # 各后端的准入控制统计相加
+        for provider in self.router.providers:
+            for key, value in provider.limiter.stats.items():
+                stats[key] = stats.get(key, 0) + value
+        stats["providers"] = self.router.get_stats()
+        stats["cache"] = self.cache.stats()
+        stats["semantic"] = self.semantic_cache.get_stats()
+        return stats
+
+    async def get_completion_stream_with_cache(
+            self,
+            prompt: str,
+            max_tokens: int = None,
+            temperature: float = None
+    ) -> AsyncIterator[str]:
+        """流式获取结果，命中缓存时一次性返回缓存内容，流正常结束后写入缓存"""
+        cache_key = self._calculate_hash(prompt, max_tokens=max_tokens, temperature=temperature)
+        cache_result = await self._read_cache(cache_key)
+        if cache_result is not None:
+            print("使用缓存结果")
+            self.stats["cache_hits"] += 1
+            yield cache_result
+            return
+
+        # 相同的非流式请求正在进行中，直接等待其结果
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            print("合并到进行中的相同请求")
+            self.stats["coalesced"] += 1
+            yield await self._await_inflight(task)
+            return
+
+        self.stats["cache_misses"] += 1
+        self.stats["api_calls"] += 1
+        parts = []
+        async for delta in self.get_completion_stream(
+                prompt=prompt,
+                max_tokens=max_tokens,
+                temperature=temperature
+        ):
+            parts.append(delta)
+            yield delta
+
+        # 只有完整接收的结果才写入缓存，客户端中途断开时不会执行到这里
+        result = "".join(parts)
+        if result:
+            await self._save_cache(cache_key, result)
 
+    async def get_completion(self, prompt: str, max_tokens: int = None, temperature: float = None) -> str:
+        """调用API：发给预期耗时最短的可用后端，失败或超时后切换到下一个后端"""
+
+        async def request(provider: Provider) -> str:
+            print(f"调用API：provider={provider.name}")  # 添加日记
             # 确保max_tokens的设置
-            if self.provider == "deepseek":
-                max_tokens = min(max_tokens or self.config["max_tokens"], 4096)
-            # TODO elif
-
-            # deepseek:https://platform.deepseek.com
-            response = await self.client.chat.completions.create(
-                model=self.config["model"],
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=max_tokens,
-                temperature=temperature or self.config["temperature"]
+            output_tokens = provider.max_tokens(max_tokens)
+            reserved_tokens = estimate_tokens(prompt) + output_tokens
+            response = await provider.limiter.call(
+                lambda: provider.client.chat.completions.create(
+                    model=provider.config["model"],
+                    messages=[
+                        {"role": "system", "content": "You are a helpful assistant"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=output_tokens,
+                    temperature=temperature or provider.config["temperature"]
+                ),
+                tokens=reserved_tokens
             )
-            result = response.choices[0].message.content
+            usage = getattr(response, "usage", None)
+            provider.limiter.settle(reserved_tokens, getattr(usage, "total_tokens", None))
+            return response.choices[0].message.content
+
+        try:
+            result = await self.router.call(request)
             print(f"API调用成功：结果长度为：{len(result)}")
             return result
 
@@ -168,50 +338,145 @@ class AIHandler:
             # TODO 可以根据官方文档加入更多的错误反馈
             raise Exception(f"API调用失败，错误信息为：{str(e)}")
 
+    async def get_completion_stream(
+            self,
+            prompt: str,
+            max_tokens: int = None,
+            temperature: float = None
+    ) -> AsyncIterator[str]:
+        """流式API响应，逐段返回增量文本；在收到第一段输出之前失败时切换后端"""
+
+        async def open_stream(provider: Provider) -> AsyncIterator[str]:
+            print(f"流式调用API：provider={provider.name}")
+            output_tokens = provider.max_tokens(max_tokens)
+            stream = provider.limiter.stream(
+                lambda: provider.client.chat.completions.create(
+                    model=provider.config["model"],
+                    messages=[
+                        {"role": "system", "content": "You are a helpful assistant"},
+                        {"role": "user", "content": prompt}
+                    ],
+                    max_tokens=output_tokens,
+                    temperature=temperature or provider.config["temperature"],
+                    stream=True
+                ),
+                tokens=estimate_tokens(prompt) + output_tokens
+            )
+            try:
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            finally:
+                await stream.aclose()
+
+        try:
+            stream = self.router.stream(open_stream)
+            try:
+                async for delta in stream:
+                    yield delta
+            finally:
+                await stream.aclose()
+        except Exception as e:
+            raise Exception(f"API调用失败，错误信息为：{str(e)}")
+
+    async def process_text_incremental(
+            self,
+            text: str,
+            prompt_template: str,
+            merge_prompt_template: str,
+            previous: Dict[str, str] = None
+    ) -> Tuple[str, List[Tuple[str, str]], int]:
+        """
+        增量处理文本：按内容定义分块，只对内容发生变化的分块调用API
+
+        参数:
+            previous: 上次处理得到的 {分块内容哈希: 提取结果}
+
+        返回:
+            (合并后的结果, [(分块内容哈希, 提取结果)], 复用的分块数)
+        """
+        previous = previous or {}
+        chunks = list(iter_stable_chunks(text, APIConfig.CHUNK_MAX_TOKENS))
+        if not chunks:
+            raise Exception("处理文本失败:文本为空")
+        hashes = [hashlib.sha256(chunk.encode("utf-8")).hexdigest() for chunk in chunks]
+
+        async def extract(chunk: str, chunk_hash: str) -> str:
+            if chunk_hash in previous:
+                return previous[chunk_hash]
+            return await self.get_completion_with_cache(prompt_template.format(text=chunk))
+
+        try:
+            summaries = await asyncio.gather(*[extract(c, h) for c, h in zip(chunks, hashes)])
+        except Exception as e:
+            raise Exception(f"处理文本块失败:{str(e)}")
+
+        reused = sum(1 for h in hashes if h in previous)
+        print(f"增量处理：共{len(chunks)}块，复用{reused}块")
+        if len(summaries) == 1:
+            result = summaries[0]
+        else:
+            # 以分块哈希决定合并批次，未变化的子树命中缓存
+            result = await self.merge_summaries(list(summaries), merge_prompt_template, keys=hashes)
+        return result, list(zip(hashes, summaries)), reused
+
     async def summarize(
             self,
-            chunks: List[str],
-            mode: str
+            chunks: Union[str, List[str]],
+            mode: str = "knowledge_graph_extraction_prompt"
     ) -> str:
-        """文本处理方法"""
-        merged_chunk = []
-        current_chunk = ""
-        max_size = 3000 if self.provider == "deepseek" else 6000
-
-        for chunk in chunks:
-            if len(current_chunk) + len(chunk) < max_size:
-                current_chunk += "\n\n" + chunk if current_chunk else chunk
-            else:
-                if current_chunk:
-                    merged_chunk.append(current_chunk)
+        """
+        文本处理方法：按token分块提取，再树形合并
 
-                current_chunk = chunk
+        参数:
+            chunks: 完整文本（自动分块）或已切分的文本块列表（按token上限重新打包）
+            mode: 提示词类型，见utils.prompts.get_prompts
+        """
+        if isinstance(chunks, str):
+            chunk_iter = iter_chunks(chunks, APIConfig.CHUNK_MAX_TOKENS, APIConfig.CHUNK_OVERLAP_TOKENS)
+        else:
+            chunk_iter = iter(pack_chunks(chunks, APIConfig.CHUNK_MAX_TOKENS))
 
-        if current_chunk:
-            merged_chunk.append(current_chunk)
+        prompts = get_prompts(mode)
+        return await self._map_reduce(chunk_iter, prompts["prompt"], prompts["merge_prompt"])
 
-        prompts = get_prompts()
-        prompt_template = prompts["knowledge_graph_extraction_prompt"]
+    async def extract_knowledge_graph(self, chunks: Union[str, List[str]]) -> KnowledgeGraph:
+        """提取知识图谱并解析为实体、关系和属性"""
+        return parse_knowledge_graph(await self.summarize(chunks, mode="knowledge_graph_extraction_prompt"))
 
-        total_chunks = len(chunks)
+    async def _map_reduce(
+            self,
+            chunks: Iterable[str],
+            prompt_template: str,
+            merge_prompt_template: str
+    ) -> str:
+        """对分块逐个调用提示词（边分块边发送请求），再把各块结果树形合并"""
+        tasks = []
         processed = 0
 
         async def process_chunk(chunk: str) -> str:
             nonlocal processed
-            prompt = f"{prompt_template}\n\n文本内容:\n{chunk}"
+            prompt = prompt_template.format(text=chunk)
             result = await self.get_completion_with_cache(prompt)
             processed += 1
-            # TODO
             if self.progress_callback:
-                self.progress_callback(processed / total_chunks)
+                self.progress_callback(processed / len(tasks))
             return result
 
-        # TODO 回来看
         try:
-            chunk_summaries = await asyncio.gather(
-                *[process_chunk(chunk) for chunk in chunks]
-            )
+            for chunk in chunks:
+                tasks.append(asyncio.ensure_future(process_chunk(chunk)))
+                await asyncio.sleep(0)  # 让已创建的请求先发出去，再继续分块
+            if not tasks:
+                raise ValueError("文本为空")
+            print(f"文本共分为{len(tasks)}块")
+            chunk_summaries = await asyncio.gather(*tasks)
         except Exception as e:
+            for task in tasks:
+                task.cancel()
             raise Exception(f"处理文本块失败:{str(e)}")
         # 只有一个块直接返回
         if len(chunk_summaries) == 1:
@@ -219,37 +484,150 @@ class AIHandler:
 
         # 合并多个块的总结
         try:
-            return await self.merge_summaries(chunk_summaries, prompts["merge_prompt"])
+            return await self.merge_summaries(list(chunk_summaries), merge_prompt_template)
         except Exception as e:
             raise Exception(f"总结失败: {str(e)}")
 
+    @staticmethod
+    def _plan_keyed_batches(keys: List[str], fan_in: int) -> List[Tuple[int, int]]:
+        """
+        按内容哈希确定合并批次边界，返回[(起始下标, 结束下标)]
+
+        哈希值能被fan_in整除的元素结束当前批次（平均每批fan_in个，最多2*fan_in个），
+        插入或删除元素只影响附近的批次，其余批次的合并输入不变
+        """
+        ranges, start = [], 0
+        for i, key in enumerate(keys):
+            size = i - start + 1
+            if size >= 2 * fan_in or (size >= 2 and int(key[:8], 16) % fan_in == 0):
+                ranges.append((start, i + 1))
+                start = i + 1
+        if start < len(keys):
+            ranges.append((start, len(keys)))
+        return ranges
+
+    def _plan_merge_batches(
+            self,
+            summaries: List[str],
+            fan_in: int,
+            token_budget: int = None
+    ) -> List[List[str]]:
+        """
+        把一层的总结切分为若干合并批次
+
+        未指定token_budget时每批固定fan_in个；指定时按顺序把总结装入批次，直到达到token预算
+        """
+        if not token_budget:
+            return [summaries[i:i + fan_in] for i in range(0, len(summaries), fan_in)]
+
+        batches = []
+        batch, batch_tokens = [], 0
+        for summary in summaries:
+            tokens = estimate_tokens(summary)
+            if batch and batch_tokens + tokens > token_budget:
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(summary)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+
+        # 每个总结都超出预算时退化为两两合并，保证每一层都在收敛
+        if len(batches) == len(summaries):
+            return [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        return batches
+
     async def merge_summaries(
             self,
             summaries: List[str],
-            merge_prompt_template: str
+            merge_prompt_template: str,
+            fan_in: int = None,
+            token_budget: int = None,
+            keys: List[str] = None
     ) -> str:
-        """合并策略"""
+        """
+        合并策略：树形归并，同一层的各个批次并发合并（并发数受准入控制限制）
+
+        参数:
+            fan_in: 每批合并的总结数量，默认APIConfig.MERGE_FAN_IN
+            token_budget: 每批输入的token预算，指定后按预算打包批次而不是固定数量，
+                          传入-1表示按模型上下文长度自动计算
+            keys: 每个总结对应的内容哈希，指定后按哈希确定批次边界（用于增量处理）
+        """
+        if merge_prompt_template == MERGE_PROMPT:
+            merged = await self._premerge_knowledge_graphs(summaries)
+            if merged is not None:
+                return merged
+
         if len(summaries) <= 2:
             combined_text = "\n\n".join(summaries)
             return await self._merge_batch(combined_text, merge_prompt_template)
 
-        batch_size = 3
+        fan_in = max(2, fan_in or APIConfig.MERGE_FAN_IN)
+        if token_budget == -1:
+            token_budget = self._merge_token_budget(merge_prompt_template)
+
+        level = 0
         while len(summaries) > 1:
-            new_summaries = []
-            # 遍历summaries列表，每次取batch_size个元素
-            for i in range(0, len(summaries), batch_size):
-                batch = summaries[i:i + batch_size]
-                # 如果batch列表长度为1，则直接将元素添加到new_summaries列表中
+            if keys:
+                ranges = self._plan_keyed_batches(keys, fan_in)
+                batches = [summaries[start:end] for start, end in ranges]
+                keys = [
+                    hashlib.sha256("|".join(keys[start:end]).encode()).hexdigest()
+                    for start, end in ranges
+                ]
+            else:
+                batches = self._plan_merge_batches(summaries, fan_in, token_budget)
+            level += 1
+            print(f"第{level}层合并：{len(summaries)}个总结，{len(batches)}个批次")
+
+            async def merge(batch: List[str]) -> str:
+                # 只有一个元素的批次直接进入下一层
                 if len(batch) == 1:
-                    new_summaries.append(batch[0])
-                # 否则，将batch列表中的元素合并为一个字符串，并调用_merge_batch方法进行合并
-                else:
-                    combined_text = f"\n\n".join(batch)
-                    merged = await self._merge_batch(combined_text, merge_prompt_template)
-                    new_summaries.append(merged)
-            summaries = new_summaries
+                    return batch[0]
+                return await self._merge_batch("\n\n".join(batch), merge_prompt_template)
+
+            summaries = list(await asyncio.gather(*[merge(batch) for batch in batches]))
         return summaries[0]
 
+    async def _premerge_knowledge_graphs(self, summaries: List[str]) -> Optional[str]:
+        """
+        本地确定性合并知识图谱：解析各块的提取结果，合并相同实体并重新编号，
+        只把实体类型和属性取值的冲突交给API解决
+
+        返回:
+            合并结果；有提取结果无法解析时返回None，由调用方退回到API合并
+        """
+        graphs = [parse_knowledge_graph(summary) for summary in summaries]
+        if not all(graph.entities for graph in graphs):
+            print("部分提取结果无法解析，使用API合并")
+            return None
+
+        merged, conflicts = merge_graphs(graphs)
+        print(f"本地合并知识图谱：{len(graphs)}个来源，{len(merged.entities)}个实体，{len(conflicts)}处冲突")
+        if not conflicts:
+            self.stats["local_merges"] += 1
+            return merged.to_text()
+
+        try:
+            prompt = KG_CONFLICT_PROMPT.format(text=conflicts.to_text(merged))
+            resolution = await self.get_completion_with_cache(
+                prompt,
+                max_tokens=min(4096, self.config["max_tokens"])
+            )
+            self.stats["conflict_merges"] += 1
+            print(f"解决冲突{apply_resolution(merged, conflicts, resolution)}处")
+        except Exception as e:
+            # 冲突未解决时保留全部候选（类型取第一个），结果仍然可用
+            print(f"解决知识图谱冲突失败:{str(e)}")
+        return merged.to_text()
+
+    def _merge_token_budget(self, merge_prompt_template: str) -> int:
+        """按模型上下文长度计算每批合并输入的token预算：上下文 - 输出上限 - 提示词模板"""
+        output_tokens = min(4096, self.config["max_tokens"])
+        context_tokens = self.config.get("context_tokens", APIConfig.DEEPSEEK_CONTEXT_TOKENS)
+        return max(1, context_tokens - output_tokens - estimate_tokens(merge_prompt_template))
+
     async def _merge_batch(self, text: str, merge_prompt_template: str) -> str:
         """合并文本"""
         try:
@@ -0,0 +1,134 @@
+import re
+from array import array
+
+# 一条正则匹配一行：缩进、标题标记（#）或列表标记（- * + 1. 1)）、内容
+LINE_PATTERN = re.compile(
+    r'^(?P<indent>[ \t]*)'
+    r'(?:(?P<heading>#+)[ \t]+|(?P<bullet>[-*+]|\d+[.)])[ \t]+)?'
+    r'(?P<content>.*)$',
+    re.MULTILINE
+)
+
+DEFAULT_ROOT = "思维导图"
+TAB_WIDTH = 4
+
+
+class Outline:
+    """
+    紧凑的大纲节点数组，节点按先序排列，0号节点为根节点
+
+    每个节点只保存父节点下标、层级和标签在原文中的起止位置，不为每个节点创建对象
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parents = array('l')
+        self.depths = array('l')
+        self.starts = array('l')
+        self.ends = array('l')
+        self._root_label = None
+
+    def __len__(self):
+        return len(self.parents)
+
+    def append(self, parent: int, depth: int, start: int, end: int) -> int:
+        self.parents.append(parent)
+        self.depths.append(depth)
+        self.starts.append(start)
+        self.ends.append(end)
+        return len(self.parents) - 1
+
+    def label(self, index: int) -> str:
+        if index == 0 and self._root_label is not None:
+            return self._root_label
+        return self.text[self.starts[index]:self.ends[index]]
+
+    def labels(self):
+        return [self.label(i) for i in range(len(self))]
+
+    def children(self):
+        """每个节点的子节点下标列表"""
+        children = [[] for _ in range(len(self))]
+        parents = self.parents
+        for i in range(1, len(self)):
+            children[parents[i]].append(i)
+        return children
+
+    def to_nested(self):
+        """转换为嵌套列表，节点格式为[节点名称, [子节点...]]"""
+        nodes = [[label, []] for label in self.labels()]
+        parents = self.parents
+        for i in range(1, len(nodes)):
+            nodes[parents[i]][1].append(nodes[i])
+        return nodes[0]
+
+    def to_compact(self) -> dict:
+        """
+        转换为紧凑的JSON树，供前端自行布局
+
+        节点格式为{"n": 节点名称, "c": [子节点...]}，叶子节点省略"c"
+        """
+        nodes = [{"n": label} for label in self.labels()]
+        parents = self.parents
+        for i in range(1, len(nodes)):
+            parent = nodes[parents[i]]
+            if "c" in parent:
+                parent["c"].append(nodes[i])
+            else:
+                parent["c"] = [nodes[i]]
+        return nodes[0]
+
+
+def _indent_width(indent: str) -> int:
+    return len(indent) + indent.count('\t') * (TAB_WIDTH - 1)
+
+
+def parse_outline(text: str) -> Outline:
+    """
+    单次扫描解析Markdown大纲，时间复杂度O(行数)
+
+    - 第一行非空内容为根节点
+    - 标题（#）的层级为#的个数减去根节点标题的#个数（至少为1），最多比上一个节点深一级
+    - 列表项（- * + 1. 1)）和普通文本行挂在最近的标题下，按缩进确定嵌套层级
+    """
+    outline = Outline(text)
+    path = []  # 当前节点到根节点路径上的节点下标，path[层级] = 节点下标
+    list_indents = []  # 当前标题下各级列表的缩进宽度
+    heading_depth = 0
+    root_level = 0  # 根节点标题的#个数
+
+    for match in LINE_PATTERN.finditer(text):
+        start, end = match.span('content')
+        while end > start and text[end - 1] in ' \t\r':
+            end -= 1
+        if start == end:
+            continue
+
+        heading = match.group('heading')
+        if not path:
+            # 根节点
+            root_level = len(heading) if heading else 0
+            path.append(outline.append(-1, 0, start, end))
+            continue
+
+        if heading:
+            depth = min(max(len(heading) - root_level, 1), len(path))
+            del path[depth:]
+            heading_depth = depth
+            list_indents.clear()
+        else:
+            # 列表项：缩进更深则嵌套一级，否则回到缩进相同的那一级
+            indent = _indent_width(match.group('indent'))
+            while list_indents and list_indents[-1] > indent:
+                list_indents.pop()
+            if not list_indents or list_indents[-1] < indent:
+                list_indents.append(indent)
+            depth = heading_depth + len(list_indents)
+            del path[depth:]
+
+        path.append(outline.append(path[-1], depth, start, end))
+
+    if not path:
+        outline._root_label = DEFAULT_ROOT
+        outline.append(-1, 0, 0, 0)
+    return outline
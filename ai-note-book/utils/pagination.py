@@ -0,0 +1,58 @@
+import base64
+import hashlib
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from models.Note import Note
+
+# 列表接口允许返回的字段
+NOTE_FIELDS = Note.FIELDS
+# 非数据库列的字段 -> 所依赖的列
+DERIVED_FIELDS = Note.DERIVED_FIELDS
+# 分页排序必须用到的字段，即使没有在fields中指定也会加载
+KEYSET_FIELDS = ('id', 'update_time')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """解析fields=参数，返回字段列表；未指定时返回None表示全部字段，包含未知字段时抛出ValueError"""
+    if not fields:
+        return None
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in selected if field not in NOTE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+
+def field_columns(fields: List[str]) -> List[str]:
+    """返回字段列表需要从数据库加载的列（包含分页排序用到的列）"""
+    return sorted({DERIVED_FIELDS.get(field, field) for field in fields} | set(KEYSET_FIELDS))
+
+
+def encode_cursor(update_time: datetime, note_id: int) -> str:
+    """把分页位置(update_time, id)编码为不透明的游标字符串"""
+    raw = f"{update_time.isoformat()}|{note_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标字符串，格式错误时抛出ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        update_time, note_id = base64.urlsafe_b64decode(padded.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(update_time), int(note_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def list_etag(rows: List[Tuple[int, datetime, int]], *parts) -> str:
+    """根据一页数据的(id, update_time, version)和请求参数计算ETag"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(f"{part}|".encode())
+    for note_id, update_time, version in rows:
+        digest.update(f"{note_id}:{update_time.isoformat() if update_time else ''}:{version};".encode())
+    return digest.hexdigest()
@@ -191,6 +191,60 @@ Input Text:
 Please provide the response in Simplified Chinese.
 """
 
+MIND_MAP_MERGE_PROMPT = """
+
+Role: Markdown Mindmap Merge Assistant
+You are a skilled assistant specialized in merging several hierarchical Markdown outlines, each summarizing one consecutive part of the same document, into a single outline optimized for generating mind maps.
+
+## Core Tasks
+1.Merge Main Concepts
+    -Combine the top-level headings (#) of all outlines, merging headings that describe the same topic.
+    -Keep the original order of topics as they appear in the document.
+
+2.Merge Sub-Concepts and Details
+    -Merge sub-topics (##) and details (### or -) under the merged main concepts.
+    -Remove duplicated details that appear in overlapping parts of the outlines.
+
+## Requirements
+- Keep the hierarchical Markdown format (`#`, `##`, `###`, `-`).
+- Start the output with a single top-level heading that names the whole document.
+- Keep the total length appropriate for a mind map (typically 500-1000 words).
+- Output only the merged outline.
+- Provide the response in Simplified Chinese.
+"""
+
+KG_CONFLICT_PROMPT = """
+
+Role: Knowledge Graph Conflict Resolution Assistant
+The entities and attributes below were extracted from different parts of the same document and have already been merged. Some of them still have conflicting candidates.
+
+## Core Tasks
+1.Entity Types
+    -When an entity is listed several times with different types, choose the single most accurate type.
+
+2.Attribute Values
+    -When an attribute is listed several times with different values, keep only the correct value.
+    -Keep several values only if all of them are true at the same time.
+
+## Output Format
+Entity List:
+E1: Entity Name (Type)
+...
+
+Attribute List:
+(E1, Attribute, Value)
+...
+
+## Requirements
+    -Keep the identifiers (E1, E2, ...) and entity names unchanged.
+    -Output only the entities and attributes listed in the input.
+
+Input Text:
+{text}
+
+Please provide the response in Simplified Chinese.
+"""
+
 def get_prompts_type(type: str) -> str:
     """根据传过来的类型返回相应的提示词"""
     if type =="knowledge_graph_extraction_prompt":
@@ -198,9 +252,15 @@ def get_prompts_type(type: str) -> str:
     elif type == "mind_map_prompt":
         return MIND_MAP_PROMPT
 
+def get_merge_prompt_type(type: str) -> str:
+    """根据传过来的类型返回相应的合并提示词"""
+    if type == "mind_map_prompt":
+        return MIND_MAP_MERGE_PROMPT
+    return MERGE_PROMPT
+
 def get_prompts(type: str = "mind_map_prompt") -> Dict[str, str]:
     return {
         "prompt": get_prompts_type(type),
-        "merge_prompt": MERGE_PROMPT,
+        "merge_prompt": get_merge_prompt_type(type),
         "final_summary_prompt": FINAL_SUMMARY_PROMPT
     }
@@ -0,0 +1,238 @@
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional
+
+from openai import AsyncOpenAI
+
+from config.APIconfig import APIConfig
+from utils.rate_limiter import RateLimiter
+
+
+class Provider:
+    """
+    一个大模型后端：客户端、配置、准入控制和健康统计
+
+    延迟和错误率都是指数加权平均（EWMA），错误率超过阈值且连续失败时暂停使用一段时间；
+    错误率还会随时间按半衰期衰减，出错后一直被其他后端抢先、没有机会成功的后端也会逐渐恢复排序
+    """
+
+    def __init__(self, name: str, api_key: str, api_base: str = None, config: dict = None,
+                 client=None, max_retries: int = None, error_half_life: float = None):
+        """
+        参数:
+            name: 后端名称，见APIConfig.get_config
+            api_key: API密钥
+            api_base: 接口地址，为None时使用配置中的默认地址
+            config: 模型配置，为None时按名称读取
+            client: 自定义客户端（用于测试），为None时创建AsyncOpenAI客户端
+            max_retries: 单个后端的重试次数，默认APIConfig.MAX_RETRIES
+            error_half_life: 错误率衰减的半衰期，默认APIConfig.PROVIDER_ERROR_HALF_LIFE，为0时不随时间衰减
+        """
+        self.name = name
+        self.config = config or APIConfig.get_config(provider=name)
+        self.client = client or AsyncOpenAI(
+            api_key=api_key,
+            base_url=api_base or self.config["api_base"],
+            timeout=APIConfig.PROVIDER_TIMEOUT,
+            max_retries=0  # 重试由limiter统一处理，避免与客户端内置的重试叠加而推迟切换后端
+        )
+        # 每个后端单独限流：不同服务的并发和速率限制互不影响
+        self.limiter = RateLimiter(
+            max_concurrent=APIConfig.MAX_CONCURRENT,
+            requests_per_minute=APIConfig.REQUESTS_PER_MINUTE,
+            tokens_per_minute=APIConfig.TOKENS_PER_MINUTE,
+            max_retries=APIConfig.MAX_RETRIES if max_retries is None else max_retries,
+            retry_delay=APIConfig.RETRY_DELAY,
+            max_retry_delay=APIConfig.MAX_RETRY_DELAY
+        )
+
+        self.latency: Optional[float] = None  # 成功请求的平均延迟，单位：（second）
+        self.error_rate = 0.0
+        self.error_updated = time.monotonic()  # 错误率最近一次更新的时间
+        self.error_half_life = APIConfig.PROVIDER_ERROR_HALF_LIFE if error_half_life is None else error_half_life
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # 暂停使用的截止时间（time.monotonic）
+        self.stats = {"calls": 0, "failures": 0, "failovers": 0}
+
+    def max_tokens(self, max_tokens: int = None) -> int:
+        """本次请求的输出token上限，不超过模型配置"""
+        return min(max_tokens or self.config["max_tokens"], self.config["max_tokens"])
+
+    def available(self, now: float = None) -> bool:
+        return (now or time.monotonic()) >= self.open_until
+
+    def current_error_rate(self, now: float = None) -> float:
+        """按距上次更新的时间衰减后的错误率"""
+        if self.error_half_life <= 0:
+            return self.error_rate
+        elapsed = (now or time.monotonic()) - self.error_updated
+        return self.error_rate * 0.5 ** (max(elapsed, 0.0) / self.error_half_life)
+
+    def _update_error_rate(self, failed: bool, alpha: float) -> None:
+        now = time.monotonic()
+        self.error_rate = (1 - alpha) * self.current_error_rate(now) + (alpha if failed else 0.0)
+        self.error_updated = now
+
+    def score(self, now: float = None) -> float:
+        """预期耗时，越小越优先；还没有成功请求的后端得分为0，优先尝试一次以获得延迟数据"""
+        if self.latency is None:
+            return 0.0
+        return self.latency / max(0.05, 1.0 - self.current_error_rate(now))
+
+    def record_success(self, latency: float, alpha: float) -> None:
+        self.stats["calls"] += 1
+        self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+        self._update_error_rate(False, alpha)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self, alpha: float, threshold: float, cooldown: float) -> None:
+        self.stats["calls"] += 1
+        self.stats["failures"] += 1
+        self._update_error_rate(True, alpha)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= 2 and self.error_rate >= threshold:
+            self.open_until = time.monotonic() + cooldown
+            print(f"后端{self.name}连续失败{self.consecutive_failures}次，暂停使用{cooldown}s")
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats.update({
+            "model": self.config["model"],
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "error_rate": round(self.current_error_rate(), 4),
+            "available": self.available()
+        })
+        return stats
+
+
+def create_providers(names: List[str], max_retries: int = None) -> List[Provider]:
+    """
+    按名称创建后端，密钥和地址从配置中指定的环境变量读取，没有密钥的后端跳过
+
+    参数:
+        max_retries: 单个后端的重试次数，默认只有一个后端时为APIConfig.MAX_RETRIES，
+                     有多个后端时为APIConfig.FAILOVER_RETRIES（失败后直接切换）
+    """
+    providers = []
+    for name in names:
+        config = APIConfig.get_config(provider=name)
+        api_key = os.getenv(config["api_key_env"], "")
+        if not api_key and config.get("api_key_optional"):
+            api_key = "local"
+        if not api_key:
+            print(f"未配置{config['api_key_env']}，跳过后端{name}")
+            continue
+        providers.append((name, api_key, os.getenv(config["api_base_env"]) or config["api_base"], config))
+
+    if max_retries is None:
+        max_retries = APIConfig.MAX_RETRIES if len(providers) <= 1 else APIConfig.FAILOVER_RETRIES
+    return [
+        Provider(name, api_key, api_base, config, max_retries=max_retries)
+        for name, api_key, api_base, config in providers
+    ]
+
+
+class AllProvidersFailedError(Exception):
+    """所有后端都调用失败"""
+
+
+class ProviderRouter:
+    """
+    多后端路由：每次请求发给预期耗时最短的可用后端，失败或超时后依次切换到下一个
+
+    暂停中的后端排在最后，所有后端都不可用时仍会尝试，避免全部暂停期间请求直接失败
+    """
+
+    def __init__(self, providers: List[Provider], alpha: float = None, error_threshold: float = None,
+                 cooldown: float = None):
+        if not providers:
+            raise ValueError("至少需要一个后端")
+        self.providers = providers
+        self.alpha = APIConfig.PROVIDER_EWMA_ALPHA if alpha is None else alpha
+        self.error_threshold = APIConfig.PROVIDER_ERROR_THRESHOLD if error_threshold is None else error_threshold
+        self.cooldown = APIConfig.PROVIDER_COOLDOWN if cooldown is None else cooldown
+
+    @property
+    def primary(self) -> Provider:
+        return self.providers[0]
+
+    def candidates(self) -> List[Provider]:
+        """按尝试顺序排列的后端：可用的按得分排序（得分相同时保持配置顺序），暂停中的排在最后"""
+        now = time.monotonic()
+        order = {id(provider): index for index, provider in enumerate(self.providers)}
+        return sorted(
+            self.providers,
+            key=lambda provider: (not provider.available(now), provider.score(now), order[id(provider)])
+        )
+
+    def _failed(self, provider: Provider, error: Exception, remaining: int) -> None:
+        provider.record_failure(self.alpha, self.error_threshold, self.cooldown)
+        if remaining:
+            provider.stats["failovers"] += 1
+            print(f"后端{provider.name}调用失败，切换到下一个后端:{str(error)}")
+
+    async def call(self, request: Callable[[Provider], Awaitable[Any]]) -> Any:
+        """
+        执行一次请求，失败时切换后端
+
+        参数:
+            request: 接收后端并发起请求的协程函数
+
+        返回:
+            第一个成功的后端的结果
+        """
+        candidates = self.candidates()
+        errors = []
+        for index, provider in enumerate(candidates):
+            start = time.monotonic()
+            try:
+                result = await request(provider)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                errors.append(f"{provider.name}: {str(e)}")
+                self._failed(provider, e, len(candidates) - index - 1)
+                continue
+            provider.record_success(time.monotonic() - start, self.alpha)
+            return result
+        raise AllProvidersFailedError("所有后端调用失败 " + "; ".join(errors))
+
+    async def stream(self, open_stream: Callable[[Provider], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """
+        流式请求，只在收到第一段输出之前切换后端，已经开始输出后出错直接抛出
+
+        延迟按收到第一段输出的时间计算
+        """
+        candidates = self.candidates()
+        errors = []
+        for index, provider in enumerate(candidates):
+            start = time.monotonic()
+            stream = open_stream(provider)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                provider.record_success(time.monotonic() - start, self.alpha)
+                return
+            except asyncio.CancelledError:
+                await stream.aclose()
+                raise
+            except Exception as e:
+                await stream.aclose()
+                errors.append(f"{provider.name}: {str(e)}")
+                self._failed(provider, e, len(candidates) - index - 1)
+                continue
+
+            provider.record_success(time.monotonic() - start, self.alpha)
+            try:
+                yield first
+                async for item in stream:
+                    yield item
+            finally:
+                await stream.aclose()
+            return
+        raise AllProvidersFailedError("所有后端调用失败 " + "; ".join(errors))
+
+    def get_stats(self) -> dict:
+        return {provider.name: provider.get_stats() for provider in self.providers}
@@ -0,0 +1,53 @@
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _make_after_cursor_execute(slow_ms: float):
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info['query_start_time'].pop()) * 1000
+        slow = elapsed_ms >= slow_ms
+        if has_request_context():
+            queries = g.setdefault('sql_queries', [])
+            queries.append((statement, elapsed_ms, slow))
+        elif slow:
+            # 后台线程中的慢查询没有请求日志，直接输出
+            print(f"慢查询 {elapsed_ms:.1f}ms: {statement}")
+    return _after_cursor_execute
+
+
+def init_query_log(app, slow_ms: float = 100, log_all: bool = False):
+    """
+    记录每个请求执行的SQL语句和耗时，标记慢查询
+
+    参数:
+        slow_ms: 慢查询阈值，单位：（millisecond）
+        log_all: 是否输出每个请求的全部SQL语句，为False时只输出慢查询
+    """
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _make_after_cursor_execute(slow_ms))
+
+    @app.after_request
+    def log_request_queries(response):
+        queries = g.pop('sql_queries', None)
+        if not queries:
+            return response
+
+        total_ms = sum(elapsed_ms for _, elapsed_ms, _ in queries)
+        response.headers['X-SQL-Count'] = str(len(queries))
+        response.headers['X-SQL-Time'] = f"{total_ms:.1f}"
+
+        slow_queries = [q for q in queries if q[2]]
+        if log_all or slow_queries:
+            print(f"{request.method} {request.path}: {len(queries)}条SQL，共{total_ms:.1f}ms，慢查询{len(slow_queries)}条")
+            for statement, elapsed_ms, slow in queries:
+                if log_all or slow:
+                    flag = "[慢查询] " if slow else ""
+                    print(f"  {flag}{elapsed_ms:.1f}ms: {' '.join(statement.split())}")
+        return response
@@ -0,0 +1,170 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, AsyncIterator, Any
+
+from openai import APIConnectionError, APITimeoutError
+
+
+class TokenBucket:
+    """
+    令牌桶限流器，按每分钟速率匀速补充令牌
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        参数:
+            rate_per_minute: 每分钟补充的令牌数，小于等于0表示不限流
+            capacity: 桶容量，默认等于每分钟速率（允许一分钟的突发量）
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """获取令牌，不足时等待补充（先到先得）"""
+        if self.unlimited or amount <= 0:
+            return
+        amount = min(amount, self.capacity)  # 单次请求超过桶容量时按桶容量计算，避免永久等待
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """归还多预扣的令牌"""
+        if self.unlimited or amount <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+def is_retryable(error: Exception) -> bool:
+    """429限流、5xx服务端错误以及网络连接/超时错误可以重试"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+    return isinstance(error, (APIConnectionError, APITimeoutError, asyncio.TimeoutError))
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """读取响应头中的Retry-After（秒）"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    大模型调用准入控制：并发信号量 + 每分钟请求数/token数令牌桶 + 429/5xx指数退避重试
+    """
+
+    def __init__(
+            self,
+            max_concurrent: int,
+            requests_per_minute: float = 0,
+            tokens_per_minute: float = 0,
+            max_retries: int = 3,
+            retry_delay: float = 0.5,
+            max_retry_delay: float = 30.0
+    ):
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stats = {
+            "requests": 0,  # 获准发出的请求数（含重试）
+            "retries": 0,  # 重试次数
+            "throttled": 0,  # 被429限流的次数
+        }
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """计算第attempt次重试前的等待时间：指数退避 + 全抖动，优先遵守Retry-After"""
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_delay)
+        ceiling = min(self.max_retry_delay, self.retry_delay * (2 ** attempt))
+        return random.uniform(self.retry_delay / 2, ceiling)
+
+    async def _admit(self, tokens: int) -> None:
+        await self.request_bucket.acquire(1)
+        await self.token_bucket.acquire(tokens)
+
+    def _on_error(self, attempt: int, error: Exception) -> float:
+        """判断是否重试，返回等待时间；不可重试时重新抛出异常"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            raise error
+        if getattr(error, "status_code", None) == 429:
+            self.stats["throttled"] += 1
+        self.stats["retries"] += 1
+        delay = self.backoff(attempt, error)
+        print(f"API调用失败，{delay:.2f}s后进行第{attempt + 1}次重试:{str(error)}")
+        return delay
+
+    async def call(self, func: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """在准入控制下执行一次API调用，失败时按退避策略重试"""
+        attempt = 0
+        while True:
+            await self._admit(tokens)
+            async with self.semaphore:
+                self.stats["requests"] += 1
+                try:
+                    return await func()
+                except Exception as e:
+                    delay = self._on_error(attempt, e)
+            # 退避等待时不占用并发名额
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def stream(self, open_stream: Callable[[], Awaitable[Any]], tokens: int = 0) -> AsyncIterator[Any]:
+        """
+        在准入控制下执行流式API调用，整个流式传输期间占用一个并发名额
+
+        只在建立流之前失败时重试，已经开始输出后出错直接抛出
+        """
+        attempt = 0
+        while True:
+            await self._admit(tokens)
+            async with self.semaphore:
+                self.stats["requests"] += 1
+                try:
+                    stream = await open_stream()
+                except Exception as e:
+                    delay = self._on_error(attempt, e)
+                else:
+                    try:
+                        async for item in stream:
+                            yield item
+                    finally:
+                        close = getattr(stream, "close", None)
+                        if close is not None:
+                            await close()
+                    return
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def settle(self, reserved_tokens: int, used_tokens: Optional[int]) -> None:
+        """根据实际用量归还多预扣的token额度"""
+        if used_tokens is not None and used_tokens < reserved_tokens:
+            self.token_bucket.refund(reserved_tokens - used_tokens)
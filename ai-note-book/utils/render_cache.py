@@ -0,0 +1,228 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+# 渲染缓存文件名: mindmap_<64位哈希>.<格式>
+CACHE_FILE_PATTERN = re.compile(r'^mindmap_[0-9a-f]{64}\.\w+$')
+# 渲染过程中的临时文件: mindmap_tmp_<随机字符>.<格式>，渲染进程异常退出时可能残留
+TEMP_FILE_PATTERN = re.compile(r'^mindmap_tmp_\w+\.\w+$')
+# 清单文件：记录本服务生成的、不属于渲染缓存的图片文件名，孤立图片清理只处理清单中的文件
+MANIFEST_NAME = ".generated"
+
+
+class RenderCache:
+    """
+    思维导图渲染缓存：按(大纲哈希, 样式, dpi, 格式)保存渲染结果，相同的大纲不再重复渲染
+
+    缓存文件保存在输出目录中，超过容量上限时按最近使用时间淘汰；
+    get返回的路径会交给客户端或其他请求继续读取，最近min_idle秒内用过的文件不会被淘汰
+    """
+
+    def __init__(self, folder: str = "static/mindmaps", max_bytes: int = 512 * 1024 * 1024,
+                 memory_items: int = 1024, min_idle: float = 300):
+        """
+        参数:
+            folder: 缓存目录
+            max_bytes: 缓存文件总大小上限，单位：（byte）
+            memory_items: 内存渲染模式下记录的(渲染键 -> 文件存储哈希)条目数
+            min_idle: 文件最近一次使用后至少经过该时长才会被淘汰，单位：（second）
+        """
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.min_idle = min_idle
+        self.memory_items = memory_items
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._blob_index: "OrderedDict[str, str]" = OrderedDict()
+        self._manifest_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        os.makedirs(self.folder, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, style: str, dpi: int, image_format: str) -> str:
+        """计算渲染键"""
+        outline_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return hashlib.sha256(f"{outline_hash}|{style}|{dpi}|{image_format}".encode()).hexdigest()
+
+    def path(self, key: str, image_format: str) -> str:
+        return os.path.join(self.folder, f"mindmap_{key}.{image_format}")
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key: str, image_format: str) -> Optional[str]:
+        """查找缓存文件，命中时更新访问时间"""
+        path = self.path(key, image_format)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)  # 以修改时间作为最近使用时间
+        except OSError:
+            return None
+        return path
+
+    def get_or_render(self, key: str, image_format: str, render: Callable[[str], Optional[str]]) -> str:
+        """
+        返回缓存文件路径，未命中时调用render(输出路径)渲染
+
+        同一个渲染键同时只会渲染一次，其余并发请求等待渲染完成后直接使用结果
+        """
+        path = self.get(key, image_format)
+        if path:
+            self.stats["hits"] += 1
+            return path
+
+        with self._lock(key):
+            path = self.get(key, image_format)
+            if path:
+                self.stats["hits"] += 1
+                return path
+
+            self.stats["misses"] += 1
+            target = self.path(key, image_format)
+            # 先渲染到临时文件再原子替换，避免读到未写完的图片
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix="mindmap_tmp_", suffix=f".{image_format}")
+            os.close(fd)
+            try:
+                rendered = render(tmp_path) or tmp_path
+                os.replace(rendered, target)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        with self._locks_guard:
+            self._locks.pop(key, None)
+        self.enforce_limit()
+        return target
+
+    def get_blob(self, key: str) -> Optional[str]:
+        """内存渲染模式：查找渲染键对应的文件存储哈希"""
+        with self._locks_guard:
+            blob_hash = self._blob_index.get(key)
+            if blob_hash is not None:
+                self._blob_index.move_to_end(key)
+            return blob_hash
+
+    def remember_blob(self, key: str, blob_hash: str) -> None:
+        """内存渲染模式：记录渲染键对应的文件存储哈希"""
+        with self._locks_guard:
+            self._blob_index[key] = blob_hash
+            self._blob_index.move_to_end(key)
+            while len(self._blob_index) > self.memory_items:
+                self._blob_index.popitem(last=False)
+
+    def _cache_files(self):
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and CACHE_FILE_PATTERN.match(entry.name):
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def enforce_limit(self) -> int:
+        """
+        缓存文件超过容量上限时按最近使用时间淘汰到上限的90%，返回删除的文件数
+
+        最近min_idle秒内命中或生成的文件可能正在被读取，不会被淘汰，此时总大小可能暂时超过上限
+        """
+        files = list(self._cache_files())
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        target = int(self.max_bytes * 0.9)
+        deadline = time.time() - self.min_idle
+        for path, size, used_time in sorted(files, key=lambda item: item[2]):
+            if total <= target or used_time >= deadline:
+                break
+            try:
+                if os.path.getmtime(path) >= deadline:
+                    continue  # 列出文件之后又被命中
+                os.remove(path)
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+        self.stats["evictions"] += removed
+        print(f"渲染缓存淘汰{removed}个文件")
+        return removed
+
+    def get_stats(self) -> dict:
+        files = list(self._cache_files())
+        stats = dict(self.stats)
+        stats["files"] = len(files)
+        stats["bytes"] = sum(size for _, size, _ in files)
+        stats["memory_entries"] = len(self._blob_index)
+        return stats
+
+    def record_generated(self, path: str) -> None:
+        """把本服务生成的、不属于渲染缓存的图片登记到清单中，之后才会被孤立图片清理处理"""
+        if os.path.dirname(os.path.realpath(path)) != os.path.realpath(self.folder):
+            return
+        with self._manifest_lock:
+            with open(os.path.join(self.folder, MANIFEST_NAME), "a", encoding="utf-8") as file:
+                file.write(os.path.basename(path) + "\n")
+
+    def _read_manifest(self) -> list:
+        try:
+            with open(os.path.join(self.folder, MANIFEST_NAME), encoding="utf-8") as file:
+                return list(dict.fromkeys(line.strip() for line in file if line.strip()))
+        except FileNotFoundError:
+            return []
+
+    def _write_manifest(self, names: list) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix=f"{MANIFEST_NAME}.")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.writelines(name + "\n" for name in names)
+        os.replace(tmp_path, os.path.join(self.folder, MANIFEST_NAME))
+
+    def cleanup_orphans(self, referenced: Iterable[str], min_age: float = 24 * 3600) -> int:
+        """
+        清理输出目录中本服务生成、但没有被任何笔记引用的旧图片
+
+        只处理清单中登记的文件（见record_generated）和残留的渲染临时文件，
+        目录中的其他文件（如随代码提交的示例图片、旧版本生成的历史图片）不会被删除；
+        渲染缓存文件由enforce_limit按容量淘汰
+
+        参数:
+            referenced: 仍被引用的文件路径
+            min_age: 只清理修改时间早于该时长的文件，单位：（second）
+        """
+        referenced = {os.path.realpath(path) for path in referenced if path}
+        deadline = time.time() - min_age
+
+        def expired(path):
+            return os.path.realpath(path) not in referenced and os.path.getmtime(path) < deadline
+
+        removed = 0
+        with self._manifest_lock:
+            kept = []
+            for name in self._read_manifest():
+                path = os.path.join(self.folder, name)
+                try:
+                    if expired(path):
+                        os.remove(path)
+                        removed += 1
+                    else:
+                        kept.append(name)
+                except FileNotFoundError:
+                    pass  # 已被删除的文件从清单中移除
+                except OSError:
+                    kept.append(name)
+            self._write_manifest(kept)
+
+        for entry in os.scandir(self.folder):
+            if entry.is_file() and TEMP_FILE_PATTERN.match(entry.name):
+                try:
+                    if entry.stat().st_mtime < deadline:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass
+        print(f"清理孤立图片{removed}个")
+        return removed
@@ -0,0 +1,253 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import threading
+from typing import Optional
+
+# 工作进程中的思维导图生成器，每个进程初始化一次
+_worker_generator = None
+
+# 工作进程完成初始化后发送的消息
+_READY = "ready"
+
+
+def _init_worker():
+    """工作进程初始化：使用无界面的Qt平台插件，并渲染一张小图完成Qt初始化"""
+    global _worker_generator
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from utils.mindmap_generator import MindmapGenerator
+
+    _worker_generator = MindmapGenerator()
+    try:
+        _worker_generator.render_bytes("思维导图\n- 预热")
+    except Exception as e:
+        print(f"渲染进程预热失败:{str(e)}")
+
+
+def _worker_main(conn):
+    """工作进程主循环：逐个接收大纲文本，返回(是否成功, 图片内容或错误信息)，收到None时退出"""
+    _init_worker()
+    conn.send(_READY)
+    while True:
+        try:
+            text = conn.recv()
+        except EOFError:
+            break
+        if text is None:
+            break
+        try:
+            conn.send((True, _worker_generator.render_bytes(text)))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+
+class RenderTimeoutError(Exception):
+    """渲染超时"""
+
+
+class _Worker:
+    """一个渲染工作进程及其专用管道，同一时间只处理一个任务"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+        self.tasks = 0
+
+    def wait_ready(self, timeout: float) -> None:
+        """等待进程完成初始化（Qt预热），超时抛出RenderTimeoutError"""
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise RenderTimeoutError(f"渲染进程启动超时({timeout}s)")
+        self.conn.recv()
+        self.ready = True
+
+    def stop(self) -> None:
+        """通知进程退出，没有及时退出时终止"""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.conn.close()
+
+    def kill(self) -> None:
+        """终止进程（用于卡住或管道已断开的进程）"""
+        self.process.terminate()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class RenderPool:
+    """
+    思维导图渲染进程池
+
+    ete3的渲染是CPU密集型操作且会持有GIL，Qt也不能在多个线程间共享，
+    所以在常驻的工作进程中渲染：每个进程只初始化一次Qt，渲染指定次数后自动替换进程以释放内存
+
+    每个工作进程有单独的管道，任务只发给空闲的进程，超时从进程开始处理任务时计算，
+    排队等待空闲进程的时间不计入；超时后只终止处理该任务的进程，其他进程上的任务不受影响
+    """
+
+    def __init__(self, workers: int = 2, timeout: float = 60, max_tasks_per_child: int = 50,
+                 startup_timeout: float = 120):
+        """
+        参数:
+            workers: 工作进程数，为0时在当前进程中串行渲染（用于命令行模式和调试）
+            timeout: 单次渲染超时时间，单位：（second）
+            max_tasks_per_child: 每个工作进程最多渲染的次数，达到后替换为新进程
+            startup_timeout: 工作进程启动（Qt初始化）的超时时间，单位：（second）
+        """
+        self.workers = workers
+        self.timeout = timeout
+        self.max_tasks_per_child = max_tasks_per_child
+        self.startup_timeout = startup_timeout
+
+        # 使用spawn启动进程，避免在已有多个线程的Web进程中fork
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._workers = set()  # 存活的工作进程
+        # 空闲的工作进程；None表示一个空位，取到后再启动进程
+        self._idle: "queue.Queue[Optional[_Worker]]" = queue.Queue()
+        for _ in range(max(workers, 0)):
+            self._idle.put(None)
+
+        self._local_generator = None
+        self._local_lock = threading.Lock()
+        self.stats = {"renders": 0, "timeouts": 0, "failures": 0, "restarts": 0}
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _acquire(self) -> _Worker:
+        """取一个空闲的工作进程，没有空闲进程时等待"""
+        worker = self._idle.get()
+        if worker is None:
+            try:
+                worker = self._spawn()
+            except Exception:
+                self._idle.put(None)
+                raise
+        return worker
+
+    def _release(self, worker: _Worker) -> None:
+        """任务完成后归还工作进程，达到渲染次数上限时替换为新进程"""
+        worker.tasks += 1
+        if worker.tasks >= self.max_tasks_per_child:
+            self._discard(worker)
+        else:
+            self._idle.put(worker)
+
+    def _discard(self, worker: _Worker, kill: bool = False) -> None:
+        """停止工作进程并空出位置，下次取用时启动新进程"""
+        with self._lock:
+            owned = worker in self._workers
+            self._workers.discard(worker)
+        if kill:
+            worker.kill()
+        else:
+            worker.stop()
+        if owned:  # shutdown之后才结束的进程不再占位
+            self.stats["restarts"] += 1
+            self._idle.put(None)
+
+    def start(self):
+        """预先启动全部工作进程，避免第一个请求等待Qt初始化"""
+        if self.workers <= 0:
+            return
+        items = []
+        while True:
+            try:
+                items.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            for index, item in enumerate(items):
+                if item is None:
+                    items[index] = self._spawn()
+        finally:
+            for item in items:
+                self._idle.put(item)
+        print(f"渲染进程池启动，工作进程数:{self.workers}")
+
+    def shutdown(self, wait: bool = True):
+        """停止全部工作进程，之后再渲染时重新启动"""
+        with self._lock:
+            workers, self._workers = list(self._workers), set()
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+            for _ in range(max(self.workers, 0)):
+                self._idle.put(None)
+        for worker in workers:
+            if wait:
+                worker.stop()
+            else:
+                worker.kill()
+
+    def _render_local(self, text: str) -> bytes:
+        from utils.mindmap_generator import MindmapGenerator
+
+        with self._local_lock:
+            if self._local_generator is None:
+                self._local_generator = MindmapGenerator()
+            return self._local_generator.render_bytes(text)
+
+    def render(self, text: str, timeout: Optional[float] = None) -> bytes:
+        """渲染思维导图，返回PNG图片内容（阻塞调用，超时抛出RenderTimeoutError）"""
+        if self.workers <= 0:
+            image = self._render_local(text)
+            self.stats["renders"] += 1
+            return image
+
+        timeout = timeout or self.timeout
+        for attempt in range(2):
+            worker = self._acquire()  # 排队等待空闲进程的时间不计入超时
+            try:
+                worker.wait_ready(self.startup_timeout)
+                worker.conn.send(text)
+                if not worker.conn.poll(timeout):
+                    self.stats["timeouts"] += 1
+                    raise RenderTimeoutError(f"思维导图渲染超时({timeout}s)")
+                ok, value = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                # 工作进程异常退出，换一个进程重试一次
+                self._discard(worker, kill=True)
+                if attempt:
+                    self.stats["failures"] += 1
+                    raise Exception(f"渲染进程异常退出:{str(e) or type(e).__name__}")
+                continue
+            except Exception:
+                # 超时等情况下进程状态未知，只终止这一个进程
+                self._discard(worker, kill=True)
+                raise
+
+            self._release(worker)
+            if not ok:
+                self.stats["failures"] += 1
+                raise Exception(f"思维导图渲染失败:{value}")
+            self.stats["renders"] += 1
+            return value
+
+    async def render_async(self, text: str, timeout: Optional[float] = None) -> bytes:
+        """异步渲染，等待期间不阻塞事件循环"""
+        return await asyncio.to_thread(self.render, text, timeout)
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["workers"] = self.workers
+        stats["alive"] = len(self._workers)
+        return stats
@@ -0,0 +1,350 @@
+import heapq
+import html
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from typing import Iterable, List, Sequence, Tuple
+
+# 连续的CJK字符（中日韩统一表意文字、假名、韩文）按二元组切分，其余按字母数字串切分
+CJK_RUN = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+TOKEN_PATTERN = re.compile(f'[{CJK_RUN}]+|[a-z0-9]+')
+# 高亮时按原始查询中的词匹配
+QUERY_WORD_PATTERN = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+# 富文本编辑器保存的笔记内容是HTML，建索引前去掉标签
+HTML_TAG_PATTERN = re.compile(r'<[^>]*>')
+
+TITLE_WEIGHT = 3  # 标题中的词按出现3次计算
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 索引格式版本，分词规则变化时递增，旧版本的索引需要执行--reindex重建
+INDEX_VERSION = 2
+
+
+def normalize(text: str) -> str:
+    """全角转半角并转为小写"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def plain_text(content: str) -> str:
+    """去掉HTML标签并还原实体，纯文本内容原样返回"""
+    if not content or '<' not in content:
+        return content or ""
+    return html.unescape(HTML_TAG_PATTERN.sub(' ', content))
+
+
+def tokenize(text: str, run_ends: bool = False) -> List[str]:
+    """
+    分词：CJK字符按相邻两个字切分（单个字单独成词），英文和数字按连续串切分
+
+    例如"百度公司2000年" -> ["百度", "度公", "公司", "2000", "年"]
+
+    参数:
+        run_ends: 为True时CJK串的最后一个字再单独成词（建索引时使用）。单字查询按前缀匹配二元组，
+                  串末尾的字不是任何二元组的首字，需要单独成词才能被查到，如"企业家"中的"家"
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(normalize(text)):
+        run = match.group()
+        if run[0] <= 'z':
+            tokens.append(run[:MAX_TERM_LENGTH])
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            if run_ends:
+                tokens.append(run[-1])
+    return tokens
+
+
+def highlight(text: str, query: str, width: int = 0, tag: str = "em") -> str:
+    """
+    HTML转义并用<em>标记查询词
+
+    参数:
+        width: 大于0时只截取第一个匹配位置附近width个字符作为摘要
+    """
+    text = text or ""
+    words = sorted(set(QUERY_WORD_PATTERN.findall(unicodedata.normalize("NFKC", query))), key=len, reverse=True)
+    pattern = re.compile("|".join(re.escape(word) for word in words), re.IGNORECASE) if words else None
+
+    start, end = 0, len(text)
+    if width > 0:
+        match = pattern.search(text) if pattern else None
+        start = max(0, match.start() - width // 4) if match else 0
+        end = min(len(text), start + width)
+
+    parts = ["…"] if start > 0 else []
+    position = start
+    if pattern:
+        for match in pattern.finditer(text, start, end):
+            parts.append(html.escape(text[position:match.start()]))
+            parts.append(f"<{tag}>{html.escape(match.group())}</{tag}>")
+            position = match.end()
+    parts.append(html.escape(text[position:end]))
+    if end < len(text):
+        parts.append("…")
+    return "".join(parts)
+
+
+class SearchIndex:
+    """
+    笔记全文检索的倒排索引，保存在单独的SQLite文件中，按用户分区
+
+    - postings表以(user_id, term, doc_id)为主键，查询时只扫描当前用户的倒排列表
+    - 每篇笔记的词表保存在docs表中，更新和删除时据此删除旧的倒排记录
+    - 使用BM25排序，统计量（文档数、平均长度、文档频率）按用户计算
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA cache_size=-65536")  # 64MB页缓存，批量写入时减少随机读
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS postings (
+                    user_id INTEGER NOT NULL,
+                    term TEXT NOT NULL,
+                    doc_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, term, doc_id)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS docs (
+                    doc_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    terms TEXT NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS user_stats (
+                    user_id INTEGER PRIMARY KEY,
+                    doc_count INTEGER NOT NULL,
+                    total_length INTEGER NOT NULL
+                )
+                """
+            )
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < INDEX_VERSION:
+                if self._conn.execute("SELECT 1 FROM docs LIMIT 1").fetchone() is None:
+                    self._conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+                else:
+                    print("全文检索索引由旧版本创建，部分单字查询可能查不到，请执行--reindex重建索引")
+
+    @staticmethod
+    def _term_frequencies(title: str, content: str) -> Tuple[Counter, int]:
+        counts = Counter(tokenize(plain_text(content), run_ends=True))
+        for term in tokenize(title, run_ends=True):
+            counts[term] += TITLE_WEIGHT
+        return counts, sum(counts.values())
+
+    def _remove(self, doc_id: int):
+        """删除文档的倒排记录（调用方持有锁并在事务中）"""
+        row = self._conn.execute("SELECT user_id, length, terms FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return
+        user_id, length, terms = row
+        self._conn.executemany(
+            "DELETE FROM postings WHERE user_id = ? AND term = ? AND doc_id = ?",
+            ((user_id, term, doc_id) for term in terms.split("\n") if term)
+        )
+        self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+        self._conn.execute(
+            "UPDATE user_stats SET doc_count = doc_count - 1, total_length = total_length - ? WHERE user_id = ?",
+            (length, user_id)
+        )
+
+    def _add(self, doc_id: int, user_id: int, title: str, content: str):
+        """写入文档的倒排记录（调用方持有锁并在事务中）"""
+        counts, length = self._term_frequencies(title, content)
+        self._conn.executemany(
+            "INSERT INTO postings (user_id, term, doc_id, tf, length) VALUES (?, ?, ?, ?, ?)",
+            ((user_id, term, doc_id, tf, length) for term, tf in counts.items())
+        )
+        self._conn.execute(
+            "INSERT INTO docs (doc_id, user_id, length, terms) VALUES (?, ?, ?, ?)",
+            (doc_id, user_id, length, "\n".join(counts))
+        )
+        self._conn.execute(
+            """
+            INSERT INTO user_stats (user_id, doc_count, total_length) VALUES (?, 1, ?)
+            ON CONFLICT(user_id) DO UPDATE SET doc_count = doc_count + 1, total_length = total_length + excluded.total_length
+            """,
+            (user_id, length)
+        )
+
+    def index(self, doc_id: int, user_id: int, title: str, content: str) -> None:
+        """新增或更新一篇笔记的索引"""
+        with self._lock, self._conn:
+            self._remove(doc_id)
+            self._add(doc_id, user_id, title, content)
+
+    def index_many(self, docs: Iterable[Tuple[int, int, str, str]]) -> int:
+        """在一个事务中批量写入索引，docs为(笔记ID, 用户ID, 标题, 内容)，返回写入数量"""
+        count = 0
+        with self._lock, self._conn:
+            for doc_id, user_id, title, content in docs:
+                self._remove(doc_id)
+                self._add(doc_id, user_id, title, content)
+                count += 1
+        return count
+
+    def remove(self, doc_id: int) -> None:
+        """删除一篇笔记的索引"""
+        with self._lock, self._conn:
+            self._remove(doc_id)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            for table in ("postings", "docs", "user_stats"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+
+    def _postings(self, user_id: int, term: str) -> dict:
+        """读取词的倒排列表 {doc_id: (tf, 文档长度)}，单个CJK字按前缀匹配以该字开头的二元组和该字本身"""
+        if len(term) == 1 and term > 'z':
+            rows = self._conn.execute(
+                "SELECT doc_id, tf, length FROM postings WHERE user_id = ? AND term >= ? AND term < ?",
+                (user_id, term, chr(ord(term) + 1))
+            )
+            postings = {}
+            for doc_id, tf, length in rows:
+                previous = postings.get(doc_id)
+                postings[doc_id] = (tf + previous[0] if previous else tf, length)
+            return postings
+        rows = self._conn.execute(
+            "SELECT doc_id, tf, length FROM postings WHERE user_id = ? AND term = ?",
+            (user_id, term)
+        )
+        return {doc_id: (tf, length) for doc_id, tf, length in rows}
+
+    def search(self, user_id: int, query: str, offset: int = 0, limit: int = 20,
+               match_all: bool = True) -> Tuple[int, List[Tuple[int, float]]]:
+        """
+        检索用户的笔记
+
+        参数:
+            match_all: 为True时只返回包含全部查询词的笔记，否则包含任意查询词即可
+
+        返回:
+            (匹配总数, [(笔记ID, 得分)])，按得分从高到低排列
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return 0, []
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT doc_count, total_length FROM user_stats WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if not row or not row[0]:
+                return 0, []
+            doc_count, total_length = row
+            postings = [self._postings(user_id, term) for term in terms]
+
+        avg_length = total_length / doc_count
+        postings.sort(key=len)
+        if match_all:
+            if not postings[0]:
+                return 0, []
+            candidates = set(postings[0])
+            for term_postings in postings[1:]:
+                candidates.intersection_update(term_postings)
+                if not candidates:
+                    return 0, []
+        else:
+            candidates = set().union(*postings)
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for term_postings in postings:
+            df = len(term_postings)
+            if not df:
+                continue
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for doc_id, (tf, length) in term_postings.items():
+                if doc_id in scores:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return len(scores), top[offset:offset + limit]
+
+    def stats(self) -> dict:
+        with self._lock:
+            docs, users = self._conn.execute(
+                "SELECT COALESCE(SUM(doc_count), 0), COUNT(*) FROM user_stats"
+            ).fetchone()
+        return {"documents": docs, "users": users}
+
+
+def sync_note_indexes(session, model, indexes: Sequence) -> None:
+    """
+    监听数据库会话，事务提交后把新增、修改、删除的笔记同步到各个索引
+
+    参数:
+        session: SQLAlchemy会话（如db.session）
+        model: 笔记模型，需要有id、user_id、title、content字段
+        indexes: 索引列表，需要有index(笔记ID, 用户ID, 标题, 内容)和remove(笔记ID)方法
+    """
+    # 只在接入Web应用时需要SQLAlchemy，基准测试等脚本可以单独使用SearchIndex
+    from sqlalchemy import event, inspect
+
+    watched = ("user_id", "title", "content")
+
+    def pending(sess) -> dict:
+        return sess.info.setdefault("note_index_pending", {})
+
+    @event.listens_for(session, "after_flush")
+    def collect_changes(sess, flush_context):
+        changes = pending(sess)
+        for obj in sess.new:
+            if isinstance(obj, model):
+                changes[obj.id] = (obj.user_id, obj.title, obj.content)
+        for obj in sess.dirty:
+            if isinstance(obj, model):
+                state = inspect(obj)
+                if any(state.attrs[name].history.has_changes() for name in watched):
+                    changes[obj.id] = (obj.user_id, obj.title, obj.content)
+        for obj in sess.deleted:
+            if isinstance(obj, model):
+                changes[obj.id] = None
+
+    @event.listens_for(session, "after_commit")
+    def apply_changes(sess):
+        changes = sess.info.pop("note_index_pending", None)
+        if not changes:
+            return
+        for index in indexes:
+            try:
+                for doc_id, change in changes.items():
+                    if change is None:
+                        index.remove(doc_id)
+                    else:
+                        index.index(doc_id, *change)
+            except Exception as e:
+                # 索引可以通过重建恢复，不影响笔记本身的保存
+                print(f"更新{type(index).__name__}失败:{str(e)}")
+
+    @event.listens_for(session, "after_rollback")
+    def discard_changes(sess):
+        sess.info.pop("note_index_pending", None)
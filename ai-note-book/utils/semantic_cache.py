@@ -0,0 +1,235 @@
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import struct
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import List, Optional, Tuple
+
+# 梅森素数，MinHash的哈希函数 h(x) = (a * x + b) mod p
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """文本归一化：全角转半角、小写、去掉标点符号和所有空白"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(ch for ch in text if not unicodedata.category(ch).startswith(("P", "S")))
+    return _WHITESPACE.sub("", text)
+
+
+def shingles(text: str, k: int = 3) -> set:
+    """把归一化后的文本切分为长度为k的字符片段集合"""
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+class MinHasher:
+    """
+    MinHash签名计算，两个签名中相同位置取值相等的比例近似于两个片段集合的Jaccard相似度
+    """
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [
+            (rng.randint(1, _MERSENNE_PRIME - 1), rng.randint(0, _MERSENNE_PRIME - 1))
+            for _ in range(num_perm)
+        ]
+
+    @staticmethod
+    def _hash(shingle: str) -> int:
+        return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def signature(self, shingle_set: set) -> Tuple[int, ...]:
+        if not shingle_set:
+            return tuple([_MAX_HASH] * self.num_perm)
+        values = [self._hash(s) for s in shingle_set]
+        return tuple(
+            min(((a * v + b) % _MERSENNE_PRIME) & _MAX_HASH for v in values)
+            for a, b in self.params
+        )
+
+    @staticmethod
+    def similarity(sig1: Tuple[int, ...], sig2: Tuple[int, ...]) -> float:
+        return sum(1 for x, y in zip(sig1, sig2) if x == y) / len(sig1)
+
+
+class SemanticCache:
+    """
+    近似重复文本缓存：归一化 + 字符片段MinHash + LSH分桶检索
+
+    文本只有空白、标点等细微差别时，直接返回相似文本已经生成过的结果
+    """
+
+    def __init__(
+            self,
+            db_path: Optional[str] = None,
+            threshold: float = 0.9,
+            num_perm: int = 64,
+            bands: int = 16,
+            shingle_size: int = 3,
+            max_entries: int = 10000,
+            ttl: float = 7 * 24 * 3600
+    ):
+        """
+        参数:
+            db_path: SQLite持久化文件路径，为None时只保存在内存中
+            threshold: 相似度阈值，估算的Jaccard相似度不低于该值才视为命中
+            num_perm: MinHash签名长度
+            bands: LSH分桶数，num_perm必须能被bands整除
+            shingle_size: 字符片段长度
+            max_entries: 最多保存的条目数，超出后淘汰最早写入的条目
+            ttl: 条目过期时间，单位：（second）
+        """
+        if num_perm % bands != 0:
+            raise ValueError("num_perm必须能被bands整除")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hasher = MinHasher(num_perm=num_perm)
+
+        self._lock = threading.Lock()
+        # id -> (scope, signature, result, created_at)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._buckets = defaultdict(set)  # (scope, band, band_hash) -> {id}
+        self._by_signature = {}  # (scope, signature) -> id，相同签名只保留最新的一条
+        self._next_id = 1
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0}
+
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._load()
+
+    def _load(self):
+        """从SQLite中加载未过期的条目"""
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS semantic_cache (
+                    id INTEGER PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        rows = self._conn.execute(
+            "SELECT id, scope, signature, result, created_at FROM semantic_cache ORDER BY id"
+        ).fetchall()
+        fmt = f"<{self.hasher.num_perm}Q"
+        duplicates = []
+        for entry_id, scope, blob, result, created_at in rows:
+            if len(blob) != struct.calcsize(fmt):
+                continue  # 签名长度配置变化后旧条目失效
+            signature = struct.unpack(fmt, blob)
+            previous = self._by_signature.get((scope, signature))
+            if previous is not None:
+                # 旧版本会为相同签名重复插入，只保留最新的一条
+                self._remove(previous)
+                duplicates.append((previous,))
+            self._index(entry_id, scope, signature, result, created_at)
+            self._next_id = max(self._next_id, entry_id + 1)
+        with self._conn:
+            self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", duplicates)
+            self._conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_semantic_cache_scope_signature ON semantic_cache (scope, signature)"
+            )
+        print(f"加载相似文本缓存:{len(self._entries)}条")
+
+    def _band_keys(self, scope: str, signature: Tuple[int, ...]) -> List[tuple]:
+        return [
+            (scope, band, hash(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def _index(self, entry_id: int, scope: str, signature: Tuple[int, ...], result: str, created_at: float):
+        self._entries[entry_id] = (scope, signature, result, created_at)
+        self._by_signature[(scope, signature)] = entry_id
+        for key in self._band_keys(scope, signature):
+            self._buckets[key].add(entry_id)
+
+    def _remove(self, entry_id: int):
+        scope, signature, _, _ = self._entries.pop(entry_id)
+        if self._by_signature.get((scope, signature)) == entry_id:
+            del self._by_signature[(scope, signature)]
+        for key in self._band_keys(scope, signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        """计算文本的MinHash签名"""
+        return self.hasher.signature(shingles(normalize_text(text), self.shingle_size))
+
+    def lookup(self, scope: str, text: str) -> Optional[str]:
+        """查找相似文本的缓存结果，未命中返回None"""
+        signature = self.signature(text)
+        now = time.time()
+        best_id, best_score = None, 0.0
+        with self._lock:
+            self.stats["lookups"] += 1
+            candidates = set()
+            for key in self._band_keys(scope, signature):
+                candidates |= self._buckets.get(key, set())
+            for entry_id in candidates:
+                _, candidate, _, created_at = self._entries[entry_id]
+                if now - created_at > self.ttl:
+                    continue
+                score = MinHasher.similarity(signature, candidate)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None or best_score < self.threshold:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            print(f"命中相似文本缓存，相似度:{best_score:.2f}")
+            return self._entries[best_id][2]
+
+    def add(self, scope: str, text: str, result: str) -> None:
+        """写入文本对应的结果，签名相同的已有条目被替换（更新结果和写入时间）"""
+        signature = self.signature(text)
+        now = time.time()
+        with self._lock:
+            expired = []
+            previous = self._by_signature.get((scope, signature))
+            if previous is not None:
+                self._remove(previous)
+                expired.append((previous,))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index(entry_id, scope, signature, result, now)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                expired.append((oldest,))
+
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.executemany("DELETE FROM semantic_cache WHERE id = ?", expired)
+                    self._conn.execute(
+                        "INSERT INTO semantic_cache (id, scope, signature, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                        (entry_id, scope, struct.pack(f"<{len(signature)}Q", *signature), result, now)
+                    )
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["entries"] = len(self._entries)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        return stats
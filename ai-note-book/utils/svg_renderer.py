@@ -0,0 +1,148 @@
+import unicodedata
+from xml.sax.saxutils import escape
+
+from utils.outline_parser import Outline, parse_outline
+
+
+class SvgMindmapRenderer:
+    """
+    纯Python的思维导图渲染器：对大纲做水平布局后直接输出SVG，不依赖ete3/Qt
+
+    布局与ete3版本一致：根节点在左侧，子节点依次向右展开，叶子节点按顺序纵向排列，
+    父节点位于第一个和最后一个子节点的中间
+    """
+
+    # 按层级区分的样式: (节点半径, 颜色, 字号, 是否加粗)
+    ROOT_STYLE = (7.5, "#3498db", 14, True)  # 蓝色
+    BRANCH_STYLE = (5, "#2ecc71", 12, False)  # 绿色
+    LEAF_STYLE = (4, "#e74c3c", 10, False)  # 红色
+
+    FONT_FAMILY = "PingFang SC, Microsoft YaHei, Noto Sans CJK SC, sans-serif"
+
+    def __init__(self, row_height: int = 28, column_gap: int = 40, margin: int = 20, scale: float = 2.0):
+        """
+        参数:
+            row_height: 相邻叶子节点的纵向间距
+            column_gap: 相邻层级之间的横向间距（不含文字宽度）
+            margin: 图片边距
+            scale: 转换为PNG时的缩放倍数
+        """
+        self.row_height = row_height
+        self.column_gap = column_gap
+        self.margin = margin
+        self.scale = scale
+
+        # 渲染参数，作为渲染缓存键的一部分，修改样式时需要同时修改style以免复用旧图片
+        self.style = "svg-default-v1"
+        self.dpi = int(96 * scale)
+
+    @staticmethod
+    def text_width(text: str, font_size: int) -> float:
+        """估算文字宽度：全角字符按一个字号计算，其余字符按0.6个字号计算"""
+        width = 0.0
+        for ch in text:
+            width += font_size if unicodedata.east_asian_width(ch) in ("W", "F") else font_size * 0.6
+        return width
+
+    def _node_style(self, depth: int, is_leaf: bool):
+        if depth == 0:
+            return self.ROOT_STYLE
+        return self.LEAF_STYLE if is_leaf else self.BRANCH_STYLE
+
+    def layout(self, outline: Outline):
+        """
+        计算节点坐标
+
+        参数:
+            outline: 大纲节点数组（先序排列）
+
+        返回:
+            (节点列表, 宽度, 高度)，节点格式为(名称, 层级, 父节点下标, x, y, 样式)
+        """
+        names = outline.labels()
+        depths = outline.depths
+        parents = outline.parents
+        children = outline.children()
+
+        count = len(names)
+        styles = [self._node_style(depths[i], not children[i]) for i in range(count)]
+
+        # 每一列的宽度 = 节点直径 + 该层最长文字的宽度 + 间距
+        max_depth = max(depths)
+        column_widths = [0.0] * (max_depth + 1)
+        for i in range(count):
+            radius, _, font_size, _ = styles[i]
+            width = radius * 2 + 5 + self.text_width(names[i], font_size)
+            column_widths[depths[i]] = max(column_widths[depths[i]], width)
+        column_x = [float(self.margin)]
+        for width in column_widths[:-1]:
+            column_x.append(column_x[-1] + width + self.column_gap)
+
+        # 叶子节点按先序依次占一行，父节点取首尾子节点的中点（逆序遍历保证子节点先于父节点计算）
+        ys = [0.0] * count
+        row = 0
+        for i in range(count):
+            if not children[i]:
+                ys[i] = self.margin + row * self.row_height + self.row_height / 2
+                row += 1
+        for i in range(count - 1, -1, -1):
+            if children[i]:
+                ys[i] = (ys[children[i][0]] + ys[children[i][-1]]) / 2
+
+        nodes = [
+            (names[i], depths[i], parents[i], column_x[depths[i]], ys[i], styles[i])
+            for i in range(count)
+        ]
+        width = column_x[-1] + column_widths[-1] + self.margin
+        height = self.margin * 2 + row * self.row_height
+        return nodes, width, height
+
+    def render_svg(self, outline: Outline) -> str:
+        """把大纲渲染为SVG文本"""
+        nodes, width, height = self.layout(outline)
+
+        edges = []
+        shapes = []
+        for name, depth, parent, x, y, (radius, color, font_size, bold) in nodes:
+            if parent >= 0:
+                px, py = nodes[parent][3], nodes[parent][4]
+                mx = (px + x) / 2
+                edges.append(f'<path d="M{px:.1f} {py:.1f}C{mx:.1f} {py:.1f} {mx:.1f} {y:.1f} {x:.1f} {y:.1f}"/>')
+            shapes.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="{radius}" fill="{color}"/>')
+            weight = ' font-weight="bold"' if bold else ''
+            shapes.append(
+                f'<text x="{x + radius + 5:.1f}" y="{y:.1f}" font-size="{font_size}"{weight}>{escape(name)}</text>'
+            )
+
+        return "".join([
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+            f'viewBox="0 0 {width:.0f} {height:.0f}">',
+            f'<rect width="100%" height="100%" fill="#ffffff"/>',
+            '<g fill="none" stroke="#9e9e9e" stroke-width="1.2">', *edges, '</g>',
+            f'<g font-family="{self.FONT_FAMILY}" dominant-baseline="middle" fill="#000000">', *shapes, '</g>',
+            '</svg>'
+        ])
+
+    def render_png(self, outline: Outline) -> bytes:
+        """把大纲渲染为PNG，需要安装cairosvg"""
+        try:
+            import cairosvg
+        except ImportError:
+            raise Exception("PNG输出需要安装cairosvg，或使用SVG格式")
+        return cairosvg.svg2png(bytestring=self.render_svg(outline).encode("utf-8"), scale=self.scale)
+
+    def render_bytes(self, text: str, image_format: str = "svg") -> bytes:
+        """
+        渲染思维导图
+
+        参数:
+            text: 大纲文本
+            image_format: svg或png
+
+        返回:
+            图片内容
+        """
+        outline = parse_outline(text)
+        if image_format == "png":
+            return self.render_png(outline)
+        return self.render_svg(outline).encode("utf-8")
@@ -0,0 +1,46 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:  # 未安装tiktoken时使用估算
+    tiktoken = None
+
+# CJK字符（中日韩统一表意文字、假名、全角标点）
+CJK_PATTERN = re.compile('[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数量
+
+    按deepseek官方换算：1个中文字符约0.6个token，1个英文字符约0.3个token
+    """
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return int(cjk * 0.6 + other * 0.3) + 1
+
+
+_encoding = None  # 加载失败后为False，不再重试
+
+
+def count_tokens(text: str) -> int:
+    """
+    使用本地分词器计算文本token数量，未安装tiktoken或分词器加载失败时退化为estimate_tokens估算
+
+    tiktoken首次使用时需要下载词表文件，离线环境可以通过TIKTOKEN_CACHE_DIR指定预先下载好的目录
+    """
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is None or _encoding is False:
+        return estimate_tokens(text)
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"加载tiktoken分词器失败，使用估算的token数:{str(e)}")
+            _encoding = False
+            return estimate_tokens(text)
+    return len(_encoding.encode(text, disallowed_special=()))
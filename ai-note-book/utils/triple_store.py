@@ -0,0 +1,363 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from utils.kg_parser import KnowledgeGraph, normalize_name
+
+# 节点类型：实体或属性值
+ENTITY = 0
+LITERAL = 1
+
+
+class TripleStore:
+    """
+    知识图谱三元组存储，保存在单独的SQLite文件中，按用户分区
+
+    - nodes表保存实体和属性值，同一用户下名称归一化后相同的实体只有一个节点，
+      不同笔记中提到的同一实体因此自动合并
+    - triples表以(user_id, s, p, o, note_id)为主键（SPO），另有POS、OSP两个索引，
+      主体、关系、客体任意组合的查询都能走索引；note_id记录三元组来自哪篇笔记
+    - mentions表记录每篇笔记提到的实体及其在该笔记中的编号（E1、E2...）
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS nodes (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    kind INTEGER NOT NULL,
+                    norm TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    type TEXT NOT NULL DEFAULT '',
+                    UNIQUE (user_id, kind, norm)
+                )
+                """
+            )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS triples (
+                    user_id INTEGER NOT NULL,
+                    s INTEGER NOT NULL,
+                    p TEXT NOT NULL,
+                    o INTEGER NOT NULL,
+                    note_id INTEGER NOT NULL,
+                    PRIMARY KEY (user_id, s, p, o, note_id)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_triples_pos ON triples (user_id, p, o, s)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_triples_osp ON triples (user_id, o, s, p)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_triples_note ON triples (note_id)")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS mentions (
+                    note_id INTEGER NOT NULL,
+                    node_id INTEGER NOT NULL,
+                    local_id TEXT NOT NULL,
+                    PRIMARY KEY (note_id, node_id)
+                ) WITHOUT ROWID
+                """
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_mentions_node ON mentions (node_id)")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS note_graphs (
+                    note_id INTEGER PRIMARY KEY,
+                    user_id INTEGER NOT NULL,
+                    source_hash TEXT NOT NULL,
+                    entity_count INTEGER NOT NULL,
+                    triple_count INTEGER NOT NULL,
+                    update_time REAL NOT NULL
+                )
+                """
+            )
+
+    def _node(self, user_id: int, kind: int, name: str, node_type: str = "") -> int:
+        """读取或创建节点，返回节点ID（调用方持有锁并在事务中）"""
+        norm = normalize_name(name) if kind == ENTITY else name
+        row = self._conn.execute(
+            "SELECT id, type FROM nodes WHERE user_id = ? AND kind = ? AND norm = ?", (user_id, kind, norm)
+        ).fetchone()
+        if row is None:
+            return self._conn.execute(
+                "INSERT INTO nodes (user_id, kind, norm, name, type) VALUES (?, ?, ?, ?, ?)",
+                (user_id, kind, norm, name, node_type)
+            ).lastrowid
+        if node_type and not row[1]:
+            self._conn.execute("UPDATE nodes SET type = ? WHERE id = ?", (node_type, row[0]))
+        return row[0]
+
+    def _remove(self, note_id: int):
+        """删除笔记的三元组，并删除不再被引用的节点（调用方持有锁并在事务中）"""
+        row = self._conn.execute("SELECT user_id FROM note_graphs WHERE note_id = ?", (note_id,)).fetchone()
+        if row is None:
+            return
+        user_id = row[0]
+        node_ids = {node_id for (node_id,) in self._conn.execute(
+            "SELECT node_id FROM mentions WHERE note_id = ?", (note_id,)
+        )}
+        for s, o in self._conn.execute("SELECT s, o FROM triples WHERE note_id = ?", (note_id,)):
+            node_ids.update((s, o))
+
+        self._conn.execute("DELETE FROM triples WHERE note_id = ?", (note_id,))
+        self._conn.execute("DELETE FROM mentions WHERE note_id = ?", (note_id,))
+        self._conn.execute("DELETE FROM note_graphs WHERE note_id = ?", (note_id,))
+        self._conn.executemany(
+            """
+            DELETE FROM nodes WHERE id = ?
+            AND NOT EXISTS (SELECT 1 FROM mentions WHERE node_id = nodes.id)
+            AND NOT EXISTS (SELECT 1 FROM triples WHERE user_id = ? AND s = nodes.id)
+            AND NOT EXISTS (SELECT 1 FROM triples WHERE user_id = ? AND o = nodes.id)
+            """,
+            ((node_id, user_id, user_id) for node_id in node_ids)
+        )
+
+    def replace_note(self, note_id: int, user_id: int, graph: KnowledgeGraph, source_hash: str = "") -> dict:
+        """
+        用新的提取结果替换笔记的知识图谱
+
+        参数:
+            graph: 解析后的知识图谱
+            source_hash: 提取时笔记内容的哈希，用于判断图谱是否过期
+
+        返回:
+            {"entities": 实体数, "triples": 三元组数}
+        """
+        with self._lock, self._conn:
+            self._remove(note_id)
+            node_ids = {}
+            for entity_id, (name, entity_type) in graph.entities.items():
+                node_ids[entity_id] = self._node(user_id, ENTITY, name, entity_type)
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO mentions (note_id, node_id, local_id) VALUES (?, ?, ?)",
+                ((note_id, node_id, entity_id) for entity_id, node_id in node_ids.items())
+            )
+
+            triples = {(node_ids[s], p, node_ids[o]) for s, p, o in graph.relations}
+            triples.update(
+                (node_ids[s], p, self._node(user_id, LITERAL, value)) for s, p, value in graph.attributes
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO triples (user_id, s, p, o, note_id) VALUES (?, ?, ?, ?, ?)",
+                ((user_id, s, p, o, note_id) for s, p, o in triples)
+            )
+            self._conn.execute(
+                "INSERT INTO note_graphs (note_id, user_id, source_hash, entity_count, triple_count, update_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (note_id, user_id, source_hash, len(node_ids), len(triples), time.time())
+            )
+        return {"entities": len(node_ids), "triples": len(triples)}
+
+    def index(self, note_id: int, user_id: int, title: str, content: str) -> None:
+        """笔记内容修改后不自动重新提取（需要调用大模型），图谱按source_hash标记为过期"""
+
+    def remove(self, note_id: int) -> None:
+        """删除笔记的知识图谱"""
+        with self._lock, self._conn:
+            self._remove(note_id)
+
+    def note_info(self, note_id: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, source_hash, entity_count, triple_count, update_time FROM note_graphs WHERE note_id = ?",
+                (note_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("user_id", "source_hash", "entities", "triples", "update_time"), row))
+
+    def note_graph(self, note_id: int) -> Optional[KnowledgeGraph]:
+        """读取笔记的知识图谱，实体使用提取时的编号，笔记没有图谱时返回None"""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM note_graphs WHERE note_id = ?", (note_id,)).fetchone() is None:
+                return None
+            mentions = self._conn.execute(
+                "SELECT m.local_id, m.node_id, n.name, n.type FROM mentions m JOIN nodes n ON n.id = m.node_id "
+                "WHERE m.note_id = ?",
+                (note_id,)
+            ).fetchall()
+            triples = self._conn.execute(
+                "SELECT t.s, t.p, t.o, o.kind, o.name FROM triples t JOIN nodes o ON o.id = t.o "
+                "WHERE t.note_id = ? ORDER BY t.s, t.p",
+                (note_id,)
+            ).fetchall()
+
+        graph = KnowledgeGraph()
+        local_ids = {}
+        for local_id, node_id, name, node_type in sorted(mentions, key=lambda row: int(row[0][1:])):
+            local_ids[node_id] = graph.add_entity(name, node_type, local_id)
+        for s, p, o, kind, name in triples:
+            if kind == ENTITY:
+                graph.add_relation(local_ids[s], p, local_ids[o])
+            else:
+                graph.add_attribute(local_ids[s], p, name)
+        return graph
+
+    def _find_nodes(self, user_id: int, name: str, kinds=(ENTITY, LITERAL)) -> List[int]:
+        """按名称查找节点ID（调用方持有锁）"""
+        ids = []
+        for kind in kinds:
+            norm = normalize_name(name) if kind == ENTITY else name
+            row = self._conn.execute(
+                "SELECT id FROM nodes WHERE user_id = ? AND kind = ? AND norm = ?", (user_id, kind, norm)
+            ).fetchone()
+            if row:
+                ids.append(row[0])
+        return ids
+
+    def query(self, user_id: int, subject: str = None, predicate: str = None, obj: str = None,
+              note_id: int = None, offset: int = 0, limit: int = 100) -> List[dict]:
+        """
+        按主体、关系、客体的任意组合查询三元组，同一三元组出现在多篇笔记中时合并为一条
+
+        参数:
+            subject: 主体实体名称
+            predicate: 关系或属性名
+            obj: 客体实体名称或属性值
+            note_id: 只查询某篇笔记的三元组
+        """
+        conditions = ["t.user_id = ?"]
+        params = [user_id]
+        with self._lock:
+            for column, value, kinds in (("t.s", subject, (ENTITY,)), ("t.o", obj, (ENTITY, LITERAL))):
+                if value is None:
+                    continue
+                ids = self._find_nodes(user_id, value, kinds)
+                if not ids:
+                    return []
+                conditions.append(f"{column} IN ({','.join('?' * len(ids))})")
+                params.extend(ids)
+            if predicate is not None:
+                conditions.append("t.p = ?")
+                params.append(predicate)
+            if note_id is not None:
+                conditions.append("t.note_id = ?")
+                params.append(note_id)
+
+            rows = self._conn.execute(
+                f"""
+                SELECT s.name, s.type, t.p, o.name, o.type, o.kind, GROUP_CONCAT(t.note_id)
+                FROM triples t JOIN nodes s ON s.id = t.s JOIN nodes o ON o.id = t.o
+                WHERE {' AND '.join(conditions)}
+                GROUP BY t.s, t.p, t.o
+                ORDER BY t.s, t.p, t.o
+                LIMIT ? OFFSET ?
+                """,
+                (*params, limit, offset)
+            ).fetchall()
+
+        return [
+            {
+                "subject": {"name": s_name, "type": s_type},
+                "predicate": p,
+                "object": {"name": o_name, "type": o_type} if kind == ENTITY else {"value": o_name},
+                "kind": "relation" if kind == ENTITY else "attribute",
+                "note_ids": sorted(int(note) for note in note_ids.split(","))
+            }
+            for s_name, s_type, p, o_name, o_type, kind, note_ids in rows
+        ]
+
+    def entities(self, user_id: int, prefix: str = "", offset: int = 0, limit: int = 100) -> List[dict]:
+        """列出用户的实体（跨笔记合并后），按提到该实体的笔记数倒序"""
+        norm = normalize_name(prefix)
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT n.name, n.type, COUNT(m.note_id) AS notes
+                FROM nodes n LEFT JOIN mentions m ON m.node_id = n.id
+                WHERE n.user_id = ? AND n.kind = ? AND n.norm >= ? AND n.norm < ?
+                GROUP BY n.id
+                ORDER BY notes DESC, n.name
+                LIMIT ? OFFSET ?
+                """,
+                (user_id, ENTITY, norm, norm + "\U0010ffff", limit, offset)
+            ).fetchall()
+        return [{"name": name, "type": node_type, "notes": notes} for name, node_type, notes in rows]
+
+    def entity(self, user_id: int, name: str, depth: int = 1, limit: int = 200) -> Optional[dict]:
+        """
+        查询实体：提到该实体的笔记、属性，以及depth跳以内的相邻实体和关系（广度优先）
+
+        返回:
+            实体信息，实体不存在时返回None
+        """
+        with self._lock:
+            ids = self._find_nodes(user_id, name, (ENTITY,))
+            if not ids:
+                return None
+            root = ids[0]
+            node_name, node_type = self._conn.execute(
+                "SELECT name, type FROM nodes WHERE id = ?", (root,)
+            ).fetchone()
+            note_ids = [note_id for (note_id,) in self._conn.execute(
+                "SELECT note_id FROM mentions WHERE node_id = ? ORDER BY note_id", (root,)
+            )]
+            attributes = [
+                {"key": p, "value": value}
+                for p, value in self._conn.execute(
+                    "SELECT DISTINCT t.p, o.name FROM triples t JOIN nodes o ON o.id = t.o "
+                    "WHERE t.user_id = ? AND t.s = ? AND o.kind = ? ORDER BY t.p",
+                    (user_id, root, LITERAL)
+                )
+            ]
+
+            # 出边走SPO主键，入边走OSP索引
+            names = {root: (node_name, node_type)}
+            edges = set()
+            seen = {root}
+            frontier = deque([(root, 0)])
+            while frontier and len(edges) < limit:
+                node, level = frontier.popleft()
+                if level >= depth:
+                    continue
+                rows = self._conn.execute(
+                    """
+                    SELECT t.s, t.p, t.o, n.name, n.type FROM triples t JOIN nodes n ON n.id = t.o
+                    WHERE t.user_id = ? AND t.s = ? AND n.kind = ?
+                    UNION
+                    SELECT t.s, t.p, t.o, n.name, n.type FROM triples t JOIN nodes n ON n.id = t.s
+                    WHERE t.user_id = ? AND t.o = ?
+                    """,
+                    (user_id, node, ENTITY, user_id, node)
+                ).fetchall()
+                for s, p, o, other_name, other_type in rows:
+                    other = o if s == node else s
+                    names[other] = (other_name, other_type)
+                    edges.add((s, p, o))
+                    if other not in seen:
+                        seen.add(other)
+                        frontier.append((other, level + 1))
+
+        return {
+            "name": node_name,
+            "type": node_type,
+            "note_ids": note_ids,
+            "attributes": attributes,
+            "nodes": [{"name": n, "type": t} for n, t in names.values()],
+            "relations": [
+                {"subject": names[s][0], "predicate": p, "object": names[o][0]}
+                for s, p, o in sorted(edges)[:limit]
+            ]
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            notes, = self._conn.execute("SELECT COUNT(*) FROM note_graphs").fetchone()
+            entities, = self._conn.execute("SELECT COUNT(*) FROM nodes WHERE kind = ?", (ENTITY,)).fetchone()
+            triples, = self._conn.execute("SELECT COUNT(*) FROM triples").fetchone()
+        return {"notes": notes, "entities": entities, "triples": triples}